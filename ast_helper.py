@@ -15,6 +15,25 @@ except ImportError:
 
 _AST_HELPER_LOG_PREFIX = 'ast-helper-py:'
 
+# Node types extract_api_only keeps whole; a set lookup per node instead of building a list each time
+_IMPORT_NODE_TYPES = frozenset({"import_statement", "import_from_statement"})
+
+# pak3 short language name -> tree-sitter-languages grammar name; one dict lookup instead of
+# an if/elif cascade. Python is special-cased in get_language_object (direct grammar module).
+_TREE_SITTER_LANGUAGE_NAMES = {
+    'javascript': 'javascript', 'js': 'javascript',
+    'typescript': 'typescript',
+    'java': 'java',
+    'rust': 'rust',
+    'c': 'c',
+    'cpp': 'cpp',
+    'go': 'go',
+    'ruby': 'ruby',
+    'php': 'php',
+    'csharp': 'c_sharp', # pak3 detect_language uses 'csharp', tree-sitter-languages uses 'c_sharp'
+    # Add other supported languages here if you expand pak3's detect_language
+}
+
 def get_language_object(lang_name_short):
     """
     Tries to get a tree-sitter Language object based on the short name
@@ -24,49 +43,56 @@ def get_language_object(lang_name_short):
         if lang_name_short == 'python':
             # Use the direct language object without wrapping in Language()
             return tree_sitter_python.language()
-        elif lang_name_short in ['javascript', 'js']:
-            return tree_sitter_languages.get_language('javascript')
-        elif lang_name_short == 'typescript':
-            return tree_sitter_languages.get_language('typescript')
-        elif lang_name_short == 'java':
-            return tree_sitter_languages.get_language('java')
-        elif lang_name_short == 'rust':
-            return tree_sitter_languages.get_language('rust')
-        elif lang_name_short == 'c':
-            return tree_sitter_languages.get_language('c')
-        elif lang_name_short == 'cpp':
-            return tree_sitter_languages.get_language('cpp')
-        elif lang_name_short == 'go':
-            return tree_sitter_languages.get_language('go')
-        elif lang_name_short == 'ruby':
-            return tree_sitter_languages.get_language('ruby')
-        elif lang_name_short == 'php':
-            return tree_sitter_languages.get_language('php')
-        elif lang_name_short == 'csharp': # pak3 detect_language uses 'csharp'
-            return tree_sitter_languages.get_language('c_sharp') # tree-sitter-languages uses 'c_sharp'
-        # Add other supported languages here if you expand pak3's detect_language
-        else:
-            print(f"{_AST_HELPER_LOG_PREFIX} warn: Language '{lang_name_short}' not explicitly mapped in ast_helper.py's get_language_object.", file=sys.stderr)
-            return None
+        grammar_name = _TREE_SITTER_LANGUAGE_NAMES.get(lang_name_short)
+        if grammar_name is not None:
+            return tree_sitter_languages.get_language(grammar_name)
+        print(f"{_AST_HELPER_LOG_PREFIX} warn: Language '{lang_name_short}' not explicitly mapped in ast_helper.py's get_language_object.", file=sys.stderr)
+        return None
     except Exception as e:
         print(f"{_AST_HELPER_LOG_PREFIX} error: Could not load tree-sitter language for '{lang_name_short}'. Error: {e}", file=sys.stderr)
         return None
 
+def walk_preorder(tree):
+    """
+    Yields every node of the tree in pre-order using a TreeCursor. Unlike recursing over
+    node.children this builds no Python list of child Nodes per node and uses no recursion,
+    so deeply nested sources cannot hit the recursion limit.
+    """
+    cursor = tree.walk()
+    visited_children = False
+    while True:
+        if not visited_children:
+            yield cursor.node
+            if not cursor.goto_first_child():
+                visited_children = True
+        elif cursor.goto_next_sibling():
+            visited_children = False
+        elif not cursor.goto_parent():
+            break
+
+def first_line_text(source_bytes, start_byte, end_byte):
+    """
+    First line of source_bytes[start_byte:end_byte] as text. Only the bytes up to the first
+    newline are decoded, rather than the whole node (a full function body when no ':' was found).
+    """
+    newline_idx = source_bytes.find(b'\n', start_byte, end_byte)
+    if newline_idx != -1:
+        end_byte = newline_idx + 1
+    return source_bytes[start_byte:end_byte].decode('utf-8', errors='ignore').splitlines()[0]
+
 def extract_api_only(tree, source_bytes):
     """
     Aggressive compression: Extracts API-level elements using tree-sitter. A full, robust implementation is provided here.
     """
     api_elements = []
-    source_text = source_bytes.decode('utf8', errors='ignore') # For easier text slicing for headers
 
-    # This recursive traversal is a general pattern.
     # Specific node types and text extraction logic will vary GREATLY per language.
     # The 'type' strings (e.g., "import_statement") depend on the tree-sitter grammar for that language.
-    def traverse_node(node):
+    def visit_node(node):
         node_type = node.type
         
         # Python-specific examples (adapt for other languages)
-        if node_type in ["import_statement", "import_from_statement"]:
+        if node_type in _IMPORT_NODE_TYPES:
             api_elements.append(node.text.decode('utf8').strip())
         
         elif node_type == "class_definition":
@@ -81,7 +107,7 @@ def extract_api_only(tree, source_bytes):
                     break
                 if child.start_byte > node.start_byte + 200: # Safety break if ':' is too far
                     break 
-            class_header = source_bytes[node.start_byte:header_end_byte].decode('utf-8', errors='ignore').splitlines()[0]
+            class_header = first_line_text(source_bytes, node.start_byte, header_end_byte)
             api_elements.append(class_header.strip() + " ...")
 
         elif node_type == "function_definition":
@@ -93,25 +119,23 @@ def extract_api_only(tree, source_bytes):
                     break
                 if child.start_byte > node.start_byte + 300: # Safety break
                     break
-            func_header = source_bytes[node.start_byte:header_end_byte].decode('utf-8', errors='ignore').splitlines()[0]
+            func_header = first_line_text(source_bytes, node.start_byte, header_end_byte)
             api_elements.append(func_header.strip() + " ...")
-        
-        # Generic: Recurse into children
-        for child in node.children:
-            traverse_node(child)
 
     if tree and tree.root_node:
-        traverse_node(tree.root_node)
+        for node in walk_preorder(tree):
+            visit_node(node)
     
     if not api_elements: # Fallback if AST traversal yielded nothing significant
-        return source_text[:1000] + '\n# ... API extraction (stub, ast_helper.py - AST analysis yielded no specific elements)'
+        # Only this fallback needs the source as text, so it is decoded here rather than up front
+        return source_bytes.decode('utf8', errors='ignore')[:1000] + '\n# ... API extraction (stub, ast_helper.py - AST analysis yielded no specific elements)'
 
     # Add a blank line between groups of elements for readability if there are multiple imports vs. defs/classes
     # This is a simple heuristic.
     final_output = []
     last_was_import = False
     for elem in api_elements:
-        current_is_import = elem.startswith("import ") or elem.startswith("from ")
+        current_is_import = elem.startswith(("import ", "from "))
         if final_output and not current_is_import and last_was_import:
             final_output.append("") # Add a separator
         final_output.append(elem)
@@ -11,13 +11,15 @@ Main CLI entry point for all pak operations.
 
 import argparse
 import datetime
+import multiprocessing
 import os
 import re
 import sys
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 # Import from local modules
-from pak_utils import collect_files
+from pak_utils import collect_files, read_source_file
 from pak_analyzer import PythonAnalyzer 
 from pak_compressor import Compressor, CacheManager
 from pak_differ import MethodDiffManager
@@ -25,6 +27,9 @@ from pak_archive_manager import PakArchive
 
 VERSION = "5.0.0"
 
+# Separators accepted between extensions in one -t value ("py,md js"), compiled once
+_EXT_SEPARATOR_RE = re.compile(r'[,\s]+')
+
 def check_dependencies(quiet=False):
     """Check for required dependencies and configuration."""
     missing_deps = []
@@ -132,7 +137,7 @@ def normalize_extensions(ext_list):
         
     for ext_item in ext_list:
         # Handle comma-separated extensions like "py,md,js"
-        for single_ext in re.split(r'[,\s]+', ext_item):
+        for single_ext in _EXT_SEPARATOR_RE.split(ext_item):
             if single_ext:
                 if not single_ext.startswith('.'):
                     normalized.append('.' + single_ext.lower())
@@ -164,6 +169,7 @@ TARGETS:
   pak_core*            GLOB PATTERNS
   *.py                 All Python files in current dir
   src/**/*.js          All JS files in src/ recursively (zsh/bash 4.0+)
+                       Directories skip .git, node_modules and __pycache__ subdirectories.
 
 PACK OPTIONS:
   -t ext1,ext2         Extensions (py,md,js,ts,cpp,h,go,rs,java). Separated by comma.
@@ -173,6 +179,8 @@ PACK OPTIONS:
   -m NUM               Max tokens (0=unlimited). Example: -m 8000
   -j NUM               Parallel workers (1-5, default: 1). Use 2-3 for semantic compression.
        Example: -j 3
+  --fast               Favor speed over ratio: semantic/smart run without the LLM, and
+                       aggressive uses medium on files over 64KB.
   -o FILE              Output file (default: stdout or auto-generated if stdout is a TTY).
        Example: -o project.pak
   -q                   Quiet mode.
@@ -323,6 +331,8 @@ def main():
                         help='File extensions (comma-separated): py,md,js')
     parser.add_argument('-j', '--parallel', type=int, default=1, metavar='N',
                         help='Number of parallel workers for compression (default: 1, max recommended: 3)')
+    parser.add_argument('--fast', action='store_true',
+                        help='Favor speed over ratio: no LLM calls, no AST extraction on files over 64KB')
     
     # Output options
     parser.add_argument('-o', '--output', 
@@ -452,7 +462,7 @@ def execute_pack_command(args, compression_level, extensions):
         return 0
     
     # Create archive
-    pak = PakArchive(compression_level, args.max_tokens, args.quiet)
+    pak = PakArchive(compression_level, args.max_tokens, args.quiet, fast=args.fast)
     # Always create cache manager for semantic compression to avoid repeated LLM calls
     cache_identifier = output_path if output_path else f"stdout_{hash(tuple(collected_files))}"
     cache_mgr = CacheManager(cache_identifier, args.quiet)
@@ -468,16 +478,12 @@ def execute_pack_command(args, compression_level, extensions):
         if not args.quiet:
             print(f"pak: Processing {len(collected_files)} files with {max_workers} parallel workers", file=sys.stderr)
         
-        # Collect all file data for batch processing
-        file_data_list = []
-        for file_path in collected_files:
-            try:
-                with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                    content = f.read()
-                file_data_list.append((file_path, content, 0))  # importance = 0 for all
-            except Exception as e:
-                if not args.quiet:
-                    print(f"pak: Warning: Could not read file {file_path}: {e}", file=sys.stderr)
+        # Collect all file data for batch processing. Reads are I/O-bound and release the GIL,
+        # so they overlap in a thread pool; map keeps the results in collected_files order.
+        with ThreadPoolExecutor(max_workers=max_workers) as read_pool:
+            contents = list(read_pool.map(lambda file_path: _read_for_pack(file_path, args.quiet), collected_files))
+        file_data_list = [(file_path, content, 0)  # importance = 0 for all
+                          for file_path, content in zip(collected_files, contents) if content is not None]
         
         # Process files in parallel
         pak.add_files_parallel(file_data_list, max_workers=max_workers)
@@ -488,19 +494,29 @@ def execute_pack_command(args, compression_level, extensions):
         
         for file_path in collected_files:
             try:
-                with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                    content = f.read()
+                content = read_source_file(file_path)
                 pak.add_file(file_path, content)
             except Exception as e:
                 if not args.quiet:
                     print(f"pak: Warning: Could not read file {file_path}: {e}", file=sys.stderr)
     
-    archive_output = pak.create_archive(output_path)
-    if archive_output:
-        print(archive_output)
+    if output_path:
+        pak.create_archive(output_path)
+    else:
+        # Stream the JSON straight to stdout instead of building it as one string first
+        pak.create_archive(stream=sys.stdout) # Ends with its own newline
     
     return 0
 
+def _read_for_pack(file_path, quiet):
+    """Read one collected file for parallel packing; returns None (with a warning) if it cannot be read."""
+    try:
+        return read_source_file(file_path)
+    except Exception as e:
+        if not quiet:
+            print(f"pak: Warning: Could not read file {file_path}: {e}", file=sys.stderr)
+        return None
+
 def execute_list_command(args, command):
     """Execute list or list-detailed command."""
     if not args.targets:
@@ -553,11 +569,7 @@ def execute_diff_command(args):
     
     try:
         with open(output_file, 'w', encoding='utf-8') as f:
-            for diff_item in diff_data:
-                f.write(f"FILE: {diff_item['file']}\n")
-                f.write(f"FIND_METHOD: {diff_item['find_method']}\n")
-                f.write(f"UNTIL_EXCLUDE: {diff_item['until_exclude']}\n")
-                f.write(f"REPLACE_WITH:\n{diff_item['replace_with']}\n")
+            write_method_diffs(diff_data, f)
         
         if not args.quiet:
             print(f"pak: Extracted {len(diff_data)} method diffs to {output_file}", file=sys.stderr)
@@ -566,6 +578,14 @@ def execute_diff_command(args):
         print(f"pak: Error writing diff file to {output_file}: {e}", file=sys.stderr)
         return 1
 
+def write_method_diffs(diff_data, out):
+    """Write method diff instructions in .diff format to an open text stream, one entry at a time."""
+    for diff_item in diff_data:
+        out.write(f"FILE: {diff_item['file']}\n"
+                  f"FIND_METHOD: {diff_item['find_method']}\n"
+                  f"UNTIL_EXCLUDE: {diff_item['until_exclude']}\n"
+                  f"REPLACE_WITH:\n{diff_item['replace_with']}\n")
+
 def execute_verify_diff_command(args):
     """Execute verify-diff command."""
     if not args.targets:
@@ -605,4 +625,6 @@ def execute_apply_diff_command(args):
 
 
 if __name__ == "__main__":
+    # Frozen (PyInstaller) builds: a spawned compression worker must run the worker, not the CLI
+    multiprocessing.freeze_support()
     sys.exit(main())
@@ -4,6 +4,96 @@ from typing import List, Dict, Any, Optional, Union # Added Union
 import subprocess
 import tempfile
 import os
+import shutil
+from collections import deque
+from functools import lru_cache
+
+# Patterns for the regex fallback compression, compiled once at import
+_LINE_COMMENT_SLASH_RE = re.compile(r'//.*$', re.MULTILINE)
+_BLOCK_COMMENT_RE = re.compile(r'/\*.*?\*/', re.DOTALL)
+_TRIPLE_DOUBLE_QUOTED_RE = re.compile(r'""".*?"""', re.DOTALL)
+_TRIPLE_SINGLE_QUOTED_RE = re.compile(r"'''.*?'''", re.DOTALL)
+
+# Line prefixes that mark a declaration for the aggressive regex fallback, built once per language
+# rather than as an or-chain of startswith calls evaluated on every line
+_JS_SIGNATURE_PREFIXES = ('class ', 'import ', 'export ')
+_JAVA_SIGNATURE_PREFIXES = ('public ', 'private ', 'protected ', 'class ', 'interface ', 'import ')
+_CPP_SIGNATURE_PREFIXES = ('#include', '#define', '#ifndef', '#endif', 'namespace ', 'class ',
+                           'struct ', 'template', 'using ', 'typedef ')
+_CPP_TYPE_KEYWORDS = ('int ', 'void ', 'bool ', 'auto ', 'char ', 'float ', 'double ')
+
+# Languages whose comments the regex fallback strips: // line comments (light) and /* */ blocks (medium)
+_SLASH_COMMENT_LANGUAGES = frozenset({'javascript', 'java', 'c', 'cpp', 'csharp', 'go', 'rust'})
+_BLOCK_COMMENT_LANGUAGES = frozenset({'javascript', 'java'})
+
+
+def _js_signatures(lines: List[str]) -> List[str]:
+    """Class and function declarations, imports and exports of JavaScript source lines."""
+    signatures = []
+    for line in lines:
+        line = line.strip()
+        # 'function' anywhere also covers lines starting with 'function ' or 'async function '
+        if line.startswith(_JS_SIGNATURE_PREFIXES) or 'function' in line:
+            signatures.append(line.split('{')[0].strip() + ' { ... }')
+    return signatures
+
+
+def _java_signatures(lines: List[str]) -> List[str]:
+    """Class, method, and import declarations of Java source lines."""
+    signatures = []
+    for line in lines:
+        line = line.strip()
+        if line.startswith(_JAVA_SIGNATURE_PREFIXES):
+            signatures.append(line.split('{')[0].strip() + ' { ... }')
+    return signatures
+
+
+def _cpp_signatures(lines: List[str]) -> List[str]:
+    """Class, function, and preprocessor declarations of C/C++ source lines."""
+    signatures = []
+    for line in lines:
+        line = line.strip()
+        # Include preprocessor directives, class/struct/namespace declarations, function signatures
+        if (line.startswith(_CPP_SIGNATURE_PREFIXES) or
+            # Function-like patterns (simplified heuristic)
+            ('(' in line and ')' in line and not line.startswith('//') and
+             any(keyword in line for keyword in _CPP_TYPE_KEYWORDS))):
+            if '{' in line:
+                signatures.append(line.split('{')[0].strip() + ' { ... }')
+            else: # Declarations ending in ';' and anything else are kept as they are
+                signatures.append(line)
+    return signatures
+
+
+# Aggressive regex fallback per language: a plain function looked up by name instead of an if/elif
+# chain; languages without one fall back to medium
+_SIGNATURE_EXTRACTORS = {
+    'javascript': _js_signatures,
+    'java': _java_signatures,
+    'cpp': _cpp_signatures, 'c': _cpp_signatures, 'cpp_header': _cpp_signatures, 'c_header': _cpp_signatures,
+}
+
+# Nodes that can hold statements; expressions never do, so _walk_statements does not descend into them
+_STATEMENT_NODE_TYPES = (ast.stmt, ast.excepthandler, ast.match_case)
+
+
+def _walk_statements(tree: ast.AST):
+    """
+    Like ast.walk (breadth-first, same order) but only yields statement-level nodes, so the
+    expression subtrees that make up most of a module are never visited.
+    """
+    todo = deque([tree])
+    while todo:
+        node = todo.popleft()
+        todo.extend(child for child in ast.iter_child_nodes(node) if isinstance(child, _STATEMENT_NODE_TYPES))
+        yield node
+
+
+@lru_cache(maxsize=None)
+def _resolve_ast_helper(ast_helper_bin: str) -> Optional[str]:
+    """Full path of the ast_helper executable, or None if it is not installed (looked up once)."""
+    return shutil.which(ast_helper_bin)
+
 
 class MultiLanguageAnalyzer:
     """
@@ -46,22 +136,28 @@ class MultiLanguageAnalyzer:
         Calls the frozen ast_helper binary as a subprocess for AST-based compression.
         Fallback to regex-based compression if the binary fails.
         """
+        # Find ast_helper binary (assume it's in the same dir as pak4 or in PATH). When it is not
+        # installed, go straight to the fallback instead of a temp file and a failing spawn per file.
+        ast_helper_bin = _resolve_ast_helper(os.environ.get('AST_HELPER_BIN', 'ast_helper'))
+        if ast_helper_bin is None:
+            return MultiLanguageAnalyzer._fallback_compression(content, language, level)
+        tmp_path = None
         try:
             # Write content to a temporary file
             with tempfile.NamedTemporaryFile(delete=False, mode='w', encoding='utf-8', suffix='.txt') as tmp:
                 tmp.write(content)
                 tmp_path = tmp.name
-            # Find ast_helper binary (assume it's in the same dir as pak4 or in PATH)
-            ast_helper_bin = os.environ.get('AST_HELPER_BIN', 'ast_helper')
             cmd = [ast_helper_bin, '--lang', language, '--level', level, tmp_path]
             result = subprocess.run(cmd, capture_output=True, text=True, timeout=30)
-            os.unlink(tmp_path)
             if result.returncode == 0:
                 return result.stdout
             else:
                 return MultiLanguageAnalyzer._fallback_compression(content, language, level)
         except Exception as e:
             return MultiLanguageAnalyzer._fallback_compression(content, language, level)
+        finally:
+            if tmp_path:
+                os.unlink(tmp_path) # Also on a timeout or spawn error, which used to leak the file
     
     @staticmethod
     def _fallback_compression(content: str, language: str, level: str) -> str:
@@ -70,82 +166,37 @@ class MultiLanguageAnalyzer:
         """
         if level == "light":
             # Remove single-line comments for common languages
-            if language in ['javascript', 'java', 'c', 'cpp', 'csharp', 'go', 'rust']:
+            if language in _SLASH_COMMENT_LANGUAGES:
                 # Remove // comments
-                content = re.sub(r'//.*$', '', content, flags=re.MULTILINE)
-            elif language in ['python']:
-                # Remove # comments (but preserve shebangs)
-                lines = content.split('\n')
-                result_lines = []
-                for line in lines:
-                    if line.strip().startswith('#!'):  # Preserve shebangs
-                        result_lines.append(line)
-                    else:
-                        result_lines.append(re.sub(r'#.*$', '', line))
-                content = '\n'.join(result_lines)
-            
+                content = _LINE_COMMENT_SLASH_RE.sub('', content)
+            lines = content.split('\n')
+            if language == 'python':
+                # Remove # comments (but preserve shebangs) in the same pass over the lines: only lines
+                # containing '#' are touched, everything from their first '#' on is dropped
+                lines = [line.partition('#')[0] if '#' in line and not line.lstrip().startswith('#!') else line
+                         for line in lines]
+
             # Remove empty lines
-            content = '\n'.join(line for line in content.split('\n') if line.strip())
+            content = '\n'.join(filter(str.strip, lines))
             return content + f'\n# ... (Light compression via regex - {language})'
             
         elif level == "medium":
             # Remove comments and docstrings
             content = MultiLanguageAnalyzer._fallback_compression(content, language, "light")
-            if language in ['javascript', 'java']:
+            if language in _BLOCK_COMMENT_LANGUAGES:
                 # Remove /* */ comments
-                content = re.sub(r'/\*.*?\*/', '', content, flags=re.DOTALL)
+                content = _BLOCK_COMMENT_RE.sub('', content)
             elif language == 'python':
                 # Remove triple-quoted strings (basic regex)
-                content = re.sub(r'""".*?"""', '', content, flags=re.DOTALL)
-                content = re.sub(r"'''.*?'''", '', content, flags=re.DOTALL)
+                content = _TRIPLE_DOUBLE_QUOTED_RE.sub('', content)
+                content = _TRIPLE_SINGLE_QUOTED_RE.sub('', content)
             return content + f'\n# ... (Medium compression via regex - {language})'
             
         elif level == "aggressive":
-            # Extract function/class signatures only
-            if language == 'javascript':
-                # Extract class and function declarations
-                signatures = []
-                for line in content.split('\n'):
-                    line = line.strip()
-                    if (line.startswith('class ') or line.startswith('function ') or 
-                        line.startswith('async function ') or 'function' in line or
-                        line.startswith('import ') or line.startswith('export ')):
-                        signatures.append(line.split('{')[0].strip() + ' { ... }')
-                if signatures:
-                    return '\n'.join(signatures) + f'\n# ... (Aggressive compression via regex - {language})'
-                    
-            elif language == 'java':
-                # Extract class, method, and import declarations
-                signatures = []
-                for line in content.split('\n'):
-                    line = line.strip()
-                    if (line.startswith('public ') or line.startswith('private ') or 
-                        line.startswith('protected ') or line.startswith('class ') or
-                        line.startswith('interface ') or line.startswith('import ')):
-                        signatures.append(line.split('{')[0].strip() + ' { ... }')
-                if signatures:
-                    return '\n'.join(signatures) + f'\n# ... (Aggressive compression via regex - {language})'
-            
-            elif language in ['cpp', 'c', 'cpp_header', 'c_header']:
-                # Extract C++ class, function, and preprocessor declarations
-                signatures = []
-                for line in content.split('\n'):
-                    line = line.strip()
-                    # Include preprocessor directives, class/struct/namespace declarations, function signatures
-                    if (line.startswith('#include') or line.startswith('#define') or 
-                        line.startswith('#ifndef') or line.startswith('#endif') or
-                        line.startswith('namespace ') or line.startswith('class ') or 
-                        line.startswith('struct ') or line.startswith('template') or
-                        line.startswith('using ') or line.startswith('typedef ') or
-                        # Function-like patterns (simplified heuristic)
-                        ('(' in line and ')' in line and not line.startswith('//') and
-                         any(keyword in line for keyword in ['int ', 'void ', 'bool ', 'auto ', 'char ', 'float ', 'double ']))):
-                        if '{' in line:
-                            signatures.append(line.split('{')[0].strip() + ' { ... }')
-                        elif ';' in line:
-                            signatures.append(line.strip())
-                        else:
-                            signatures.append(line.strip())
+            # Extract function/class signatures only, with the extractor registered for the language
+            extract_signatures = _SIGNATURE_EXTRACTORS.get(language)
+            if extract_signatures:
+                signatures = extract_signatures(content.split('\n'))
                 if signatures:
                     return '\n'.join(signatures) + f'\n# ... (Aggressive compression via regex - {language})'
             
@@ -167,17 +218,14 @@ class MultiLanguageAnalyzer:
             lines.append("")  # Blank line after imports
         
         # Add top-level variables
+        # (each entry is extended in as one multi-line string; "\n".join gives the same text)
         if structure.get("variables"):
-            for var in structure["variables"]:
-                lines.append(f"{var} = ...")
+            lines.extend(f"{var} = ..." for var in structure["variables"])
             lines.append("")
         
         # Add functions
         if structure.get("functions"):
-            for func_sig in structure["functions"]:
-                lines.append(f"{func_sig}:")
-                lines.append("    ...")
-                lines.append("")
+            lines.extend(f"{func_sig}:\n    ...\n" for func_sig in structure["functions"])
         
         # Add classes
         if structure.get("classes"):
@@ -185,13 +233,10 @@ class MultiLanguageAnalyzer:
                 lines.append(class_info["signature"])
                 
                 # Add class variables
-                for var in class_info.get("variables", []):
-                    lines.append(f"    {var} = ...")
+                lines.extend(f"    {var} = ..." for var in class_info.get("variables", []))
                 
                 # Add methods
-                for method_sig in class_info.get("methods", []):
-                    lines.append(f"    {method_sig}:")
-                    lines.append("        ...")
+                lines.extend(f"    {method_sig}:\n        ..." for method_sig in class_info.get("methods", []))
                 
                 lines.append("")
         
@@ -227,9 +272,8 @@ class MultiLanguageAnalyzer:
             source_parts = []
             # First line: from col_offset to end of line
             source_parts.append(content_lines[start_line_idx][node.col_offset:])
-            # Middle lines: full lines
-            for i in range(start_line_idx + 1, end_line_idx):
-                source_parts.append(content_lines[i])
+            # Middle lines: full lines, copied in one slice
+            source_parts.extend(content_lines[start_line_idx + 1:end_line_idx])
             # Last line: from start of line to end_col_offset
             if node.end_col_offset is not None: # end_col_offset can be None for some nodes
                  source_parts.append(content_lines[end_line_idx][:node.end_col_offset])
@@ -245,11 +289,7 @@ class MultiLanguageAnalyzer:
         Returns a dictionary representing the structure, or an error dict.
         """
         try:
-            # Add parent pointers to the AST for easier context checking (e.g., top-level)
             tree = ast.parse(content)
-            for node_obj in ast.walk(tree):
-                for child in ast.iter_child_nodes(node_obj):
-                    child.parent = node_obj # type: ignore
         except SyntaxError as e:
             return {"error": f"Invalid Python syntax: {e}"}
         except Exception as e: # Catch other parsing errors
@@ -263,9 +303,8 @@ class MultiLanguageAnalyzer:
             "variables": []  # List of top-level variable names
         }
 
-        for node in ast.walk(tree):
-            parent_type = type(node.parent) if hasattr(node, 'parent') else None
-
+        # Imports are collected at any depth, in ast.walk order
+        for node in _walk_statements(tree):
             if isinstance(node, ast.Import):
                 for alias in node.names:
                     structure["imports"].append(f"import {alias.name}{f' as {alias.asname}' if alias.asname else ''}") # type: ignore
@@ -278,75 +317,74 @@ class MultiLanguageAnalyzer:
                     as_name_suffix = f" as {alias.asname}" if alias.asname else ""
                     structure["imports"].append(f"from {relative_prefix}{module_name} import {item_name}{as_name_suffix}") # type: ignore
 
-            elif isinstance(node, ast.FunctionDef):
+        # Functions, classes and variables are only reported at top level, i.e. directly in the module body
+        for node in tree.body:
+            if isinstance(node, ast.FunctionDef):
                 # Only include top-level functions in the "functions" list
-                if parent_type == ast.Module:
-                    args_list = [arg.arg for arg in node.args.args]
-                    # Could also include: node.args.vararg, node.args.kwarg, type hints (arg.annotation, node.returns)
-                    func_sig = f"def {node.name}({', '.join(args_list)})"
-                    if node.returns: # Add return type hint if present
-                         # Safely get annotation source (might be complex)
-                         try:
-                             return_type_str = ast.unparse(node.returns) if hasattr(ast, 'unparse') else "UnknownType"
-                         except:
-                             return_type_str = "ComplexType" # Fallback for unparse issues
-                         func_sig += f" -> {return_type_str}"
-                    structure["functions"].append(func_sig) # type: ignore
+                args_list = [arg.arg for arg in node.args.args]
+                # Could also include: node.args.vararg, node.args.kwarg, type hints (arg.annotation, node.returns)
+                func_sig = f"def {node.name}({', '.join(args_list)})"
+                if node.returns: # Add return type hint if present
+                     # Safely get annotation source (might be complex)
+                     try:
+                         return_type_str = ast.unparse(node.returns) if hasattr(ast, 'unparse') else "UnknownType"
+                     except:
+                         return_type_str = "ComplexType" # Fallback for unparse issues
+                     func_sig += f" -> {return_type_str}"
+                structure["functions"].append(func_sig) # type: ignore
 
             elif isinstance(node, ast.ClassDef):
                 # Only top-level classes
-                if parent_type == ast.Module:
-                    base_classes_str = []
-                    for base_node in node.bases:
-                        try:
-                            base_classes_str.append(ast.unparse(base_node) if hasattr(ast, 'unparse') else "UnknownBase")
-                        except:
-                            base_classes_str.append("ComplexBase")
-
-                    class_sig_str = f"class {node.name}"
-                    if base_classes_str:
-                        class_sig_str += f"({', '.join(base_classes_str)})"
-
-                    class_methods = []
-                    class_vars = []
-                    for item in node.body:
-                        if isinstance(item, ast.FunctionDef): # Methods
-                            method_args = [arg.arg for arg in item.args.args]
-                            method_sig = f"def {item.name}({', '.join(method_args)})"
-                            if item.returns:
-                                try: ret_type = ast.unparse(item.returns) if hasattr(ast, 'unparse') else "Any"
-                                except: ret_type = "ComplexRet"
-                                method_sig += f" -> {ret_type}"
-                            class_methods.append(method_sig)
-                        elif isinstance(item, ast.Assign): # Class-level assignments
-                            for target in item.targets:
-                                if isinstance(target, ast.Name):
-                                    class_vars.append(target.id)
-                        elif isinstance(item, ast.AnnAssign) and isinstance(item.target, ast.Name): # Annotated class vars
-                             class_vars.append(item.target.id)
-
-
-                    structure["classes"].append({ # type: ignore
-                        "signature": class_sig_str + ":",
-                        "methods": class_methods,
-                        "variables": class_vars
-                    })
+                base_classes_str = []
+                for base_node in node.bases:
+                    try:
+                        base_classes_str.append(ast.unparse(base_node) if hasattr(ast, 'unparse') else "UnknownBase")
+                    except:
+                        base_classes_str.append("ComplexBase")
+
+                class_sig_str = f"class {node.name}"
+                if base_classes_str:
+                    class_sig_str += f"({', '.join(base_classes_str)})"
+
+                class_methods = []
+                class_vars = []
+                for item in node.body:
+                    if isinstance(item, ast.FunctionDef): # Methods
+                        method_args = [arg.arg for arg in item.args.args]
+                        method_sig = f"def {item.name}({', '.join(method_args)})"
+                        if item.returns:
+                            try: ret_type = ast.unparse(item.returns) if hasattr(ast, 'unparse') else "Any"
+                            except: ret_type = "ComplexRet"
+                            method_sig += f" -> {ret_type}"
+                        class_methods.append(method_sig)
+                    elif isinstance(item, ast.Assign): # Class-level assignments
+                        for target in item.targets:
+                            if isinstance(target, ast.Name):
+                                class_vars.append(target.id)
+                    elif isinstance(item, ast.AnnAssign) and isinstance(item.target, ast.Name): # Annotated class vars
+                         class_vars.append(item.target.id)
+
+
+                structure["classes"].append({ # type: ignore
+                    "signature": class_sig_str + ":",
+                    "methods": class_methods,
+                    "variables": class_vars
+                })
 
             elif isinstance(node, (ast.Assign, ast.AnnAssign, ast.AugAssign)):
                 # Capture top-level variable assignments
-                if parent_type == ast.Module:
-                    targets_to_add = []
-                    if isinstance(node, ast.Assign):
-                        for target in node.targets:
-                            if isinstance(target, ast.Name): targets_to_add.append(target.id)
-                    elif isinstance(node, ast.AnnAssign) and isinstance(node.target, ast.Name):
-                        targets_to_add.append(node.target.id)
-                    elif isinstance(node, ast.AugAssign) and isinstance(node.target, ast.Name):
-                         targets_to_add.append(node.target.id)
-
-                    for var_name in targets_to_add:
-                        if var_name not in structure["variables"]: # Avoid duplicates
-                             structure["variables"].append(var_name) # type: ignore
+                targets_to_add = []
+                if isinstance(node, ast.Assign):
+                    for target in node.targets:
+                        if isinstance(target, ast.Name): targets_to_add.append(target.id)
+                elif isinstance(node, ast.AnnAssign) and isinstance(node.target, ast.Name):
+                    targets_to_add.append(node.target.id)
+                elif isinstance(node, ast.AugAssign) and isinstance(node.target, ast.Name):
+                     targets_to_add.append(node.target.id)
+
+                for var_name in targets_to_add:
+                    if var_name not in structure["variables"]: # Avoid duplicates
+                         structure["variables"].append(var_name) # type: ignore
         return structure
 
     @staticmethod
@@ -412,7 +450,9 @@ class MultiLanguageAnalyzer:
         new_methods_map = {m["name"]: m for m in new_methods_list}
 
         diff_results = []
-        all_method_names = set(old_methods_map.keys()) | set(new_methods_map.keys())
+        # Old names then names only in the new content, each once, so the diff comes out in a
+        # stable order instead of the per-run order of a set
+        all_method_names = dict.fromkeys([*old_methods_map, *new_methods_map])
 
         for name in all_method_names:
             old_method_data = old_methods_map.get(name)
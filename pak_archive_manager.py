@@ -1,13 +1,14 @@
 import os
 import sys
 import json
+import base64
+import math
+import mmap
+import time
 import uuid
-import datetime
-import string
-import random
+import secrets
 import re # For pattern matching in list/extract
-from pathlib import Path
-from typing import List, Dict, Any, Optional, Tuple
+from typing import List, Dict, Any, Optional, Tuple, Union, Iterator, TextIO
 
 # Import Compressor from the sibling module
 try:
@@ -20,20 +21,115 @@ except ImportError:
     else:
         raise
 
+# Optional streaming JSON parser: lets list/extract walk file entries without
+# materializing the whole archive in memory.
+try:
+    import ijson
+    IJSON_AVAILABLE = True
+except ImportError:
+    ijson = None
+    IJSON_AVAILABLE = False
+
+
+def _posix(path: str) -> str:
+    """Returns the path with POSIX separators, as stored in the archive (no-op on POSIX)."""
+    return path.replace('\\', '/') if os.sep == '\\' else path
+
+
+def _iso_utc(timestamp: float) -> str:
+    """Formats a POSIX timestamp as an ISO-8601 UTC string (seconds precision)."""
+    return time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(timestamp))
+
+
+def _file_mtime_utc(file_path: str) -> Optional[str]:
+    """Returns the file's modification time as ISO-8601 UTC, or None if it cannot be stat'ed."""
+    try:
+        return _iso_utc(os.path.getmtime(file_path))
+    except OSError:
+        return None
+
+
+def _json_default(obj: Any) -> Any:
+    """JSON hook: binary payloads are base64-encoded only when the archive is serialized."""
+    if isinstance(obj, (bytes, bytearray)):
+        return base64.b64encode(obj).decode('ascii')
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+# Compact encoder used for archive output; indent=None keeps json on its C fast path.
+# allow_nan=False: Infinity/NaN are not JSON, and ijson rejects them (see _archive_ratio).
+_ARCHIVE_ENCODER = json.JSONEncoder(separators=(',', ':'), ensure_ascii=False, allow_nan=False,
+                                    default=_json_default)
+
+
+def _archive_ratio(ratio: float) -> Optional[float]:
+    """Compression ratio as stored in an entry: null for the infinite ratio of content that compressed to nothing."""
+    return ratio if math.isfinite(ratio) else None
+
+
+def _has_non_finite_literals(archive_file_path: str) -> bool:
+    """
+    True if the archive may contain the Infinity/NaN literals older versions wrote for empty
+    compressed content. ijson cannot parse those, so readers fall back to the json module.
+    A match inside file content only costs the faster path, never correctness.
+    """
+    try:
+        with open(archive_file_path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            return mm.find(b'Infinity') != -1 or mm.find(b'NaN') != -1
+    except (OSError, ValueError): # Missing or empty file: the regular path reports it
+        return False
+
+
+def _iter_archive_json(metadata: Dict[str, Any], files_data: List[Dict[str, Any]]) -> Iterator[str]:
+    """
+    Yields the archive JSON in chunks: the metadata object, then one chunk per file entry
+    (each on its own line), so writers never hold more than one encoded entry at a time.
+    """
+    yield '{"metadata":'
+    yield _ARCHIVE_ENCODER.encode(metadata)
+    yield ',\n"files":['
+    for i, file_entry in enumerate(files_data):
+        yield ',\n' if i else '\n'
+        yield _ARCHIVE_ENCODER.encode(file_entry)
+    yield '\n]}\n'
+
+
+# Line framing of the layout _iter_archive_json writes, recognized by PakArchive._stream_compact_archive
+_COMPACT_METADATA_PREFIX = b'{"metadata":'
+_COMPACT_FILES_LINE = b'"files":[\n'
+_COMPACT_FILES_END = b']}'
+
+
+def _entry_payload(file_entry: Dict[str, Any]) -> Union[str, bytes]:
+    """Returns the stored content of a file entry, decoding base64 payloads back to bytes."""
+    content = file_entry.get("content", "") # Default to empty content if missing
+    if file_entry.get("content_encoding") == "base64":
+        return base64.b64decode(content)
+    return content
+
 class PakArchive:
     """
     Handles creation, extraction, listing, and verification of .pak archives
     using a JSON-based format.
     """
     PAK_FORMAT_VERSION = "4.2.0-refactored" # Version of the .pak JSON format
+    REQUIRED_ENTRY_KEYS = ("path", "content", "original_size_bytes", "compressed_size_bytes", "estimated_tokens", "compression_method")
+    # Same keys as a set: a valid entry passes one subset test; the tuple order picks the key to report
+    _REQUIRED_ENTRY_KEY_SET = frozenset(REQUIRED_ENTRY_KEYS)
+    LIST_FLUSH_BYTES = 65536 # list_archive buffers stdout output up to this many chars per write
 
-    def __init__(self, compression_level: str = "medium", max_tokens: int = 0, quiet: bool = False):
+    def __init__(self, compression_level: str = "medium", max_tokens: int = 0, quiet: bool = False,
+                 record_mtime: bool = True, min_compress_bytes: int = 0, fast: bool = False):
         self.compression_level = compression_level
         self.max_tokens = max_tokens # Token budgeting to be implemented if desired
         self.files_data: List[Dict[str, Any]] = [] # Stores file entries for the archive
         self.archive_uuid: str = self._generate_short_uuid()
         self.cache_manager: Optional[CacheManager] = None
         self.quiet: bool = quiet
+        self.record_mtime: bool = record_mtime # Skip the per-file stat when last_modified_utc isn't needed
+        self.min_compress_bytes: int = min_compress_bytes # Files below this size are stored uncompressed
+        self.fast: bool = fast # No LLM calls, and no AST extraction on large files (see Compressor)
+        self._compressor: Optional[Compressor] = None # Built on first use, see _get_compressor
     
         # Accumulated totals
         self.total_original_size_bytes: int = 0
@@ -41,9 +137,8 @@ class PakArchive:
         self.total_estimated_tokens: int = 0
     
     def _generate_short_uuid(self) -> str:
-        """Generate a 4-character short UUID using letters and digits."""
-        chars = string.ascii_letters + string.digits  # a-z, A-Z, 0-9
-        return ''.join(random.choices(chars, k=4))
+        """Generate a 4-character short UUID (URL-safe base64 of 3 random bytes)."""
+        return secrets.token_urlsafe(3)[:4]
 
     def _log(self, message: str, is_error: bool = False):
         if not self.quiet or is_error:
@@ -54,21 +149,24 @@ class PakArchive:
     def set_cache_manager(self, cache_manager: CacheManager):
         """Allows setting a CacheManager, typically for compression operations."""
         self.cache_manager = cache_manager
-        self._log(f"CacheManager set. Cache file: {getattr(cache_manager, 'cache_file', 'N/A')}")
+        self._log(f"CacheManager set. Cache dir: {getattr(cache_manager, 'cache_dir', 'N/A')}")
 
+    def _get_compressor(self) -> Compressor:
+        """One Compressor for every file added, rebuilt only if the cache manager has changed."""
+        if self._compressor is None or self._compressor.cache_manager is not self.cache_manager:
+            self._compressor = Compressor(cache_manager=self.cache_manager, quiet=self.quiet,
+                                          min_compress_bytes=self.min_compress_bytes, fast=self.fast)
+        return self._compressor
 
     def add_file(self, file_path: str, content: str, importance: int = 0):
         """
         Adds a file to the in-memory archive representation.
         Content is compressed based on current settings.
         """
-        normalized_file_path = str(Path(file_path)).replace(os.sep, '/') # Ensure POSIX-style paths in archive
-
-        # Initialize compressor. Pass the cache_manager if it's set.
-        compressor_instance = Compressor(cache_manager=self.cache_manager, quiet=self.quiet)
+        normalized_file_path = _posix(file_path) # Ensure POSIX-style paths in archive
 
         # compress_content returns a dictionary with all relevant details
-        comp_result = compressor_instance.compress_content(content, normalized_file_path, self.compression_level)
+        comp_result = self._get_compressor().compress_content(content, normalized_file_path, self.compression_level)
 
         self._log(f"Adding '{normalized_file_path}': "
                   f"{comp_result['original_size']}B -> {comp_result['compressed_size']}B "
@@ -83,10 +181,12 @@ class PakArchive:
             "compressed_size_bytes": comp_result["compressed_size"],
             "estimated_tokens": comp_result["estimated_tokens"],
             "compression_method": comp_result["method"],
-            "compression_ratio": comp_result["compression_ratio"],
+            "compression_ratio": _archive_ratio(comp_result["compression_ratio"]),
             "importance_score": importance, # Renamed for clarity
-            "last_modified_utc": datetime.datetime.utcfromtimestamp(os.path.getmtime(file_path)).isoformat() + "Z" if os.path.exists(file_path) else None
+            "last_modified_utc": _file_mtime_utc(file_path) if self.record_mtime else None
         }
+        if isinstance(file_entry["content"], (bytes, bytearray)):
+            file_entry["content_encoding"] = "base64" # Kept as bytes in memory, encoded on write
         self.files_data.append(file_entry)
 
         # Update totals
@@ -94,29 +194,39 @@ class PakArchive:
         self.total_compressed_size_bytes += comp_result["compressed_size"]
         self.total_estimated_tokens += comp_result["estimated_tokens"]
     
-    def add_files_parallel(self, file_data_list: List[Tuple[str, str, int]], max_workers: int = 3):
+    def add_files_parallel(self, file_data_list: List[Tuple[str, str, int]], max_workers: Optional[int] = None,
+                           use_processes: Optional[bool] = None):
         """
         Add multiple files to the archive using parallel processing.
         
         Args:
             file_data_list: List of (file_path, content, importance) tuples
-            max_workers: Maximum number of parallel workers (default 3 for conservative approach)
+            max_workers: Maximum number of parallel workers (default: os.cpu_count() for worker
+                         processes, 3 for threads as a conservative approach)
+            use_processes: Compress non-semantic files in worker processes. None auto-detects
+                           from Compressor.releases_gil.
         """
         if not file_data_list:
             return
-            
-        self._log(f"Adding {len(file_data_list)} files with parallel processing (max_workers={max_workers})")
-        
+
         # Initialize compressor and parallel processor
-        base_compressor = Compressor(cache_manager=self.cache_manager, quiet=self.quiet)
-        parallel_compressor = ParallelCompressor(base_compressor, max_workers=max_workers, quiet=self.quiet)
+        base_compressor = self._get_compressor()
+        if use_processes is None:
+            use_processes = not base_compressor.releases_gil
+        if max_workers is None:
+            max_workers = (os.cpu_count() or 1) if use_processes else 3
+
+        self._log(f"Adding {len(file_data_list)} files with parallel processing (max_workers={max_workers})")
+
+        parallel_compressor = ParallelCompressor(base_compressor, max_workers=max_workers, quiet=self.quiet,
+                                                 use_processes=use_processes)
         
         # Prepare compression tasks: (content, normalized_file_path, compression_level)
         compression_tasks = []
         file_info_list = []
         
         for file_path, content, importance in file_data_list:
-            normalized_file_path = str(Path(file_path)).replace(os.sep, '/') # Ensure POSIX-style paths in archive
+            normalized_file_path = _posix(file_path) # Ensure POSIX-style paths in archive
             compression_tasks.append((content, normalized_file_path, self.compression_level))
             file_info_list.append((normalized_file_path, importance, file_path))  # Store for later processing
         
@@ -124,6 +234,7 @@ class PakArchive:
         compression_results = parallel_compressor.compress_files_parallel(compression_tasks)
         
         # Process results and add to archive
+        new_entries: List[Dict[str, Any]] = []
         for (normalized_file_path, importance, original_file_path), comp_result in zip(file_info_list, compression_results):
             if comp_result is None:
                 self._log(f"Warning: No result for file {normalized_file_path}", is_error=True)
@@ -142,16 +253,20 @@ class PakArchive:
                 "compressed_size_bytes": comp_result["compressed_size"],
                 "estimated_tokens": comp_result["estimated_tokens"],
                 "compression_method": comp_result["method"],
-                "compression_ratio": comp_result["compression_ratio"],
+                "compression_ratio": _archive_ratio(comp_result["compression_ratio"]),
                 "importance_score": importance,
-                "last_modified_utc": datetime.datetime.utcfromtimestamp(os.path.getmtime(original_file_path)).isoformat() + "Z" if os.path.exists(original_file_path) else None
+                "last_modified_utc": _file_mtime_utc(original_file_path) if self.record_mtime else None
             }
-            self.files_data.append(file_entry)
+            if isinstance(file_entry["content"], (bytes, bytearray)):
+                file_entry["content_encoding"] = "base64" # Kept as bytes in memory, encoded on write
+            new_entries.append(file_entry)
+
+        self.files_data.extend(new_entries)
 
-            # Update totals
-            self.total_original_size_bytes += comp_result["original_size"]
-            self.total_compressed_size_bytes += comp_result["compressed_size"]
-            self.total_estimated_tokens += comp_result["estimated_tokens"]
+        # Update totals in one reduction per counter rather than per-file adds
+        self.total_original_size_bytes += sum(e["original_size_bytes"] for e in new_entries)
+        self.total_compressed_size_bytes += sum(e["compressed_size_bytes"] for e in new_entries)
+        self.total_estimated_tokens += sum(e["estimated_tokens"] for e in new_entries)
         
         # Log parallel processing statistics
         parallel_stats = parallel_compressor.get_parallel_stats()
@@ -159,15 +274,17 @@ class PakArchive:
                   f"{parallel_stats['files_processed_sequentially']} sequential, "
                   f"avg wait: {parallel_stats['average_wait_per_file']:.1f}s")
 
-    def create_archive(self, output_file_path: Optional[str] = None) -> Optional[str]:
+    def create_archive(self, output_file_path: Optional[str] = None, stream: Optional[TextIO] = None) -> Optional[str]:
         """
         Finalizes the archive structure and writes it to a JSON file,
         or returns the JSON string if output_file_path is None.
+        Given an open text stream instead (e.g. sys.stdout), the JSON is written to it chunk by
+        chunk and None is returned, so the whole document is never held in memory.
         """
         archive_metadata: Dict[str, Any] = {
             "pak_format_version": PakArchive.PAK_FORMAT_VERSION,
             "archive_uuid": self.archive_uuid,
-            "creation_timestamp_utc": datetime.datetime.utcnow().isoformat() + "Z",
+            "creation_timestamp_utc": _iso_utc(time.time()),
             "source_tool_version": "pak_core_refactored_v_unknown", # Placeholder, could be passed in
             "compression_level_setting": self.compression_level,
             "max_tokens_setting": self.max_tokens,
@@ -177,11 +294,6 @@ class PakArchive:
             "total_estimated_tokens": self.total_estimated_tokens,
         }
 
-        full_archive_data: Dict[str, Any] = {
-            "metadata": archive_metadata,
-            "files": self.files_data
-        }
-
         self._log(f"Archive generation complete. Summary: {len(self.files_data)} files, "
                   f"{self.total_original_size_bytes}B original, "
                   f"{self.total_compressed_size_bytes}B compressed, "
@@ -192,7 +304,8 @@ class PakArchive:
                 # Ensure output directory exists
                 os.makedirs(os.path.dirname(output_file_path) or '.', exist_ok=True)
                 with open(output_file_path, 'w', encoding='utf-8') as f:
-                    json.dump(full_archive_data, f, indent=2)
+                    # writelines drives the chunk generator from C, with no Python-level write loop
+                    f.writelines(_iter_archive_json(archive_metadata, self.files_data))
                 self._log(f"Archive successfully written to '{output_file_path}'.")
                 # Save cache if a manager was used and an output path was provided
                 if self.cache_manager:
@@ -201,8 +314,13 @@ class PakArchive:
             except IOError as e:
                 self._log(f"Error writing archive to '{output_file_path}': {e}", is_error=True)
                 raise
+        elif stream is not None:
+            stream.writelines(_iter_archive_json(archive_metadata, self.files_data))
+            if self.cache_manager:
+                self.cache_manager.save_cache()
+            return None
         else: # Return as JSON string
-            json_output_string = json.dumps(full_archive_data, indent=2)
+            json_output_string = ''.join(_iter_archive_json(archive_metadata, self.files_data))
             if self.cache_manager: # Still save cache if used
                  self.cache_manager.save_cache()
             return json_output_string
@@ -214,8 +332,10 @@ class PakArchive:
             # Logged by PakArchive static methods directly if quiet is False
             raise FileNotFoundError(f"Archive file not found: {archive_file_path}")
         try:
-            with open(archive_file_path, 'r', encoding='utf-8') as f:
-                data = json.load(f)
+            # Read as bytes: json.loads decodes the whole buffer once, with no text-mode
+            # incremental decoder or newline translation in between
+            with open(archive_file_path, 'rb') as f:
+                data = json.loads(f.read())
 
             if not isinstance(data, dict) or "metadata" not in data or "files" not in data:
                 raise ValueError("Invalid archive format: Missing 'metadata' or 'files' top-level keys.")
@@ -231,53 +351,174 @@ class PakArchive:
             raise Exception(f"Error loading archive data from '{archive_file_path}': {e}")
 
 
+    @staticmethod
+    def _stream_archive(archive_file_path: str, quiet: bool = False) -> Tuple[Dict[str, Any], Iterator[Dict[str, Any]]]:
+        """
+        Returns the archive metadata and an iterator over its file entries.
+        With ijson available the archive is memory-mapped and entries are parsed one at a time;
+        otherwise (or for archives holding Infinity/NaN) it streams the compact layout line by
+        line, or falls back to a full load via _load_archive_json_data.
+        """
+        if not IJSON_AVAILABLE or _has_non_finite_literals(archive_file_path):
+            streamed = PakArchive._stream_compact_archive(archive_file_path)
+            if streamed is not None:
+                return streamed
+            data = PakArchive._load_archive_json_data(archive_file_path, quiet)
+            if not isinstance(data["files"], list):
+                raise ValueError(f"Invalid archive format: 'files' key is not a list in '{archive_file_path}'.")
+            return data["metadata"], iter(data["files"])
+
+        if not os.path.exists(archive_file_path):
+            raise FileNotFoundError(f"Archive file not found: {archive_file_path}")
+        try:
+            with open(archive_file_path, 'rb') as f:
+                mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError: # mmap refuses empty files
+            raise ValueError(f"Invalid JSON in archive file '{archive_file_path}': file is empty")
+
+        try:
+            metadata = next(ijson.items(mm, 'metadata', use_float=True), None)
+            # Like the full load, require a 'files' array before any entry is handed out. The scan
+            # stops at the array's first event, which comes right after the metadata in archives
+            # written by create_archive.
+            mm.seek(0)
+            files_event = next((event for prefix, event, _ in ijson.parse(mm) if prefix == 'files'), None)
+        except ijson.JSONError as e:
+            mm.close()
+            raise ValueError(f"Invalid JSON in archive file '{archive_file_path}': {e}")
+        if not isinstance(metadata, dict) or files_event is None:
+            mm.close()
+            raise ValueError("Invalid archive format: Missing 'metadata' or 'files' top-level keys.")
+        if files_event != 'start_array':
+            mm.close()
+            raise ValueError(f"Invalid archive format: 'files' key is not a list in '{archive_file_path}'.")
+        if "pak_format_version" not in metadata:
+            mm.close()
+            raise ValueError("Invalid archive format: 'pak_format_version' missing in metadata.")
+
+        def iter_entries() -> Iterator[Dict[str, Any]]:
+            try:
+                mm.seek(0)
+                yield from ijson.items(mm, 'files.item', use_float=True)
+            except ijson.JSONError as e:
+                raise ValueError(f"Invalid JSON in archive file '{archive_file_path}': {e}")
+            finally:
+                mm.close()
+
+        return metadata, iter_entries()
+
+    @staticmethod
+    def _stream_compact_archive(archive_file_path: str) -> Optional[Tuple[Dict[str, Any], Iterator[Dict[str, Any]]]]:
+        """
+        Streams an archive in the one-entry-per-line layout create_archive writes (see
+        _iter_archive_json) without ijson: the file is memory-mapped and read line by line, so
+        only one entry is decoded at a time. Returns None for any other layout (e.g. a
+        pretty-printed archive), which _stream_archive then loads in full.
+        """
+        if not os.path.exists(archive_file_path):
+            raise FileNotFoundError(f"Archive file not found: {archive_file_path}")
+        with open(archive_file_path, 'rb') as f:
+            try:
+                mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError: # mmap refuses empty files; the full load reports them
+                return None
+
+        metadata = None
+        first_line = mm.readline()
+        if (first_line.startswith(_COMPACT_METADATA_PREFIX) and first_line.endswith(b',\n')
+                and mm.readline() == _COMPACT_FILES_LINE):
+            try:
+                metadata = json.loads(first_line[len(_COMPACT_METADATA_PREFIX):-2])
+            except ValueError:
+                pass
+        if not isinstance(metadata, dict) or "pak_format_version" not in metadata:
+            mm.close()
+            return None
+
+        def iter_entries() -> Iterator[Dict[str, Any]]:
+            try:
+                for line in iter(mm.readline, b''):
+                    if line.startswith(_COMPACT_FILES_END):
+                        return
+                    try:
+                        yield json.loads(line.rstrip(b',\n'))
+                    except ValueError as e:
+                        raise ValueError(f"Invalid JSON in archive file '{archive_file_path}': {e}")
+                raise ValueError(f"Invalid JSON in archive file '{archive_file_path}': unexpected end of file")
+            finally:
+                mm.close()
+
+        return metadata, iter_entries()
+
     @staticmethod
     def extract_archive(archive_file_path: str, output_base_dir: str,
                         file_path_pattern: Optional[str] = None, quiet: bool = False):
-        """Extracts files from a .pak archive to the specified output directory."""
+        """
+        Extracts files from a .pak archive to the specified output directory.
+        If the archive is truncated or corrupt partway through, extraction stops at the damage and
+        the files already written are left in place.
+        """
         try:
-            archive_data = PakArchive._load_archive_json_data(archive_file_path, quiet)
+            metadata, file_entries = PakArchive._stream_archive(archive_file_path, quiet)
         except Exception as e: # Catch errors from loading (FileNotFound, ValueError)
             if not quiet: print(f"PakArchive (ERROR): Failed to load archive for extraction: {e}", file=sys.stderr)
             return # Cannot proceed
 
         os.makedirs(output_base_dir, exist_ok=True)
         if not quiet:
-            print(f"PakArchive (INFO): Extracting from '{archive_file_path}' (UUID: {archive_data['metadata'].get('archive_uuid', 'N/A')}) to '{os.path.abspath(output_base_dir)}'", file=sys.stderr)
+            print(f"PakArchive (INFO): Extracting from '{archive_file_path}' (UUID: {metadata.get('archive_uuid', 'N/A')}) to '{os.path.abspath(output_base_dir)}'", file=sys.stderr)
 
         extracted_count = 0
-        total_files = len(archive_data.get("files", []))
+        total_files = 0
         pattern_regex = re.compile(file_path_pattern) if file_path_pattern else None
+        abs_output_base_dir = os.path.abspath(output_base_dir)
+        created_dirs = {abs_output_base_dir} # Directories already ensured during this extraction
 
-        for file_entry in archive_data.get("files", []):
-            stored_path = file_entry.get("path", "")
-            if not stored_path:
-                if not quiet: print("PakArchive (WARNING): Skipping file entry with no path.", file=sys.stderr)
-                continue
-
-            if pattern_regex and not pattern_regex.search(stored_path):
-                continue # Skip if path doesn't match pattern
-
-            # Construct OS-specific relative path and then absolute output path
-            # Stored paths are POSIX-style ('/')
-            os_specific_relative_path = os.path.join(*stored_path.split('/'))
-            abs_output_file_path = os.path.abspath(os.path.join(output_base_dir, os_specific_relative_path))
-
-            # Security check: ensure path is still within the intended output_base_dir
-            if not abs_output_file_path.startswith(os.path.abspath(output_base_dir)):
-                if not quiet: print(f"PakArchive (WARNING): Skipping potentially unsafe path '{stored_path}' trying to write outside '{output_base_dir}'. Resolved to '{abs_output_file_path}'", file=sys.stderr)
-                continue
-
-            try:
-                os.makedirs(os.path.dirname(abs_output_file_path), exist_ok=True)
-                with open(abs_output_file_path, 'w', encoding='utf-8') as f:
-                    f.write(file_entry.get("content", "")) # Default to empty content if missing
-                if not quiet: print(f"  Extracted: {stored_path} -> {abs_output_file_path}", file=sys.stderr)
-                extracted_count += 1
-            except IOError as e:
-                if not quiet: print(f"PakArchive (ERROR): Could not write file '{abs_output_file_path}': {e}", file=sys.stderr)
-            except Exception as e_other:
-                if not quiet: print(f"PakArchive (ERROR): Unexpected error extracting '{stored_path}': {e_other}", file=sys.stderr)
+        # Entries are streamed, so a corrupt or truncated archive is only noticed when the parser
+        # reaches the damage: files extracted before that point are kept on disk.
+        try:
+            for file_entry in file_entries:
+                total_files += 1
+                stored_path = file_entry.get("path", "")
+                if not stored_path:
+                    if not quiet: print("PakArchive (WARNING): Skipping file entry with no path.", file=sys.stderr)
+                    continue
+
+                if pattern_regex and not pattern_regex.search(stored_path):
+                    continue # Skip if path doesn't match pattern
+
+                # Construct OS-specific relative path and then absolute output path
+                # Stored paths are POSIX-style ('/')
+                os_specific_relative_path = os.path.join(*stored_path.split('/'))
+                # Joined to the already-absolute base: the same path abspath() would give, without
+                # an os.getcwd() call per entry
+                abs_output_file_path = os.path.normpath(os.path.join(abs_output_base_dir, os_specific_relative_path))
+
+                # Security check: ensure path is still within the intended output_base_dir
+                if not abs_output_file_path.startswith(abs_output_base_dir):
+                    if not quiet: print(f"PakArchive (WARNING): Skipping potentially unsafe path '{stored_path}' trying to write outside '{output_base_dir}'. Resolved to '{abs_output_file_path}'", file=sys.stderr)
+                    continue
+
+                try:
+                    dir_path = os.path.dirname(abs_output_file_path)
+                    if dir_path not in created_dirs: # Skip the stat/mkdir walk for directories seen before
+                        os.makedirs(dir_path, exist_ok=True)
+                        created_dirs.add(dir_path)
+                    payload = _entry_payload(file_entry)
+                    if isinstance(payload, bytes):
+                        with open(abs_output_file_path, 'wb') as f:
+                            f.write(payload)
+                    else:
+                        with open(abs_output_file_path, 'w', encoding='utf-8') as f:
+                            f.write(payload)
+                    if not quiet: print(f"  Extracted: {stored_path} -> {abs_output_file_path}", file=sys.stderr)
+                    extracted_count += 1
+                except IOError as e:
+                    if not quiet: print(f"PakArchive (ERROR): Could not write file '{abs_output_file_path}': {e}", file=sys.stderr)
+                except Exception as e_other:
+                    if not quiet: print(f"PakArchive (ERROR): Unexpected error extracting '{stored_path}': {e_other}", file=sys.stderr)
+        except ValueError as e:
+            if not quiet: print(f"PakArchive (ERROR): Archive is corrupt after {total_files} entries, stopping extraction: {e}", file=sys.stderr)
 
         if not quiet:
             summary = f"PakArchive (INFO): Extraction complete. {extracted_count}/{total_files} files"
@@ -290,57 +531,153 @@ class PakArchive:
                      file_path_pattern: Optional[str] = None, quiet: bool = False):
         """Lists contents of a .pak archive. Output goes to stdout."""
         try:
-            archive_data = PakArchive._load_archive_json_data(archive_file_path, quiet)
+            metadata, file_entries = PakArchive._stream_archive(archive_file_path, quiet)
         except Exception as e:
             # Use stdout for list command errors as per typical CLI behavior
             print(f"Error loading archive for listing: {e}", file=sys.stdout if quiet else sys.stderr)
             return
 
-        # List output should go to stdout
+        # List output should go to stdout. Lines are batched and written in ~64 KB chunks
+        # rather than one print (and stdout lock round-trip) per line.
+        out = sys.stdout.write
+        buf: List[str] = []
+        buf_size = 0
+
+        def emit(text: str):
+            nonlocal buf_size
+            buf.append(text)
+            buf_size += len(text)
+            if buf_size >= PakArchive.LIST_FLUSH_BYTES:
+                out(''.join(buf))
+                buf.clear()
+                buf_size = 0
+
         header_prefix = "Archive (Detailed View):" if detailed else "Archive Contents:"
-        print(f"{header_prefix} {os.path.basename(archive_file_path)}", file=sys.stdout)
-        print(f"  Format Version: {archive_data['metadata'].get('pak_format_version', 'N/A')}", file=sys.stdout)
-        print(f"  UUID: {archive_data['metadata'].get('archive_uuid', 'N/A')}", file=sys.stdout)
-        print("-" * 40, file=sys.stdout)
+        emit(f"{header_prefix} {os.path.basename(archive_file_path)}\n"
+             f"  Format Version: {metadata.get('pak_format_version', 'N/A')}\n"
+             f"  UUID: {metadata.get('archive_uuid', 'N/A')}\n"
+             + "-" * 40 + "\n")
 
         matched_count = 0
-        total_files = len(archive_data.get("files", []))
+        total_files = 0
         pattern_regex = re.compile(file_path_pattern) if file_path_pattern else None
 
-        for file_entry in archive_data.get("files", []):
-            path = file_entry.get("path", "UNKNOWN_PATH")
-            if pattern_regex and not pattern_regex.search(path):
-                continue
-            matched_count += 1
-
-            if detailed:
-                orig_size = file_entry.get('original_size_bytes', 0)
-                comp_size = file_entry.get('compressed_size_bytes', 0)
-                tokens = file_entry.get('estimated_tokens', 0)
-                method = file_entry.get('compression_method', 'N/A')
-                ratio = file_entry.get('compression_ratio', 0.0)
-
-                print(f"File: {path}", file=sys.stdout)
-                print(f"  Size: {orig_size} B (Original) -> {comp_size} B (Compressed, {ratio:.1f}x)", file=sys.stdout)
-                print(f"  Tokens: ~{tokens}, Method: {method}", file=sys.stdout)
-                content_preview = file_entry.get("content", "")
-                preview_lines = content_preview.splitlines()[:2] # Preview first 2 lines
-                if preview_lines:
-                    print(f"  Preview:", file=sys.stdout)
-                    for p_line in preview_lines: print(f"    {p_line[:80]}{'...' if len(p_line)>80 else ''}", file=sys.stdout)
-                if len(content_preview.splitlines()) > 2: print("    ...", file=sys.stdout)
-                print("  ---", file=sys.stdout)
-            else:
-                print(path, file=sys.stdout)
+        try:
+            for file_entry in file_entries:
+                total_files += 1
+                path = file_entry.get("path", "UNKNOWN_PATH")
+                if pattern_regex and not pattern_regex.search(path):
+                    continue
+                matched_count += 1
+
+                if detailed:
+                    get = file_entry.get
+                    content_preview = get("content", "") if get("content_encoding") != "base64" else ""
+                    content_lines = content_preview.splitlines() # Split once, for preview and overflow check
+                    # Build the whole entry block as a single buffered chunk
+                    block = (f"File: {path}\n"
+                             f"  Size: {get('original_size_bytes', 0)} B (Original) -> "
+                             f"{get('compressed_size_bytes', 0)} B (Compressed, {get('compression_ratio') or 0.0:.1f}x)\n"
+                             f"  Tokens: ~{get('estimated_tokens', 0)}, Method: {get('compression_method', 'N/A')}\n")
+                    if content_lines:
+                        block += "  Preview:\n" + "".join(
+                            f"    {p_line[:80]}{'...' if len(p_line)>80 else ''}\n" for p_line in content_lines[:2]) # Preview first 2 lines
+                    if len(content_lines) > 2: block += "    ...\n"
+                    emit(block + "  ---\n")
+                else:
+                    emit(path + "\n")
+        except ValueError as e: # Corrupt or truncated entry, like extract_archive
+            print(f"PakArchive (ERROR): Archive is corrupt after {total_files} entries, stopping listing: {e}", file=sys.stderr)
+        finally:
+            if buf: # Don't lose already-listed entries if the stream fails part-way
+                out(''.join(buf))
+                buf.clear()
+                buf_size = 0
+
+        summary_totals = metadata
+        summary = "=" * 40 + "\n" + f"Listed {matched_count}/{total_files} files.\n"
+        if file_path_pattern: summary += f"  (Filtered by pattern: '{file_path_pattern}')\n"
+        summary += (f"Total Archive (Original): {summary_totals.get('total_original_size_bytes',0)} B\n"
+                    f"Total Archive (Compressed): {summary_totals.get('total_compressed_size_bytes',0)} B\n"
+                    f"Total Archive (Est. Tokens): {summary_totals.get('total_estimated_tokens',0)}\n")
+        out(summary)
 
-        print("=" * 40, file=sys.stdout)
-        summary_totals = archive_data.get("metadata", {})
-        print(f"Listed {matched_count}/{total_files} files.", file=sys.stdout)
-        if file_path_pattern: print(f"  (Filtered by pattern: '{file_path_pattern}')", file=sys.stdout)
-        print(f"Total Archive (Original): {summary_totals.get('total_original_size_bytes',0)} B", file=sys.stdout)
-        print(f"Total Archive (Compressed): {summary_totals.get('total_compressed_size_bytes',0)} B", file=sys.stdout)
-        print(f"Total Archive (Est. Tokens): {summary_totals.get('total_estimated_tokens',0)}", file=sys.stdout)
 
+    @staticmethod
+    def _check_file_entries(files_list: Any, archive_file_path: str) -> Optional[str]:
+        """Structural checks on fully-loaded file entries. Returns a failure message, or None if valid."""
+        if not isinstance(files_list, list):
+            return f"'files' key is not a list in '{archive_file_path}'."
+        for i, file_entry in enumerate(files_list):
+            if not isinstance(file_entry, dict):
+                return f"File entry #{i+1} is not a dictionary."
+            if not file_entry.keys() >= PakArchive._REQUIRED_ENTRY_KEY_SET:
+                key = next(key for key in PakArchive.REQUIRED_ENTRY_KEYS if key not in file_entry)
+                return f"Missing key '{key}' in file entry #{i+1} ('{file_entry.get('path','UNKNOWN_PATH')}')."
+        return None
+
+    @staticmethod
+    def _scan_archive_structure(archive_file_path: str) -> Tuple[str, int, Optional[str]]:
+        """
+        Header-only structural scan for verify_archive: walks ijson parse events over the
+        memory-mapped archive and records only the keys of each file entry, never its payload.
+        Returns (format_version, entry_count, failure message or None). Raises like
+        _load_archive_json_data on missing files, malformed JSON or missing top-level keys.
+        """
+        if not os.path.exists(archive_file_path):
+            raise FileNotFoundError(f"Archive file not found: {archive_file_path}")
+        with open(archive_file_path, 'rb') as f:
+            try:
+                mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError: # mmap refuses empty files
+                raise ValueError(f"Invalid JSON in archive file '{archive_file_path}': file is empty")
+
+        top_level_keys = set()
+        format_version = None
+        files_is_list = None
+        entry_count = 0
+        entry_keys: set = set()
+        entry_path = 'UNKNOWN_PATH'
+        failure: Optional[str] = None
+        with mm:
+            try:
+                for prefix, event, value in ijson.parse(mm):
+                    if prefix == '':
+                        if event == 'map_key':
+                            top_level_keys.add(value)
+                    elif prefix == 'metadata.pak_format_version':
+                        if format_version is None:
+                            format_version = value if event in ('string', 'number') else 'unknown'
+                    elif prefix == 'files':
+                        if files_is_list is None:
+                            files_is_list = (event == 'start_array')
+                    elif prefix == 'files.item':
+                        if event == 'start_map':
+                            entry_count += 1
+                            entry_keys = set()
+                            entry_path = 'UNKNOWN_PATH'
+                        elif event == 'map_key':
+                            entry_keys.add(value)
+                        elif event == 'end_map':
+                            if failure is None and not entry_keys >= PakArchive._REQUIRED_ENTRY_KEY_SET:
+                                key = next(key for key in PakArchive.REQUIRED_ENTRY_KEYS if key not in entry_keys)
+                                failure = f"Missing key '{key}' in file entry #{entry_count} ('{entry_path}')."
+                        elif event != 'end_array': # A list or scalar where an entry should be
+                            entry_count += 1
+                            if failure is None:
+                                failure = f"File entry #{entry_count} is not a dictionary."
+                    elif prefix == 'files.item.path' and event == 'string':
+                        entry_path = value
+            except ijson.JSONError as e:
+                raise ValueError(f"Invalid JSON in archive file '{archive_file_path}': {e}")
+
+        if "metadata" not in top_level_keys or "files" not in top_level_keys:
+            raise ValueError("Invalid archive format: Missing 'metadata' or 'files' top-level keys.")
+        if format_version is None:
+            raise ValueError("Invalid archive format: 'pak_format_version' missing in metadata.")
+        if not files_is_list:
+            failure = f"'files' key is not a list in '{archive_file_path}'."
+        return str(format_version), entry_count, failure
 
     @staticmethod
     def verify_archive(archive_file_path: str, quiet: bool = False) -> bool:
@@ -348,26 +685,23 @@ class PakArchive:
         # Verification messages go to stdout as per CLI tool conventions.
         # Errors during verification process (like file not found) can go to stderr if not quiet.
         try:
-            archive_data = PakArchive._load_archive_json_data(archive_file_path, quiet) # Performs initial load and format checks
-
-            # Additional checks specific to verification
-            files_list = archive_data.get("files", [])
-            if not isinstance(files_list, list):
-                print(f"✗ Verification Failed: 'files' key is not a list in '{archive_file_path}'.", file=sys.stdout)
+            # Structural scan only, payloads are never materialized; ijson cannot read the
+            # Infinity/NaN literals of older archives, which take the full load instead
+            if IJSON_AVAILABLE and not _has_non_finite_literals(archive_file_path):
+                format_version, entry_count, failure = PakArchive._scan_archive_structure(archive_file_path)
+            else:
+                archive_data = PakArchive._load_archive_json_data(archive_file_path, quiet) # Performs initial load and format checks
+                files_list = archive_data.get("files", [])
+                format_version = archive_data['metadata'].get('pak_format_version','unknown')
+                entry_count = len(files_list) if isinstance(files_list, list) else 0
+                failure = PakArchive._check_file_entries(files_list, archive_file_path)
+
+            if failure:
+                print(f"✗ Verification Failed: {failure}", file=sys.stdout)
                 return False
 
-            for i, file_entry in enumerate(files_list):
-                if not isinstance(file_entry, dict):
-                    print(f"✗ Verification Failed: File entry #{i+1} is not a dictionary.", file=sys.stdout)
-                    return False
-                required_keys = ["path", "content", "original_size_bytes", "compressed_size_bytes", "estimated_tokens", "compression_method"]
-                for key in required_keys:
-                    if key not in file_entry:
-                        print(f"✗ Verification Failed: Missing key '{key}' in file entry #{i+1} ('{file_entry.get('path','UNKNOWN_PATH')}').", file=sys.stdout)
-                        return False
-
             if not quiet:
-                print(f"✓ Archive '{archive_file_path}' (Format: {archive_data['metadata'].get('pak_format_version','unknown')}) appears valid. Contains {len(files_list)} file entries.", file=sys.stdout)
+                print(f"✓ Archive '{archive_file_path}' (Format: {format_version}) appears valid. Contains {entry_count} file entries.", file=sys.stdout)
             return True
         except FileNotFoundError:
             # Error already logged by _load_archive_json_data if not quiet
@@ -1,5 +1,6 @@
 import os
 import sys
+import atexit
 import json
 import re
 import hashlib
@@ -7,11 +8,12 @@ import time
 import asyncio
 import threading
 import random
-from collections import deque
+import warnings
+from collections import deque, OrderedDict
 from pathlib import Path
-from typing import List, Dict, Any, Optional, Callable, Tuple
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from functools import wraps
+from typing import List, Dict, Any, Optional, Callable, Tuple, Union
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+from functools import wraps, lru_cache
 
 # Import MultiLanguageAnalyzer from the sibling module
 try:
@@ -36,6 +38,63 @@ except ImportError:
     SEMANTIC_AVAILABLE = False
     requests = None # Define requests as None if import fails
 
+# Read once, after load_dotenv, so a key from .env counts too
+_HAS_API_KEY = bool(os.environ.get("OPENROUTER_API_KEY"))
+
+# orjson (optional) parses and serializes several times faster than the stdlib json module
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    orjson = None
+    ORJSON_AVAILABLE = False
+# Parses str or bytes; orjson.JSONDecodeError subclasses json.JSONDecodeError, so handlers work with either
+_json_loads = orjson.loads if orjson else json.loads
+
+
+def _json_dumps_compact(data: Any) -> str:
+    """Serialize without whitespace; both paths emit the same text (UTF-8, no ASCII escaping)."""
+    if orjson:
+        return orjson.dumps(data).decode('utf-8')
+    return json.dumps(data, separators=(',', ':'), ensure_ascii=False)
+
+# zstandard (optional) compresses cache shards on disk; text-heavy entries shrink several-fold
+# It is deliberately not applied to compressed_content: every level's output is text that gets
+# pasted into an LLM prompt, so a zstd/base64 blob would only inflate the token count.
+try:
+    import zstandard
+    ZSTD_AVAILABLE = True
+except ImportError:
+    zstandard = None
+    ZSTD_AVAILABLE = False
+
+# Algorithm of the bare keys in the single-file cache of older versions (see _migrate_single_file_cache)
+_LEGACY_HASH_PREFIX = "sha256:"
+
+# Fastest available content hash for cache keys (no cryptographic strength needed).
+# The prefix tags which algorithm produced a key so entries never mix. Entries cached under the
+# bare SHA-256 keys of older versions stay valid: they are migrated as "sha256:" keys, which
+# CacheManager also checks on a miss when another algorithm is active.
+try:
+    from blake3 import blake3 as _blake3
+    _CONTENT_HASH_PREFIX = "b3:"
+    # Past this size BLAKE3 splits one input across cores; below it the thread start-up costs more
+    _BLAKE3_MULTITHREAD_MIN_BYTES = 1 << 20
+    def _content_digest(data: bytes) -> str:
+        if len(data) >= _BLAKE3_MULTITHREAD_MIN_BYTES:
+            return _blake3(data, max_threads=_blake3.AUTO).hexdigest()
+        return _blake3(data).hexdigest()
+except ImportError:
+    try:
+        import xxhash
+        _CONTENT_HASH_PREFIX = "xxh3:"
+        def _content_digest(data: bytes) -> str:
+            return xxhash.xxh3_128_hexdigest(data)
+    except ImportError:
+        _CONTENT_HASH_PREFIX = "sha256:"
+        def _content_digest(data: bytes) -> str:
+            return hashlib.sha256(data).hexdigest()
+
 
 def retry_with_exponential_backoff(max_retries: int = 3, base_delay: float = 1.0, max_delay: float = 60.0, 
                                   backoff_multiplier: float = 2.0, jitter: bool = True):
@@ -126,6 +185,19 @@ def retry_with_exponential_backoff(max_retries: int = 3, base_delay: float = 1.0
     return decorator
 
 
+# Patterns used by LanguageAwareTokenizer for every file; compiled once at import.
+# Tabs are turned into spaces with str.replace first, so only space runs are left to collapse;
+# a pattern starting with a literal is scanned far faster than one starting with [ \t]
+_SPACE_RUN_RE = re.compile('  +') # Lone spaces are already normalized; skip them
+_BLANK_LINE_RUN_RE = re.compile(r'\n\s*\n\s*\n')
+_KEYWORD_REGEX_CACHE: Dict[str, "re.Pattern[str]"] = {}
+# Keyword patterns of the form \b(word|word|...)\b are counted with a set lookup over the
+# words of the text, which is several times faster than running the alternation at every offset
+_WORD_ALTERNATION_RE = re.compile(r'\\b\(([\w|]+)\)\\b')
+_WORD_RE = re.compile(r'\w+')
+_KEYWORD_SET_CACHE: Dict[str, Optional[frozenset]] = {}
+
+
 class LanguageAwareTokenizer:
     """Advanced token counter that considers language characteristics and patterns."""
     
@@ -216,7 +288,10 @@ class LanguageAwareTokenizer:
     def count_tokens(content: str, file_type: str = "text") -> int:
         if not content:
             return 0
-            
+        return _memoized_token_estimate(content, file_type)
+
+    @staticmethod
+    def _estimate_tokens(content: str, file_type: str) -> int:
         # Get language configuration
         config = LanguageAwareTokenizer.LANGUAGE_CONFIGS.get(file_type, LanguageAwareTokenizer.DEFAULT_CONFIG)
         
@@ -232,7 +307,7 @@ class LanguageAwareTokenizer:
         base_tokens = meaningful_chars / config['base_ratio']
         
         # Adjust for keyword density (keywords are typically more "token-dense")
-        keyword_matches = len(re.findall(config['keywords'], cleaned_content, re.IGNORECASE | re.MULTILINE))
+        keyword_matches = LanguageAwareTokenizer._count_keywords(config['keywords'], cleaned_content)
         keyword_adjustment = keyword_matches * config['keyword_weight']
         
         # Calculate final token count
@@ -240,6 +315,52 @@ class LanguageAwareTokenizer:
         
         return max(1, int(estimated_tokens))
     
+    @staticmethod
+    def _count_keywords(pattern: str, text: str) -> int:
+        if pattern not in _KEYWORD_SET_CACHE:
+            words = _WORD_ALTERNATION_RE.fullmatch(pattern)
+            _KEYWORD_SET_CACHE[pattern] = frozenset(words.group(1).lower().split('|')) if words else None
+        keyword_set = _KEYWORD_SET_CACHE[pattern]
+        if keyword_set is None:
+            return len(LanguageAwareTokenizer._keyword_regex(pattern).findall(text))
+        # Same count as the case-insensitive \b(...)\b regex: whole words, compared lowercased
+        return sum(map(keyword_set.__contains__, _WORD_RE.findall(text.lower())))
+
+    @staticmethod
+    def _keyword_regex(pattern: str) -> "re.Pattern[str]":
+        """Return the compiled keyword pattern, compiling it on first use."""
+        compiled = _KEYWORD_REGEX_CACHE.get(pattern)
+        if compiled is None:
+            compiled = re.compile(pattern, re.IGNORECASE | re.MULTILINE)
+            _KEYWORD_REGEX_CACHE[pattern] = compiled
+        return compiled
+
+    @staticmethod
+    def _remove_hash_comment_lines(text: str) -> str:
+        """
+        Drop every line whose first non-whitespace character is '#' (but not '#!'), newline
+        included. Jumps between '#' characters with str.find instead of running a regex that
+        must try a match at every line start, which is several times faster on source code.
+        """
+        find, rfind = text.find, text.rfind
+        parts = []
+        copied_up_to = 0
+        hash_idx = find('#')
+        while hash_idx != -1:
+            line_start = rfind('\n', 0, hash_idx) + 1
+            line_end = find('\n', hash_idx)
+            next_line = len(text) if line_end == -1 else line_end + 1
+            # Only the first '#' of a line can start a comment line, so move on to the next line either way
+            before_hash = text[line_start:hash_idx]
+            if (not before_hash or before_hash.isspace()) and not text.startswith('!', hash_idx + 1):
+                parts.append(text[copied_up_to:line_start])
+                copied_up_to = next_line
+            hash_idx = find('#', next_line)
+        if not parts:
+            return text
+        parts.append(text[copied_up_to:])
+        return "".join(parts)
+
     @staticmethod
     def _clean_content(content: str, config: Dict[str, Any]) -> str:
         """Clean content by removing comments and normalizing whitespace."""
@@ -249,23 +370,15 @@ class LanguageAwareTokenizer:
         # Remove single-line comments only if we can do it safely
         cleaned = content
         if config.get('comment_patterns') and '#' in config['comment_patterns']:
-            # Only remove lines that start with # (after whitespace)
-            lines = cleaned.split('\n')
-            cleaned_lines = []
-            
-            for line in lines:
-                stripped = line.strip()
-                # Only remove lines that are purely comments (start with #)
-                if stripped.startswith('#') and not stripped.startswith('#!'):  # Keep shebangs
-                    continue
-                # For inline comments, be very conservative - keep the line as is
-                cleaned_lines.append(line)
-            
-            cleaned = '\n'.join(cleaned_lines)
+            # Only remove lines that are purely comments (start with # after whitespace),
+            # keeping shebangs. Inline comments are left untouched.
+            cleaned = LanguageAwareTokenizer._remove_hash_comment_lines(cleaned)
         
         # Normalize whitespace: collapse multiple spaces but preserve structure
-        cleaned = re.sub(r'[ \t]+', ' ', cleaned)  # Collapse spaces/tabs
-        cleaned = re.sub(r'\n\s*\n\s*\n', '\n\n', cleaned)  # Collapse multiple blank lines
+        if '\t' in cleaned:
+            cleaned = cleaned.replace('\t', ' ')
+        cleaned = _SPACE_RUN_RE.sub(' ', cleaned)  # Collapse spaces/tabs
+        cleaned = _BLANK_LINE_RUN_RE.sub('\n\n', cleaned)  # Collapse multiple blank lines
         cleaned = cleaned.strip()
         
         return cleaned
@@ -273,14 +386,157 @@ class LanguageAwareTokenizer:
 # Backward compatibility alias
 TokenCounter = LanguageAwareTokenizer
 
+# The estimate is a pure function of (content, file_type). Levels that leave a file unchanged
+# (none, or light on already-clean code) and repeat calls for the same text count it only once.
+_memoized_token_estimate = lru_cache(maxsize=32)(LanguageAwareTokenizer._estimate_tokens)
+
+def _json_dump_bytes(data: Any) -> bytes:
+    if orjson:
+        return orjson.dumps(data)
+    return json.dumps(data, separators=(',', ':')).encode('utf-8')
+
+
+def _write_json_atomic(path: Path, data: Any):
+    """Write compact JSON to a temp file and swap it in, so an interrupted save never leaves a torn file."""
+    _write_bytes_atomic(path, _json_dump_bytes(data))
+
+
+def _write_bytes_atomic(path: Path, payload: bytes):
+    tmp_file = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    tmp_file.write_bytes(payload)
+    os.replace(tmp_file, path)
+
+
+class ShardedCache:
+    """
+    Dict-like store of cache entries split over up to 256 JSON files by the first two hex
+    digits of the content hash. A shard is read on first touch, at most max_loaded_shards
+    stay in memory (least recently used are dropped, after writing them if changed),
+    and changes are buffered until flush(), or written by the first change made more than
+    flush_interval seconds after the last write, so a crashed run loses at most that window.
+    With zstandard installed shards are stored zstd-compressed (xx.json.zst); plain shards
+    from before are still read and replaced.
+    """
+    SHARD_SUFFIX = ".json.zst" if zstandard else ".json"
+    _READ_ERRORS = (json.JSONDecodeError, IOError) + ((zstandard.ZstdError,) if zstandard else ())
+
+    def __init__(self, shard_dir: Path, max_loaded_shards: int = 64, log: Optional[Callable[[str], None]] = None,
+                 flush_interval: Optional[float] = 30.0):
+        self.shard_dir = shard_dir
+        self.max_loaded_shards = max(1, max_loaded_shards)
+        self.flush_interval = flush_interval # None: only explicit flush() and evictions write
+        self._last_flush = time.monotonic()
+        self._log = log or (lambda message: None)
+        self._shards: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._dirty: set = set()
+        self._lock = threading.RLock() # Thread-mode compression workers share one cache
+        # (De)compressor contexts are reused across shards; the lock serializes their use
+        self._zstd_compressor = zstandard.ZstdCompressor(level=3) if zstandard else None
+        self._zstd_decompressor = zstandard.ZstdDecompressor() if zstandard else None
+
+    @staticmethod
+    def shard_id(key: str) -> str:
+        # Keys look like "<hash algorithm>:<hex digest>_<level>[_<model>]"
+        return key[key.find(':') + 1:][:2]
+
+    def get(self, key: str, default: Any = None) -> Any:
+        with self._lock:
+            return self._get_shard(self.shard_id(key)).get(key, default)
+
+    def __contains__(self, key: str) -> bool:
+        with self._lock:
+            return key in self._get_shard(self.shard_id(key))
+
+    def __getitem__(self, key: str) -> Any:
+        with self._lock:
+            return self._get_shard(self.shard_id(key))[key]
+
+    def __setitem__(self, key: str, value: Any):
+        shard_id = self.shard_id(key)
+        with self._lock:
+            self._get_shard(shard_id)[key] = value
+            self._dirty.add(shard_id)
+            if self.flush_interval is not None and time.monotonic() - self._last_flush >= self.flush_interval:
+                self.flush()
+
+    def flush(self) -> int:
+        """Write every changed shard; returns how many were written."""
+        with self._lock:
+            dirty = sorted(self._dirty)
+            for shard_id in dirty:
+                self._write_shard(shard_id, self._shards[shard_id])
+            self._last_flush = time.monotonic()
+            return len(dirty)
+
+    def _get_shard(self, shard_id: str) -> Dict[str, Any]:
+        shard = self._shards.get(shard_id)
+        if shard is not None:
+            self._shards.move_to_end(shard_id)
+            return shard
+        shard = self._read_shard(shard_id)
+        self._shards[shard_id] = shard
+        while len(self._shards) > self.max_loaded_shards:
+            evicted_id, evicted = self._shards.popitem(last=False)
+            if evicted_id in self._dirty:
+                self._write_shard(evicted_id, evicted)
+        return shard
+
+    def _shard_path(self, shard_id: str) -> Path:
+        return self.shard_dir / f"{shard_id}{self.SHARD_SUFFIX}"
+
+    def _plain_shard_path(self, shard_id: str) -> Path:
+        return self.shard_dir / f"{shard_id}.json"
+
+    def _read_shard(self, shard_id: str) -> Dict[str, Any]:
+        shard_path = self._shard_path(shard_id)
+        try:
+            if self._zstd_decompressor:
+                try:
+                    return _json_loads(self._zstd_decompressor.decompress(shard_path.read_bytes()))
+                except FileNotFoundError:
+                    shard_path = self._plain_shard_path(shard_id) # Written before zstandard was installed
+            return _json_loads(shard_path.read_bytes())
+        except FileNotFoundError:
+            return {}
+        except self._READ_ERRORS as e:
+            self._log(f"Error loading cache shard {shard_path}: {e}. Starting the shard empty.")
+            return {}
+
+    def _write_shard(self, shard_id: str, shard: Dict[str, Any]):
+        payload = _json_dump_bytes(shard)
+        if self._zstd_compressor:
+            payload = self._zstd_compressor.compress(payload)
+        _write_bytes_atomic(self._shard_path(shard_id), payload)
+        if self._zstd_compressor:
+            # The compressed shard now holds everything the plain one had
+            self._plain_shard_path(shard_id).unlink(missing_ok=True)
+        self._dirty.discard(shard_id)
+
+
+@lru_cache(maxsize=None)
+def _cache_root(cache_dir_env: Optional[str]) -> Path:
+    """Resolve (and create, once per process) the cache directory for a PAK_CACHE_DIR value."""
+    cache_root = Path(cache_dir_env) if cache_dir_env else Path.home() / ".cache" / "pak_tool_cache"
+    (cache_root / "compression_cache").mkdir(parents=True, exist_ok=True)
+    return cache_root
+
+
 class CacheManager:
-    """Manages SHA-256 based caching for semantic compression results."""
+    """Manages content-hash based caching for compression results."""
+    # Below this many bytes in total, thread start-up costs more than parallel hashing saves
+    BULK_HASH_MIN_BYTES = 1 << 20
+
     def __init__(self, archive_path_or_id: str, quiet: bool = False):
-        cache_dir = Path(os.getenv("PAK_CACHE_DIR", Path.home() / ".cache" / "pak_tool_cache"))
-        cache_dir.mkdir(parents=True, exist_ok=True)
-        self.cache_file = cache_dir / f"compression_cache.json"
+        cache_root = _cache_root(os.getenv("PAK_CACHE_DIR"))
+        # Entries are sharded by hash prefix so a run only parses the shards it looks up
+        self.cache_dir = cache_root / "compression_cache"
+        self.cache_file = cache_root / "compression_cache.json" # Single-file cache of older versions
         self.quiet = quiet
-        self.cache: Dict[str, Any] = self._load_cache()
+        self.cache = ShardedCache(self.cache_dir, log=self._log)
+        self._migrate_single_file_cache()
+        # Only then can a miss under a faster hash still hit a "sha256:" entry of older versions
+        self.has_legacy_entries = (_CONTENT_HASH_PREFIX != _LEGACY_HASH_PREFIX
+                                   and (self.cache_dir / "_single_file_migrated").exists())
         self.hits = 0
         self.misses = 0
         self.total_lookups = 0
@@ -289,53 +545,78 @@ class CacheManager:
         if not self.quiet:
             print(f"CacheManager: {message}", file=sys.stderr)
 
-    def _load_cache(self) -> Dict[str, Any]:
-        if self.cache_file.exists():
-            try:
-                with open(self.cache_file, 'r', encoding='utf-8') as f:
-                    self._log(f"Loading cache from {self.cache_file}")
-                    cached_data = json.load(f)
-                    # Load stats if present
-                    self.hits = cached_data.get("_metadata", {}).get("hits", 0)
-                    self.misses = cached_data.get("_metadata", {}).get("misses", 0)
-                    self.total_lookups = self.hits + self.misses
-                    # Remove metadata before returning actual cache items
-                    if "_metadata" in cached_data:
-                        del cached_data["_metadata"]
-                    return cached_data
-            except (json.JSONDecodeError, IOError) as e:
-                self._log(f"Error loading cache file {self.cache_file}: {e}. Starting with empty cache.")
-                return {}
-        self._log("No cache file found. Starting with empty cache.")
-        return {}
+    def _migrate_single_file_cache(self):
+        """
+        Copy the entries of an old compression_cache.json into shards, once. Its keys are bare
+        SHA-256 digests, so they are stored under the "sha256:" prefix. The file is left in place;
+        a marker holding its mtime keeps it from being imported again until it changes.
+        """
+        try:
+            legacy_mtime = str(self.cache_file.stat().st_mtime_ns)
+        except OSError:
+            return # No single-file cache
+        marker_file = self.cache_dir / "_single_file_migrated"
+        try:
+            if marker_file.read_text() == legacy_mtime:
+                return
+        except OSError:
+            pass
+        try:
+            self._log(f"Migrating cache from {self.cache_file} into {self.cache_dir}")
+            cached_data = _json_loads(self.cache_file.read_bytes())
+            cached_data.pop("_metadata", None)
+            for cache_key, cached_item in cached_data.items():
+                self.cache[_LEGACY_HASH_PREFIX + cache_key] = cached_item
+            self.cache.flush()
+            marker_file.write_text(legacy_mtime)
+        except (ValueError, IOError) as e: # JSON decode errors are ValueErrors
+            self._log(f"Warning: Could not migrate cache file {self.cache_file}: {e}")
 
     def save_cache(self):
         try:
-            # Prepare data to save, including metadata
-            data_to_save = self.cache.copy()
-            data_to_save["_metadata"] = {
+            written = self.cache.flush()
+            _write_json_atomic(self.cache_dir / "_metadata.json", {
                 "hits": self.hits,
                 "misses": self.misses,
                 "hit_rate": self.get_hit_rate(),
                 "last_saved_utc": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
-            }
-            with open(self.cache_file, 'w', encoding='utf-8') as f:
-                json.dump(data_to_save, f, indent=2)
-            self._log(f"Cache saved to {self.cache_file} (Hits: {self.hits}, Misses: {self.misses}, Rate: {self.get_hit_rate():.2f}%)")
+            })
+            self._log(f"Cache saved to {self.cache_dir} ({written} shards written; Hits: {self.hits}, Misses: {self.misses}, Rate: {self.get_hit_rate():.2f}%)")
         except IOError as e:
-            self._log(f"Warning: Could not save cache to {self.cache_file}: {e}")
+            self._log(f"Warning: Could not save cache to {self.cache_dir}: {e}")
+
+    def get_content_hash(self, content: Union[str, bytes]) -> str:
+        # Callers that already hold the UTF-8 bytes pass them to skip a re-encode
+        data = content.encode('utf-8') if isinstance(content, str) else content
+        return _CONTENT_HASH_PREFIX + _content_digest(data)
 
-    def get_sha256(self, content: str) -> str:
-        return hashlib.sha256(content.encode('utf-8')).hexdigest()
+    def get_sha256(self, content: Union[str, bytes]) -> str:
+        """Deprecated alias of get_content_hash; the key is no longer always a SHA-256 digest."""
+        warnings.warn("CacheManager.get_sha256 is deprecated, use get_content_hash",
+                      DeprecationWarning, stacklevel=2)
+        return self.get_content_hash(content)
+
+    def get_hashes_bulk(self, contents: List[Union[str, bytes]]) -> List[str]:
+        """
+        Hash many contents in one call. Large batches are spread over a thread pool,
+        since hashlib (and blake3) release the GIL while digesting big buffers.
+        """
+        if len(contents) < 4 or sum(len(c) for c in contents) < self.BULK_HASH_MIN_BYTES:
+            return [self.get_content_hash(c) for c in contents]
+        with ThreadPoolExecutor(max_workers=min(len(contents), os.cpu_count() or 1)) as executor:
+            return list(executor.map(self.get_content_hash, contents))
 
-    def get_cached_compression(self, content: str, compression_level: str, model_info: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    def get_cached_compression(self, content: Union[str, bytes], compression_level: str, model_info: Optional[str] = None,
+                               content_hash: Optional[str] = None) -> Optional[Dict[str, Any]]:
         self.total_lookups += 1
-        content_hash = self.get_sha256(content)
+        content_hash = content_hash or self.get_content_hash(content)
         cache_key = f"{content_hash}_{compression_level}"
         if model_info:
             cache_key += f"_{model_info}"
         
         cached_item = self.cache.get(cache_key)
+        if not cached_item and self.has_legacy_entries:
+            cached_item = self._get_legacy_entry(content, cache_key)
         if cached_item:
             self.hits += 1
             self._log(f"Cache hit for key: {cache_key}")
@@ -345,8 +626,18 @@ class CacheManager:
         self._log(f"Cache miss for key: {cache_key}")
         return None
 
-    def cache_compression(self, content: str, compression_level: str, result: Dict[str, Any], model_info: Optional[str] = None):
-        content_hash = self.get_sha256(content)
+    def _get_legacy_entry(self, content: Union[str, bytes], cache_key: str) -> Optional[Dict[str, Any]]:
+        """Look up the "sha256:" key older versions used; a hit is copied to cache_key for next time."""
+        data = content.encode('utf-8') if isinstance(content, str) else content
+        legacy_key = _LEGACY_HASH_PREFIX + hashlib.sha256(data).hexdigest() + cache_key[cache_key.index('_'):]
+        cached_item = self.cache.get(legacy_key)
+        if cached_item:
+            self.cache[cache_key] = cached_item
+        return cached_item
+
+    def cache_compression(self, content: Union[str, bytes], compression_level: str, result: Dict[str, Any], model_info: Optional[str] = None,
+                          content_hash: Optional[str] = None):
+        content_hash = content_hash or self.get_content_hash(content)
         cache_key = f"{content_hash}_{compression_level}"
         if model_info:
             cache_key += f"_{model_info}"
@@ -369,6 +660,9 @@ class AdaptiveRateLimiter:
     """
     Adaptive rate limiter for OpenRouter API calls that adjusts timing based on response patterns.
     Prevents 429 errors and maintains conservative throughput.
+    Shared by the worker threads of SemanticCompressor.compress_batch, so all state is read and
+    updated under one lock; waits sleep outside it. Callers about to send a request use
+    acquire(), which checks for a free slot and reserves it in the same locked section.
     """
     def __init__(self, max_requests_per_minute: int = 15, quiet: bool = False):
         self.max_requests_per_minute = max_requests_per_minute
@@ -384,6 +678,7 @@ class AdaptiveRateLimiter:
         self.total_requests = 0
         self.total_errors = 0
         self.blocked_requests = 0
+        self._lock = threading.RLock() # Re-entrant: wait_if_needed/acquire call the other methods
 
     def _log(self, message: str, is_error: bool = False):
         if not self.quiet or is_error:
@@ -392,104 +687,277 @@ class AdaptiveRateLimiter:
 
     def can_make_request(self) -> bool:
         """Check if a request can be made based on current rate limits."""
-        now = time.time()
-        # Remove requests older than 60 seconds
-        while self.request_times and (now - self.request_times[0]) > 60:
-            self.request_times.popleft()
-            if self.request_durations: # Assuming durations are added only for successful ones synced with times
-                 self.request_durations.popleft()
-        return len(self.request_times) < self.max_requests_per_minute
+        with self._lock:
+            now = time.time()
+            # Remove requests older than 60 seconds
+            while self.request_times and (now - self.request_times[0]) > 60:
+                self.request_times.popleft()
+                if self.request_durations: # Assuming durations are added only for successful ones synced with times
+                     self.request_durations.popleft()
+            return len(self.request_times) < self.max_requests_per_minute
 
     def wait_if_needed(self) -> float:
         """Wait if necessary to respect rate limits. Returns actual wait time."""
-        if not self.can_make_request():
-            oldest_request = self.request_times[0]
-            wait_time = 60 - (time.time() - oldest_request) + 1 # +1 for safety margin
-            wait_time = max(wait_time, self.current_delay) # Ensure we also respect adaptive delay
-            self._log(f"Rate limit reached. Waiting {wait_time:.1f}s")
-            self.blocked_requests += 1
+        with self._lock:
+            wait_time = 0.0
+            if not self.can_make_request():
+                oldest_request = self.request_times[0]
+                wait_time = 60 - (time.time() - oldest_request) + 1 # +1 for safety margin
+                wait_time = max(wait_time, self.current_delay) # Ensure we also respect adaptive delay
+                self._log(f"Rate limit reached. Waiting {wait_time:.1f}s")
+                self.blocked_requests += 1
+            elif self.current_delay > self.base_delay:
+                # Apply adaptive delay even if within request per minute limit
+                wait_time = self.current_delay
+                self._log(f"Applying adaptive delay: {wait_time:.1f}s")
+        # Sleep without the lock so other threads can record results meanwhile
+        if wait_time:
             time.sleep(wait_time)
-            return wait_time
-        
-        # Apply adaptive delay even if within request per minute limit
-        if self.current_delay > self.base_delay:
-            self._log(f"Applying adaptive delay: {self.current_delay:.1f}s")
-            time.sleep(self.current_delay)
-            return self.current_delay
-        return 0.0
-
-    def record_request(self): # Duration will be recorded by record_success
-        """Record a request attempt."""
-        self.request_times.append(time.time())
-        self.total_requests += 1
-        # Optimistic: reduce delay if no errors and current delay is high
-        if self.consecutive_errors == 0 and self.current_delay > self.base_delay:
-            self.current_delay = max(self.base_delay, self.current_delay * 0.8) # Decrease delay by 20%
-            self._log(f"Reducing delay to {self.current_delay:.1f}s after successful request recorded (prior to call)")
+        return wait_time
+
+    def acquire(self) -> float:
+        """
+        Wait for a free request slot and reserve it: wait_if_needed plus record_request, but the
+        slot is checked and recorded under one lock, so concurrent callers never share a slot,
+        and after a rate-limit wait only as many as there are free slots go ahead. Returns the
+        total wait time.
+        """
+        waited = 0.0
+        counted_as_blocked = False
+        while True:
+            with self._lock:
+                if self.can_make_request():
+                    # Apply adaptive delay even if within request per minute limit; the slot is
+                    # dated when the request will actually be sent
+                    delay = self.current_delay if self.current_delay > self.base_delay else 0.0
+                    if delay:
+                        self._log(f"Applying adaptive delay: {delay:.1f}s")
+                    self.record_request(sent_at=time.time() + delay)
+                    break
+                wait_time = 60 - (time.time() - self.request_times[0]) + 1 # +1 for safety margin
+                wait_time = max(wait_time, self.current_delay) # Ensure we also respect adaptive delay
+                self._log(f"Rate limit reached. Waiting {wait_time:.1f}s")
+                if not counted_as_blocked:
+                    self.blocked_requests += 1
+                    counted_as_blocked = True
+            time.sleep(wait_time) # Outside the lock, then re-check: another thread may take the slot
+            waited += wait_time
+        if delay:
+            time.sleep(delay)
+        return waited + delay
+
+    def record_request(self, sent_at: Optional[float] = None): # Duration will be recorded by record_success
+        """Record a request attempt (sent now unless sent_at is given)."""
+        with self._lock:
+            self.request_times.append(time.time() if sent_at is None else sent_at)
+            self.total_requests += 1
+            # Optimistic: reduce delay if no errors and current delay is high
+            if self.consecutive_errors == 0 and self.current_delay > self.base_delay:
+                self.current_delay = max(self.base_delay, self.current_delay * 0.8) # Decrease delay by 20%
+                self._log(f"Reducing delay to {self.current_delay:.1f}s after successful request recorded (prior to call)")
 
 
     def record_error(self, error_type: str, status_code: Optional[int] = None):
         """Record an error and adjust rate limiting accordingly."""
-        self.total_errors += 1
-        self.consecutive_errors += 1
-        self.last_error_time = time.time()
-        self.error_types.append((error_type, status_code, time.time()))
-
-        if status_code == 429: # Rate limit specifically
-            self.current_delay = min(self.max_delay, self.current_delay * 2.0) # Double delay
-            self._log(f"Rate limit error. Increasing delay to {self.current_delay:.1f}s", is_error=True)
-            self.max_requests_per_minute = max(5, self.max_requests_per_minute - 2) # Become more conservative
-            self._log(f"Reducing max requests/min to {self.max_requests_per_minute}")
-        elif status_code in [500, 502, 503, 504]: # Server-side issues
-            self.current_delay = min(self.max_delay, self.current_delay * 1.5) # Increase delay by 50%
-            self._log(f"Server error ({status_code}). Increasing delay to {self.current_delay:.1f}s", is_error=True)
-        else: # Other errors
-            self.current_delay = min(self.max_delay, self.current_delay * 1.2) # Increase delay by 20%
-            self._log(f"Request error ({error_type}). Increasing delay to {self.current_delay:.1f}s", is_error=True)
+        with self._lock:
+            self.total_errors += 1
+            self.consecutive_errors += 1
+            self.last_error_time = time.time()
+            self.error_types.append((error_type, status_code, time.time()))
+
+            if status_code == 429: # Rate limit specifically
+                self.current_delay = min(self.max_delay, self.current_delay * 2.0) # Double delay
+                self._log(f"Rate limit error. Increasing delay to {self.current_delay:.1f}s", is_error=True)
+                self.max_requests_per_minute = max(5, self.max_requests_per_minute - 2) # Become more conservative
+                self._log(f"Reducing max requests/min to {self.max_requests_per_minute}")
+            elif status_code in [500, 502, 503, 504]: # Server-side issues
+                self.current_delay = min(self.max_delay, self.current_delay * 1.5) # Increase delay by 50%
+                self._log(f"Server error ({status_code}). Increasing delay to {self.current_delay:.1f}s", is_error=True)
+            else: # Other errors
+                self.current_delay = min(self.max_delay, self.current_delay * 1.2) # Increase delay by 20%
+                self._log(f"Request error ({error_type}). Increasing delay to {self.current_delay:.1f}s", is_error=True)
 
     def record_success(self, duration: Optional[float] = None):
         """Record a successful response and reset error count."""
-        if self.consecutive_errors > 0:
-            self._log(f"Request successful after {self.consecutive_errors} consecutive errors")
-        self.consecutive_errors = 0
+        with self._lock:
+            if self.consecutive_errors > 0:
+                self._log(f"Request successful after {self.consecutive_errors} consecutive errors")
+            self.consecutive_errors = 0
         
-        if duration is not None:
-            self.request_durations.append(duration)
+            if duration is not None:
+                self.request_durations.append(duration)
 
-        # Gradually recover max_requests_per_minute if it was reduced
-        original_max_rpm = 15 # Assuming this is a default/target
-        if self.max_requests_per_minute < original_max_rpm:
-             self.max_requests_per_minute = min(original_max_rpm, self.max_requests_per_minute + 1)
+            # Gradually recover max_requests_per_minute if it was reduced
+            original_max_rpm = 15 # Assuming this is a default/target
+            if self.max_requests_per_minute < original_max_rpm:
+                 self.max_requests_per_minute = min(original_max_rpm, self.max_requests_per_minute + 1)
 
 
     def get_stats(self) -> Dict[str, Any]:
         """Get current rate limiter statistics."""
-        error_rate = (self.total_errors / max(1, self.total_requests)) * 100
-        recent_errors = [e for e in self.error_types if time.time() - e[2] < 300] # Errors in last 5 mins
+        with self._lock:
+            error_rate = (self.total_errors / max(1, self.total_requests)) * 100
+            recent_errors = [e for e in self.error_types if time.time() - e[2] < 300] # Errors in last 5 mins
         
-        avg_duration = sum(self.request_durations) / len(self.request_durations) if self.request_durations else 0.0
+            avg_duration = sum(self.request_durations) / len(self.request_durations) if self.request_durations else 0.0
+
+            return {
+                "total_requests": self.total_requests,
+                "total_errors": self.total_errors,
+                "blocked_requests": self.blocked_requests,
+                "error_rate_percent": round(error_rate, 2),
+                "current_delay_seconds": round(self.current_delay, 1),
+                "max_requests_per_minute_setting": self.max_requests_per_minute,
+                "consecutive_errors": self.consecutive_errors,
+                "recent_errors_last_5m": len(recent_errors),
+                "avg_successful_request_duration_seconds": round(avg_duration, 2)
+            }
+# Outermost JSON object in an LLM reply: first '{' through last '}'
+_JSON_OBJECT_RE = re.compile(r'\{.*\}', re.DOTALL)
+
+# Truncate very long content to fit within reasonable prompt limits for the LLM.
+# This is a basic truncation; smarter chunking might be needed for huge files.
+# Max prompt content length (heuristic, depends on LLM context window)
+_MAX_PROMPT_CONTENT_CHARS = 100000
+
+# Static parts of SemanticCompressor's prompt, kept out of the per-call f-string so only
+# the file details and content are interpolated for each file.
+_PROMPT_PREAMBLE = """# SEMANTIC COMPRESSION TASK
+You are an expert code analyst. Your task is to compress the following file content into a structured JSON object.
+The JSON should capture the essence of the file, its purpose, key components, logic flow, and any critical details needed for a knowledgeable developer to reconstruct a functionally similar file. Be concise yet comprehensive.
+
+FILE INFORMATION:
+"""
+# JSON output schema of the semantic prompt, split so prompts for file types where a
+# "key_components" section cannot apply leave it out (shorter prompt and LLM reply)
+_PROMPT_SCHEMA_HEAD = """  "overall_purpose": "A brief (1-2 sentences) description of what this file does or its main responsibility.",
+  "key_components": """
+_KEY_COMPONENT_SCHEMA = {
+    "imports_dependencies": """    "imports_dependencies": ["List key libraries or modules imported/depended upon, e.g., 'os', 'requests', './utils.js'"]""",
+    "classes": """    "classes": [
+      {
+        "name": "ClassName",
+        "purpose": "Brief purpose of the class.",
+        "key_methods": ["method1_signature: brief purpose", "method2_signature: brief purpose"],
+        "key_attributes": ["attribute_name: brief description or type"]
+      }
+    ]""",
+    "functions_methods": """    "functions_methods": [
+      {
+        "name": "function_or_method_name (if not in a class above)",
+        "signature": "Full signature if available (e.g., funcName(param1: type, param2: type) -> returnType)",
+        "purpose": "Brief purpose of this function/method."
+      }
+    ]""",
+    "data_structures": """    "data_structures": ["Describe any significant global variables, constants, or complex data structures defined/used and their purpose."]""",
+    "configuration": """    "configuration": ["Mention any important configuration settings or parameters, possibly with default or example values."]""",
+}
+_PROMPT_SCHEMA_TAIL = """,
+  "core_logic_flow": "Describe the main operational logic or workflow of the file in a few sentences. How do the components interact? What are the main steps it performs?",
+  "critical_reconstruction_details": "List any specific algorithms, non-obvious implementation choices, formulas, or unique patterns that are essential for a developer to reconstruct the file's functionality. Focus on what is not easily inferred.",
+  "external_interactions": ["Describe interactions with other files, services, APIs, or databases if any."]
+}
+
+INSTRUCTIONS:
+- Adhere strictly to the JSON structure provided.
+- Ensure all string values are properly escaped for JSON.
+- If a section (e.g., 'classes') is not applicable, provide an empty list `[]` or a null/empty string as appropriate for the field type.
+- Be factual and derive information primarily from the provided content.
+- The goal is semantic compression, not just a line-by-line summary. Extract the meaning and intent.
+- Output ONLY the JSON object, without any surrounding text or markdown.
+"""
+_KEY_COMPONENTS_BY_TYPE = {
+    # Data/config files describe data, not code structure
+    **dict.fromkeys(("json", "yaml", "toml", "xml"), ("data_structures", "configuration")),
+    # Languages without classes
+    **dict.fromkeys(("c", "c_header", "shell", "makefile", "dockerfile"),
+                    ("imports_dependencies", "functions_methods", "data_structures", "configuration")),
+    **dict.fromkeys(("html", "css"), ("imports_dependencies", "configuration")),
+    "markdown": (),
+}
+
+
+def _prompt_schema(component_keys) -> str:
+    components = ",\n".join(_KEY_COMPONENT_SCHEMA[key] for key in component_keys)
+    return _PROMPT_SCHEMA_HEAD + ("{\n" + components + "\n  }" if components else "{}") + _PROMPT_SCHEMA_TAIL
+
+
+# Rendered once at import; file types not listed above (e.g. 'text') get the full schema
+_PROMPT_SCHEMA_AND_INSTRUCTIONS = _prompt_schema(_KEY_COMPONENT_SCHEMA)
+_PROMPT_SCHEMA_BY_TYPE = {file_type: _prompt_schema(keys) for file_type, keys in _KEY_COMPONENTS_BY_TYPE.items()}
+
+
+def _render_compression_prompt(content: str, file_path: str, file_type: str,
+                               original_size_bytes: Optional[int] = None) -> str:
+    if original_size_bytes is None:
+        original_size_bytes = len(content.encode('utf-8'))
+    if len(content) > _MAX_PROMPT_CONTENT_CHARS:
+        content = content[:_MAX_PROMPT_CONTENT_CHARS] + "\n... (content truncated for brevity) ..."
+
+    return f"""{_PROMPT_PREAMBLE}- Path: {file_path}
+- Type: {file_type}
+- Size (original): {original_size_bytes} bytes
+
+CONTENT TO ANALYZE:
+---BEGIN CONTENT---
+{content}
+---END CONTENT---
+
+REQUIRED JSON OUTPUT STRUCTURE:
+{{
+  "file_path": "{file_path}",
+  "file_type": "{file_type}",
+{_PROMPT_SCHEMA_BY_TYPE.get(file_type, _PROMPT_SCHEMA_AND_INSTRUCTIONS)}"""
+
+
+# Prompts recently rendered for a known content hash. Keyed by the hash rather than the content,
+# and small: every prompt embeds up to _MAX_PROMPT_CONTENT_CHARS of the file, and reuse only
+# happens for the file being compressed right now (a smart->semantic fallback).
+_PROMPT_CACHE_MAXSIZE = 8
+_prompt_cache: "OrderedDict[Tuple[str, str, str, Optional[int]], str]" = OrderedDict()
+_prompt_cache_lock = threading.Lock() # compress_batch renders from several threads
+
+def _render_compression_prompt_cached(content_hash: str, file_path: str, file_type: str, content: str,
+                                      original_size_bytes: Optional[int] = None) -> str:
+    cache_key = (content_hash, file_path, file_type, original_size_bytes)
+    with _prompt_cache_lock:
+        prompt = _prompt_cache.get(cache_key)
+        if prompt is not None:
+            _prompt_cache.move_to_end(cache_key)
+            return prompt
+    prompt = _render_compression_prompt(content, file_path, file_type, original_size_bytes)
+    with _prompt_cache_lock:
+        _prompt_cache[cache_key] = prompt
+        if len(_prompt_cache) > _PROMPT_CACHE_MAXSIZE:
+            _prompt_cache.popitem(last=False)
+    return prompt
+
 
-        return {
-            "total_requests": self.total_requests,
-            "total_errors": self.total_errors,
-            "blocked_requests": self.blocked_requests,
-            "error_rate_percent": round(error_rate, 2),
-            "current_delay_seconds": round(self.current_delay, 1),
-            "max_requests_per_minute_setting": self.max_requests_per_minute,
-            "consecutive_errors": self.consecutive_errors,
-            "recent_errors_last_5m": len(recent_errors),
-            "avg_successful_request_duration_seconds": round(avg_duration, 2)
-        }
 class SemanticCompressor:
     """Handles LLM-based semantic compression with adaptive rate limiting."""
     def __init__(self, quiet: bool = False):
-        self.api_key = os.getenv('OPENROUTER_API_KEY')
+        self._api_key: Optional[str] = None # Explicit override; see the api_key property
         self.model_name = os.getenv('SEMANTIC_MODEL', "anthropic/claude-3-haiku-20240307") # Default model
         self.api_base_url = os.getenv('PAK_OPENROUTER_API_BASE', "https://openrouter.ai/api/v1")
         self.timeout = int(os.getenv('PAK_LLM_TIMEOUT', "60"))
         self.max_tokens_response = int(os.getenv('PAK_LLM_MAX_TOKENS', "2000"))
         self.temperature = float(os.getenv('PAK_LLM_TEMPERATURE', "0.1"))
+        self.max_concurrency = max(1, int(os.getenv('PAK_LLM_CONCURRENCY', "8")))
+        # Request headers that do not depend on the API key, read from the environment once
+        # instead of on every call
+        self.static_headers = {
+            "Content-Type": "application/json",
+            "HTTP-Referer": os.getenv("PAK_HTTP_REFERER", "http://localhost/pak_tool"),
+            "X-Title": os.getenv("PAK_X_TITLE", "PakTool Semantic Compressor"),
+        }
         self.quiet = quiet
+        # One keep-alive session so batched calls reuse pooled TCP/TLS connections
+        self.session = None
+        if requests:
+            self.session = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(pool_connections=16, pool_maxsize=16)
+            self.session.mount("https://", adapter)
+            self.session.mount("http://", adapter)
 
         # Initialize adaptive rate limiter
         max_rpm = int(os.getenv('PAK_MAX_REQUESTS_PER_MINUTE', "15"))
@@ -498,12 +966,26 @@ class SemanticCompressor:
         if not self.api_key and not self.quiet:
             print("pak_compressor: Warning: OPENROUTER_API_KEY not found in environment. Semantic compression will fail.", file=sys.stderr)
 
+    @property
+    def api_key(self) -> Optional[str]:
+        """
+        The key set on this instance, else OPENROUTER_API_KEY read at each use: the instance is
+        shared for the whole process (see _shared_semantic_compressor), so a key exported after
+        it was built must still apply.
+        """
+        return self._api_key if self._api_key is not None else os.getenv('OPENROUTER_API_KEY')
+
+    @api_key.setter
+    def api_key(self, value: Optional[str]):
+        self._api_key = value
+
     def _log(self, message: str, is_error: bool = False):
         if not self.quiet or is_error: # Always print errors
             level = "ERROR" if is_error else "INFO"
             print(f"SemanticCompressor ({level}): {message}", file=sys.stderr)
 
-    def compress_content(self, content: str, file_path: str, file_type: str) -> Dict[str, Any]:
+    def compress_content(self, content: str, file_path: str, file_type: str,
+                         content_hash: Optional[str] = None, original_size_bytes: Optional[int] = None) -> Dict[str, Any]:
         if not SEMANTIC_AVAILABLE:
             self._log("Python 'requests' library not available. Cannot perform semantic compression.", is_error=True)
             raise Exception("Semantic compression dependencies not met (requests).")
@@ -511,7 +993,7 @@ class SemanticCompressor:
             self._log("OPENROUTER_API_KEY not set. Cannot perform semantic compression.", is_error=True)
             raise Exception("OPENROUTER_API_KEY missing for semantic compression.")
 
-        prompt = self._build_compression_prompt(content, file_path, file_type)
+        prompt = self._build_compression_prompt(content, file_path, file_type, content_hash, original_size_bytes)
         try:
             llm_response_text = self._call_llm_api(prompt)
             parsed_json = self._parse_compression_response(llm_response_text, file_path)
@@ -520,100 +1002,68 @@ class SemanticCompressor:
             self._log(f"Semantic compression failed for '{file_path}': {e}", is_error=True)
             raise # Re-raise to be handled by the main Compressor
 
-    def _build_compression_prompt(self, content: str, file_path: str, file_type: str) -> str:
-        # Truncate very long content to fit within reasonable prompt limits for the LLM
-        # This is a basic truncation; smarter chunking might be needed for huge files.
-        # Max prompt content length (heuristic, depends on LLM context window)
-        MAX_CONTENT_PROMPT_CHARS = 100000
-        if len(content) > MAX_CONTENT_PROMPT_CHARS:
-            self._log(f"Content for '{file_path}' is very long ({len(content)} chars), truncating for LLM prompt.")
-            content = content[:MAX_CONTENT_PROMPT_CHARS] + "\n... (content truncated for brevity) ..."
-
-        return f"""# SEMANTIC COMPRESSION TASK
-You are an expert code analyst. Your task is to compress the following file content into a structured JSON object.
-The JSON should capture the essence of the file, its purpose, key components, logic flow, and any critical details needed for a knowledgeable developer to reconstruct a functionally similar file. Be concise yet comprehensive.
+    def compress_batch(self, items: List[Tuple], max_workers: Optional[int] = None) -> List[Optional[Dict[str, Any]]]:
+        """
+        Semantically compress several files with concurrent LLM calls.
 
-FILE INFORMATION:
-- Path: {file_path}
-- Type: {file_type}
-- Size (original): {len(content.encode('utf-8'))} bytes
+        Args:
+            items: List of (content, file_path, file_type) tuples, optionally extended with
+                   content_hash and original_size_bytes when the caller already has them
+            max_workers: Concurrent requests (default: PAK_LLM_CONCURRENCY)
 
-CONTENT TO ANALYZE:
----BEGIN CONTENT---
-{content}
----END CONTENT---
+        Returns:
+            Parsed JSON data per item in input order, or None where compression failed
+        """
+        if not items:
+            return []
+        workers = max(1, min(max_workers or self.max_concurrency, len(items)))
+        self._log(f"Compressing {len(items)} files with up to {workers} concurrent LLM calls")
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            return list(executor.map(self._compress_or_none, items))
 
-REQUIRED JSON OUTPUT STRUCTURE:
-{{
-  "file_path": "{file_path}",
-  "file_type": "{file_type}",
-  "overall_purpose": "A brief (1-2 sentences) description of what this file does or its main responsibility.",
-  "key_components": {{
-    "imports_dependencies": ["List key libraries or modules imported/depended upon, e.g., 'os', 'requests', './utils.js'"],
-    "classes": [
-      {{
-        "name": "ClassName",
-        "purpose": "Brief purpose of the class.",
-        "key_methods": ["method1_signature: brief purpose", "method2_signature: brief purpose"],
-        "key_attributes": ["attribute_name: brief description or type"]
-      }}
-    ],
-    "functions_methods": [
-      {{
-        "name": "function_or_method_name (if not in a class above)",
-        "signature": "Full signature if available (e.g., funcName(param1: type, param2: type) -> returnType)",
-        "purpose": "Brief purpose of this function/method."
-      }}
-    ],
-    "data_structures": ["Describe any significant global variables, constants, or complex data structures defined/used and their purpose."],
-    "configuration": ["Mention any important configuration settings or parameters, possibly with default or example values."]
-  }},
-  "core_logic_flow": "Describe the main operational logic or workflow of the file in a few sentences. How do the components interact? What are the main steps it performs?",
-  "critical_reconstruction_details": "List any specific algorithms, non-obvious implementation choices, formulas, or unique patterns that are essential for a developer to reconstruct the file's functionality. Focus on what is not easily inferred.",
-  "external_interactions": ["Describe interactions with other files, services, APIs, or databases if any."]
-}}
+    def _compress_or_none(self, item: Tuple) -> Optional[Dict[str, Any]]:
+        try:
+            return self.compress_content(*item)
+        except Exception:
+            return None # Already logged by compress_content
 
-INSTRUCTIONS:
-- Adhere strictly to the JSON structure provided.
-- Ensure all string values are properly escaped for JSON.
-- If a section (e.g., 'classes') is not applicable, provide an empty list `[]` or a null/empty string as appropriate for the field type.
-- Be factual and derive information primarily from the provided content.
-- The goal is semantic compression, not just a line-by-line summary. Extract the meaning and intent.
-- Output ONLY the JSON object, without any surrounding text or markdown.
-"""
+    def _build_compression_prompt(self, content: str, file_path: str, file_type: str,
+                                  content_hash: Optional[str] = None, original_size_bytes: Optional[int] = None) -> str:
+        if len(content) > _MAX_PROMPT_CONTENT_CHARS:
+            self._log(f"Content for '{file_path}' is very long ({len(content)} chars), truncating for LLM prompt.")
+        if content_hash is None:
+            return _render_compression_prompt(content, file_path, file_type, original_size_bytes)
+        # Known content hash: smart->semantic fallbacks and repeat calls for the same file reuse
+        # the prompt instead of re-truncating and re-encoding the content
+        return _render_compression_prompt_cached(content_hash, file_path, file_type, content, original_size_bytes)
 
     @retry_with_exponential_backoff(max_retries=3, base_delay=2.0, max_delay=30.0)
     # Removed the duplicated decorator that was here
     def _call_llm_api(self, prompt: str) -> str:
-        wait_time = self.rate_limiter.wait_if_needed()
+        wait_time = self.rate_limiter.acquire() # Also records the request
         if wait_time > 0:
             self._log(f"Rate limited: waited {wait_time:.1f}s before API call")
 
-        headers = {
-            "Authorization": f"Bearer {self.api_key}",
-            "Content-Type": "application/json",
-            "HTTP-Referer": os.getenv("PAK_HTTP_REFERER", "http://localhost/pak_tool"),
-            "X-Title": os.getenv("PAK_X_TITLE", "PakTool Semantic Compressor"),
-        }
+        headers = {"Authorization": f"Bearer {self.api_key}", **self.static_headers}
         payload = {
             "model": self.model_name,
             "messages": [{"role": "user", "content": prompt}],
             "max_tokens": self.max_tokens_response,
             "temperature": self.temperature,
-            "stream": False
+            "stream": True
         }
 
         self._log(f"Calling LLM API ({self.model_name}) for semantic compression...")
-        self.rate_limiter.record_request() # Record attempt before call
         
         start_time = time.time()
-        response = requests.post(
+        response = (self.session or requests).post(
             f"{self.api_base_url}/chat/completions",
             headers=headers,
             json=payload,
-            timeout=self.timeout
+            timeout=self.timeout,
+            stream=True
         )
-        duration = time.time() - start_time
+        duration = time.time() - start_time # Time to response headers; updated once the stream is read
 
         if response.status_code == 429:
             self.rate_limiter.record_error("rate_limit", 429)
@@ -625,45 +1075,50 @@ INSTRUCTIONS:
             self.rate_limiter.record_error("http_error", response.status_code)
             self._log(f"HTTP error ({response.status_code}). LLM call duration: {duration:.2f}s. Will retry if retriable.", is_error=True)
         
-        response.raise_for_status() # This will raise an HTTPError if the response was an error
+        with response:
+            response.raise_for_status() # This will raise an HTTPError if the response was an error
+            content = self._read_streamed_content(response)
+        duration = time.time() - start_time
 
-        data = response.json()
-        if not data.get("choices") or not data["choices"][0].get("message") or \
-           not isinstance(data["choices"][0]["message"].get("content"), str):
+        if content is None:
             self.rate_limiter.record_error("invalid_response", response.status_code)
-            self._log(f"LLM API response missing expected content structure. Duration: {duration:.2f}s. Data: {data}", is_error=True)
+            self._log(f"LLM API stream carried no message content. Duration: {duration:.2f}s.", is_error=True)
             raise ValueError("Invalid LLM API response structure")
 
         self.rate_limiter.record_success(duration=duration)
         self._log(f"LLM API call successful. Duration: {duration:.2f}s.")
-        return data["choices"][0]["message"]["content"].strip()
+        return content.strip()
+
+    def _read_streamed_content(self, response) -> Optional[str]:
+        """Accumulate choices[0].delta.content from a server-sent-events completion stream."""
+        pieces: List[str] = []
+        saw_content = False
+        for raw_line in response.iter_lines():
+            # SSE lines are "data: {...}"; blank keep-alives and ": comment" lines are skipped
+            if not raw_line.startswith(b"data:"):
+                continue
+            data = raw_line[5:].strip()
+            if data == b"[DONE]":
+                break
+            chunk = _json_loads(data)
+            if chunk.get("error"):
+                raise ValueError(f"LLM API stream error: {chunk['error']}")
+            choices = chunk.get("choices") or [{}]
+            piece = (choices[0].get("delta") or {}).get("content")
+            if isinstance(piece, str):
+                pieces.append(piece)
+                saw_content = True
+        return "".join(pieces) if saw_content else None
     def _parse_compression_response(self, llm_response_text: str, file_path_for_log: str) -> Dict[str, Any]:
-        json_str = llm_response_text
-        # Attempt to strip markdown code block fences if present
-    
-        if json_str.startswith("```json"):
-            json_str = json_str[len("```json"):].strip()
-            if json_str.endswith("```"):
-                json_str = json_str[:-len("```")].strip()
-        elif json_str.startswith("```"): # If just ``` without 'json'
-             json_str = json_str[len("```"):].strip()
-             if json_str.endswith("```"):
-                json_str = json_str[:-len("```")].strip()
-
-
-        # Sometimes LLMs might add a brief preamble before the JSON. Try to find the start.
-        if not json_str.startswith('{'):
-            brace_pos = json_str.find('{')
-            if brace_pos != -1:
-                # And ensure it's a plausible JSON object by finding the matching last brace
-                # This is a heuristic and might not be perfect for nested objects in preamble
-                if json_str.rfind('}') > brace_pos:
-                    json_str = json_str[brace_pos : json_str.rfind('}')+1]
-            else:
-                self._log(f"LLM response for '{file_path_for_log}' does not appear to start with a JSON object. Response prefix: {json_str[:200]}", is_error=True)
-                raise ValueError("LLM response is not valid JSON (no starting '{').")
+        # Take everything from the first '{' to the last '}'. This drops markdown code fences
+        # and any preamble/epilogue the LLM adds around the JSON object in a single search.
+        match = _JSON_OBJECT_RE.search(llm_response_text)
+        if not match:
+            self._log(f"LLM response for '{file_path_for_log}' does not contain a JSON object. Response prefix: {llm_response_text[:200]}", is_error=True)
+            raise ValueError("LLM response is not valid JSON (no '{...}' object found).")
+        json_str = match.group()
         try:
-            parsed_data = json.loads(json_str)
+            parsed_data = _json_loads(json_str)
             # Basic validation of top-level keys expected from the prompt
             expected_keys = ["file_path", "file_type", "overall_purpose", "key_components", "core_logic_flow"]
             for key in expected_keys:
@@ -692,14 +1147,123 @@ INSTRUCTIONS:
         return self.rate_limiter.get_stats()
 
 
+@lru_cache(maxsize=None)
+def _shared_semantic_compressor(quiet: bool) -> SemanticCompressor:
+    """
+    One SemanticCompressor per process (and quiet setting): every Compressor shares its HTTP
+    session and rate limiter. Its settings (SEMANTIC_MODEL, PAK_LLM_*, PAK_MAX_REQUESTS_PER_MINUTE,
+    PAK_HTTP_REFERER, PAK_X_TITLE) are read from the environment once, when it is first built;
+    only OPENROUTER_API_KEY is read at each call.
+    """
+    return SemanticCompressor(quiet=quiet)
+
+
+# Compression levels answered by the LLM (alone, or attempted first by smart)
+_SEMANTIC_LEVELS = frozenset({"4", "semantic"})
+_SMART_LEVELS = frozenset({"s", "smart"})
+_LLM_LEVELS = _SEMANTIC_LEVELS | _SMART_LEVELS
+# Levels Compressor's fast mode runs as medium once a file is over fast_downgrade_bytes
+_AGGRESSIVE_LEVELS = frozenset({"3", "aggressive"})
+# File types smart compression sends to the LLM (above a minimum size)
+_SEMANTIC_CODE_TYPES = frozenset({'python', 'javascript', 'typescript', 'java', 'c', 'cpp', 'go', 'rust'})
+
+# Levels that return the content unchanged. Their results are never cached: the entry would just
+# duplicate the file, and rebuilding the result is cheaper than hashing the content for a lookup.
+_NONE_LEVELS = frozenset({"0", "none"})
+_NONE_RESULT_TEMPLATE = {"method": "none (raw)", "compression_ratio": 1.0}
+
+# With Compressor.min_compress_bytes set, a local level whose output is not at least this much
+# smaller than the input keeps the original content instead
+_MIN_USEFUL_RATIO = 1.02
+
+# Two or more consecutive empty lines, for Compressor._compress_light. Starting with a literal
+# lets the regex engine jump between candidates with a fast substring search.
+_EMPTY_LINE_RUN_RE = re.compile('\n\n\n+')
+
+# Single-line comment marker per file type for Compressor._remove_comments_and_empty_lines (simplified)
+_SINGLE_LINE_COMMENT_MARKERS = {"python": "#", "javascript": "//", "java": "//", "c": "//", "cpp": "//", "go": "//", "rust": "//", "shell": "#"}
+
+
+# Extension -> file type table used by Compressor._detect_file_type
+_FILE_TYPE_BY_EXT = {
+    '.py': 'python', '.js': 'javascript', '.ts': 'typescript', '.java': 'java',
+    '.c': 'c', '.h': 'c_header', '.cpp': 'cpp', '.hpp': 'cpp_header',
+    '.cs': 'csharp', '.go': 'go', '.rs': 'rust', '.rb': 'ruby', '.php': 'php',
+    '.md': 'markdown', '.txt': 'text', '.json': 'json', '.xml': 'xml', '.html': 'html',
+    '.css': 'css', '.sh': 'shell', '.yaml': 'yaml', '.yml': 'yaml', '.toml': 'toml',
+    # Add more types as needed
+}
+
+# Whole (lowercased) file names with a type of their own, checked before the extension table
+_FILE_TYPE_BY_NAME = {"dockerfile": "dockerfile", "makefile": "makefile"}
+
+
+def _detect_file_type(file_path: str) -> str:
+    # This is a simplified version. A more robust one might use `python-magic` or more mimetypes.
+    return _file_type_for_name(os.path.basename(file_path).lower())
+
+
+@lru_cache(maxsize=4096)
+def _file_type_for_name(name: str) -> str:
+    # Keyed by lowercased base name, not full path: files in different directories that share a
+    # name (__init__.py, index.js, Makefile) share one entry instead of one per path
+    file_type = _FILE_TYPE_BY_NAME.get(name)
+    if file_type is not None:
+        return file_type
+    return _FILE_TYPE_BY_EXT.get(os.path.splitext(name)[1], 'text') # Default to 'text'
+
+
+# Method markers of results compress_content returns without caching them
+_SKIP_METHOD_PREFIX = "skip ("
+_KEPT_ORIGINAL_SUFFIX = ", kept original"
+_CACHED_METHOD_SUFFIX = " (cached)"
+
+
+def _is_cacheable_result(result: Dict[str, Any]) -> bool:
+    """
+    False for results compress_content deliberately leaves out of the cache: skipped files,
+    results the min_compress_bytes guard replaced with the original, and cache hits.
+    """
+    method = result.get("method", "")
+    return not (method.startswith(_SKIP_METHOD_PREFIX) or method.endswith((_KEPT_ORIGINAL_SUFFIX, _CACHED_METHOD_SUFFIX)))
+
+
+# Metrics every finished compression result carries (see Compressor._finalize_result)
+_CACHED_RESULT_KEYS = frozenset({"original_size", "compressed_content", "compressed_size",
+                                 "compressed_tokens", "estimated_tokens", "compression_ratio"})
+
+
 class Compressor:
     """Handles various compression levels by delegating or performing them."""
-    def __init__(self, cache_manager: Optional[CacheManager] = None, quiet: bool = False):
+    # The non-semantic strategies are pure Python and hold the GIL, so a thread pool
+    # cannot speed them up; ParallelCompressor uses worker processes unless this is True.
+    releases_gil: bool = False
+
+    def __init__(self, cache_manager: Optional[CacheManager] = None, quiet: bool = False,
+                 min_compress_bytes: int = 0, fast: bool = False, fast_downgrade_bytes: int = 65536):
         self.cache_manager = cache_manager
-        self.semantic_compressor = SemanticCompressor(quiet=quiet) if SEMANTIC_AVAILABLE else None
+        # Files smaller than this (in UTF-8 bytes) skip the local levels, which cannot pay off on
+        # them; 0 compresses every file
+        self.min_compress_bytes = min_compress_bytes
+        # Fast mode trades ratio for speed: no LLM calls (semantic and smart run as with
+        # use_semantic=False), and aggressive runs as medium on files over fast_downgrade_bytes,
+        # where AST extraction costs the most for the least gain
+        self.fast = fast
+        self.fast_downgrade_bytes = fast_downgrade_bytes
+        self.semantic_compressor = _shared_semantic_compressor(quiet) if SEMANTIC_AVAILABLE else None
         self.quiet = quiet
         # Model info for caching semantic results, could be more dynamic
         self.semantic_model_info = self.semantic_compressor.model_name if self.semantic_compressor else "default_semantic_model"
+        # Strategy per compression level; "0", "none" and unknown levels fall through to _compress_none
+        self._llm_strategies = {
+            "4": self._compress_semantic, "semantic": self._compress_semantic,
+            "s": self._compress_smart, "smart": self._compress_smart,
+        }
+        self._local_strategies = {
+            "3": self._compress_aggressive, "aggressive": self._compress_aggressive,
+            "2": self._compress_medium, "medium": self._compress_medium,
+            "1": self._compress_light, "light": self._compress_light,
+        }
 
 
     def _log(self, message: str, is_error: bool = False):
@@ -708,65 +1272,249 @@ class Compressor:
             print(f"Compressor ({level}): {message}", file=sys.stderr)
 
     def _detect_file_type(self, file_path: str) -> str:
-        # This is a simplified version. A more robust one might use `python-magic` or more mimetypes.
-        ext = Path(file_path).suffix.lower()
-        type_map = {
-            '.py': 'python', '.js': 'javascript', '.ts': 'typescript', '.java': 'java',
-            '.c': 'c', '.h': 'c_header', '.cpp': 'cpp', '.hpp': 'cpp_header',
-            '.cs': 'csharp', '.go': 'go', '.rs': 'rust', '.rb': 'ruby', '.php': 'php',
-            '.md': 'markdown', '.txt': 'text', '.json': 'json', '.xml': 'xml', '.html': 'html',
-            '.css': 'css', '.sh': 'shell', '.yaml': 'yaml', '.yml': 'yaml', '.toml': 'toml',
-            # Add more types as needed
-        }
-        name = Path(file_path).name.lower()
-        if name == "dockerfile": return "dockerfile"
-        if name == "makefile": return "makefile"
-        return type_map.get(ext, 'text') # Default to 'text'
-
-    def compress_content(self, content: str, file_path: str, compression_level: str) -> Dict[str, Any]:
-        original_size_bytes = len(content.encode('utf-8'))
-        file_type = self._detect_file_type(file_path)
+        # Kept for callers; Compressor's own hot paths call the module-level cached function
+        # directly rather than paying a method dispatch per file
+        return _detect_file_type(file_path)
 
-        if not content.strip() and compression_level != "none":
+    def compress_content(self, content: Union[str, bytes], file_path: str, compression_level: str,
+                         content_hash: Optional[str] = None, *, use_semantic: bool = True,
+                         original_size_bytes: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Compress one file at the given level. With use_semantic=False the semantic and smart
+        levels run without the LLM (smart picks a local level), cached under their own key.
+        Callers that already know the content hash and UTF-8 size pass them to skip re-encoding;
+        content may also be given as UTF-8 bytes, which are decoded once and serve as both.
+        """
+        if self.fast:
+            use_semantic = False
+        cache_content: Union[str, bytes] = content
+        if isinstance(content, bytes):
+            original_size_bytes = len(content)
+            content = content.decode('utf-8')
+
+        if compression_level in _NONE_LEVELS:
+            return self._none_result(content, file_path, original_size_bytes)
+
+        # Encode once; the bytes serve both the size metric and the cache key. With the size and
+        # hash both supplied (or bytes given) no encoding is needed.
+        if original_size_bytes is None or (content_hash is None and self.cache_manager and isinstance(cache_content, str)):
+            cache_content = content.encode('utf-8')
+            original_size_bytes = len(cache_content)
+        compression_level = self._fast_level(compression_level, original_size_bytes)
+
+        # isspace() stops at the first non-blank character instead of copying like strip()
+        if (not content or content.isspace()) and compression_level != "none":
             return {
                 "compressed_content": "", "original_size": original_size_bytes,
                 "compressed_size": 0, "compressed_tokens": 0, "estimated_tokens": 0,
                 "compression_ratio": 1.0, "method": "skip (empty/whitespace)"
             }
 
-        cached_result = None
-        if self.cache_manager:
-            model_info_for_cache = self.semantic_model_info if compression_level in ["4", "semantic", "s", "smart"] else None
-            cached_result = self.cache_manager.get_cached_compression(content, compression_level, model_info_for_cache)
+        local_strategy = self._local_strategies.get(compression_level)
+        if local_strategy and original_size_bytes < self.min_compress_bytes:
+            return {**self._none_result(content, file_path, original_size_bytes), "method": "skip (small file)"}
 
+        # Fingerprint first: a warm cache is answered before any per-file analysis.
+        # The digest (computed here unless the caller already has it) is reused for the cache store after a miss.
+        if content_hash is None and self.cache_manager:
+            content_hash = self.cache_manager.get_content_hash(cache_content)
+        cached_result = self._get_cached(cache_content, compression_level, content_hash, use_semantic)
         if cached_result:
             self._log(f"Using cached result for {file_path} (level {compression_level})")
-            # Ensure essential keys are present, calculate if missing
+            return self._prepare_cached_result(cached_result, content, file_path, original_size_bytes, compression_level)
+
+        file_type = _detect_file_type(file_path)
+
+        result: Dict[str, Any] = {}
+        llm_strategy = self._llm_strategies.get(compression_level)
+        if llm_strategy:
+            result = llm_strategy(content, file_path, file_type, original_size_bytes, content_hash, use_semantic)
+        elif local_strategy:
+            result = local_strategy(content, file_path, file_type)
+            if self.min_compress_bytes and len(result["compressed_content"]) * _MIN_USEFUL_RATIO > len(content):
+                # Not worth it: keep the original, uncached like the none level
+                return {**self._none_result(content, file_path, original_size_bytes),
+                        "method": result['method'] + _KEPT_ORIGINAL_SUFFIX}
+        else:
+            result = self._compress_none(content)
+
+        result = self._finalize_result(result, cache_content, file_type, original_size_bytes, compression_level,
+                                       content_hash, use_semantic)
+
+        # Log rate limiter stats if semantic compression was used
+        if llm_strategy and use_semantic:
+            self._log_rate_limiter_stats()
+
+        return result
+
+    def compress_batch(self, compression_tasks: List[Tuple[str, str, str]], max_workers: Optional[int] = None,
+                       *, use_semantic: bool = True) -> List[Dict[str, Any]]:
+        """
+        Compress several files, sending every uncached LLM request (semantic files, and smart
+        files that attempt semantic first) as one concurrent batch instead of one blocking
+        request per file.
+
+        Args:
+            compression_tasks: List of (content, file_path, compression_level) tuples
+            max_workers: Concurrent LLM requests for the semantic batch
+            use_semantic: False runs every task without the LLM (see compress_content)
+
+        Returns:
+            List of compression results in the same order as input
+        """
+        if self.fast:
+            use_semantic = False
+        results: List[Optional[Dict[str, Any]]] = [None] * len(compression_tasks)
+        candidates: List[Tuple[int, str, bytes]] = [] # (index, file_type, content_bytes)
+        pending: List[Tuple[int, str, bytes, Optional[str]]] = [] # (index, file_type, content_bytes, content_hash)
+        repeats: List[Tuple[int, int]] = [] # (index, index of the identical earlier task)
+
+        # Content-addressed dedup: each distinct content is encoded and hashed once (in one bulk
+        # pass), and a task repeating an earlier (content, file_path, level) reuses its result
+        encoded: Dict[str, bytes] = {}
+        first_index: Dict[Tuple[str, str, str], int] = {}
+        for i, task in enumerate(compression_tasks):
+            task_key = tuple(task)
+            if task_key in first_index:
+                repeats.append((i, first_index[task_key]))
+                continue
+            first_index[task_key] = i
+            if task_key[0] not in encoded:
+                encoded[task_key[0]] = task_key[0].encode('utf-8')
+        content_hashes: Dict[str, Optional[str]] = dict.fromkeys(encoded)
+        if self.cache_manager:
+            content_hashes.update(zip(encoded, self.cache_manager.get_hashes_bulk(list(encoded.values()))))
+
+        local: List[int] = []
+        for i in first_index.values():
+            content, file_path, compression_level = compression_tasks[i]
+            if use_semantic and compression_level in _LLM_LEVELS and self.semantic_compressor and content and not content.isspace():
+                content_bytes = encoded[content]
+                file_type = _detect_file_type(file_path)
+                if compression_level in _SEMANTIC_LEVELS or self._smart_tries_semantic(file_type, len(content_bytes)):
+                    candidates.append((i, file_type, content_bytes))
+                    continue
+            local.append(i)
+
+        for i, file_type, content_bytes in candidates:
+            content, file_path, compression_level = compression_tasks[i]
+            content_hash = content_hashes[content]
+            cached_result = self._get_cached(content_bytes, compression_level, content_hash)
+            if cached_result:
+                self._log(f"Using cached result for {file_path} (level {compression_level})")
+                results[i] = self._prepare_cached_result(cached_result, content, file_path, len(content_bytes), compression_level)
+            else:
+                pending.append((i, file_type, content_bytes, content_hash))
+
+        # The LLM batch is network-bound, so it runs in the background while the local
+        # levels are compressed here; wall time is the longer of the two, not their sum
+        with ThreadPoolExecutor(max_workers=1) as llm_executor: # Starts no thread unless submitted to
+            semantic_future = None
+            if pending:
+                batch_items = [(compression_tasks[i][0], compression_tasks[i][1], file_type, content_hash, len(content_bytes))
+                               for i, file_type, content_bytes, content_hash in pending]
+                semantic_future = llm_executor.submit(self.semantic_compressor.compress_batch, batch_items, max_workers=max_workers)
+
+            for i in local:
+                content, file_path, compression_level = compression_tasks[i]
+                results[i] = self.compress_content(content, file_path, compression_level, content_hash=content_hashes[content],
+                                                   use_semantic=use_semantic, original_size_bytes=len(encoded[content]))
+
+            if semantic_future:
+                for (i, file_type, content_bytes, content_hash), semantic_data_json in zip(pending, semantic_future.result()):
+                    content, file_path, compression_level = compression_tasks[i]
+                    original_size_bytes = len(content_bytes)
+                    if semantic_data_json is None:
+                        result = self._semantic_fallback(content, file_path, file_type, "failed")
+                    else:
+                        result = {"compressed_content": self._format_semantic_output(semantic_data_json, file_path, file_type, original_size_bytes),
+                                  "method": "semantic-llm"}
+                    if compression_level in _SMART_LEVELS:
+                        result = self._smart_after_semantic(result, content, file_path, file_type, original_size_bytes)
+                    results[i] = self._finalize_result(result, content_bytes, file_type, original_size_bytes, compression_level, content_hash)
+                self._log_rate_limiter_stats()
+
+        for i, first in repeats:
+            results[i] = dict(results[first])
+        return results
+
+    def compress_many(self, compression_tasks: List[Tuple[str, str, str]], max_workers: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Compress independent files concurrently: CPU-bound levels in worker processes
+        (threads if this compressor releases the GIL), semantic levels as rate-limited LLM batches.
+        Cache reads and writes stay in this process.
+
+        Args:
+            compression_tasks: List of (content, file_path, compression_level) tuples
+            max_workers: Worker count (default: os.cpu_count())
+
+        Returns:
+            List of compression results in the same order as input
+        """
+        parallel = ParallelCompressor(self, max_workers=max_workers or os.cpu_count() or 1, quiet=self.quiet)
+        return parallel.compress_files_parallel(compression_tasks)
+
+    def lookup_cached(self, content: str, file_path: str, compression_level: str) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+        """
+        Look a file up in the cache without compressing it.
+
+        Returns:
+            (cached result ready to use, or None on a miss; content hash for storing the result later)
+        """
+        if (not self.cache_manager or compression_level in _NONE_LEVELS
+                or ((not content or content.isspace()) and compression_level != "none")):
+            return None, None
+        content_bytes = content.encode('utf-8')
+        content_hash = self.cache_manager.get_content_hash(content_bytes)
+        compression_level = self._fast_level(compression_level, len(content_bytes))
+        cached_result = self._get_cached(content_bytes, compression_level, content_hash, not self.fast)
+        if not cached_result:
+            return None, content_hash
+        self._log(f"Using cached result for {file_path} (level {compression_level})")
+        return self._prepare_cached_result(cached_result, content, file_path,
+                                           len(content_bytes), compression_level), content_hash
+
+    def _fast_level(self, compression_level: str, original_size_bytes: int) -> str:
+        """The level actually run: in fast mode, aggressive drops to medium above fast_downgrade_bytes."""
+        if self.fast and compression_level in _AGGRESSIVE_LEVELS and original_size_bytes > self.fast_downgrade_bytes:
+            return "medium"
+        return compression_level
+
+    def _model_info_for(self, compression_level: str, use_semantic: bool = True) -> Optional[str]:
+        return self.semantic_model_info if use_semantic and compression_level in _LLM_LEVELS else None
+
+    def _get_cached(self, content: Union[str, bytes], compression_level: str,
+                    content_hash: Optional[str] = None, use_semantic: bool = True) -> Optional[Dict[str, Any]]:
+        if not self.cache_manager:
+            return None
+        return self.cache_manager.get_cached_compression(content, compression_level, self._model_info_for(compression_level, use_semantic),
+                                                         content_hash=content_hash)
+
+    def _prepare_cached_result(self, cached_result: Dict[str, Any], content: str, file_path: str,
+                               original_size_bytes: int, compression_level: str) -> Dict[str, Any]:
+        # Copy so the entry held by the cache is not mutated by the "(cached)" suffix below
+        cached_result = dict(cached_result)
+        if cached_result.get("compression_ratio") is None:
+            cached_result.pop("compression_ratio", None) # orjson stores an infinite ratio as null
+        # Entries written by _finalize_result already carry every metric and are returned as-is;
+        # only partial entries (e.g. from older caches) have the missing keys calculated
+        if not _CACHED_RESULT_KEYS.issubset(cached_result):
             cached_result.setdefault("original_size", original_size_bytes)
             cached_result.setdefault("compressed_content", content if compression_level == "none" else "")
             cc = cached_result["compressed_content"]
             cs = len(cc.encode('utf-8'))
             cached_result.setdefault("compressed_size", cs)
-            cached_result.setdefault("compressed_tokens", LanguageAwareTokenizer.count_tokens(cc, file_type))
-            cached_result.setdefault("estimated_tokens", cached_result.get("compressed_tokens", 0))  # Add estimated_tokens alias
+            if "compressed_tokens" not in cached_result:
+                cached_result["compressed_tokens"] = LanguageAwareTokenizer.count_tokens(cc, _detect_file_type(file_path))
+            cached_result.setdefault("estimated_tokens", cached_result["compressed_tokens"])  # Add estimated_tokens alias
             cached_result.setdefault("compression_ratio", original_size_bytes / cs if cs > 0 else (1.0 if original_size_bytes == 0 else float('inf')))
-            cached_result["method"] += " (cached)"
-            return cached_result
-
-        result: Dict[str, Any] = {}
-        if compression_level in ["4", "semantic"]:
-            result = self._compress_semantic(content, file_path, file_type)
-        elif compression_level in ["s", "smart"]:
-            result = self._compress_smart(content, file_path, file_type, original_size_bytes)
-        elif compression_level in ["3", "aggressive"]:
-            result = self._compress_aggressive(content, file_path, file_type)
-        elif compression_level in ["2", "medium"]:
-            result = self._compress_medium(content, file_path, file_type)
-        elif compression_level in ["1", "light"]:
-            result = self._compress_light(content, file_path, file_type)
-        else: # "0", "none", or unknown defaults to none
-            result = self._compress_none(content)
+        cached_result["method"] += _CACHED_METHOD_SUFFIX
+        return cached_result
 
+    def _finalize_result(self, result: Dict[str, Any], content: Union[str, bytes], file_type: str,
+                         original_size_bytes: int, compression_level: str,
+                         content_hash: Optional[str] = None, use_semantic: bool = True) -> Dict[str, Any]:
+        """Fill in size/token metrics for a fresh result and store it in the cache."""
         result["original_size"] = original_size_bytes
         compressed_content_str = result.get("compressed_content", "")
         result["compressed_size"] = len(compressed_content_str.encode('utf-8'))
@@ -779,74 +1527,92 @@ class Compressor:
             result["compression_ratio"] = 1.0 if original_size_bytes == 0 else float('inf')
 
         if self.cache_manager:
-            model_info_for_cache = self.semantic_model_info if compression_level in ["4", "semantic", "s", "smart"] else None
-            self.cache_manager.cache_compression(content, compression_level, result, model_info_for_cache)
-
-        # Log rate limiter stats if semantic compression was used
-        if compression_level in ["4", "semantic", "s", "smart"] and self.semantic_compressor:
-            stats = self.semantic_compressor.get_rate_limiter_stats()
-            if stats["total_requests"] > 0:
-                self._log(f"Rate limiter stats: {stats['total_requests']} requests, "
-                         f"{stats['error_rate_percent']}% errors, "
-                         f"{stats['blocked_requests']} blocked, "
-                         f"current delay: {stats['current_delay']:.1f}s")
-
+            self.cache_manager.cache_compression(content, compression_level, result, self._model_info_for(compression_level, use_semantic),
+                                                 content_hash=content_hash)
         return result
 
-    def _compress_semantic(self, content: str, file_path: str, file_type: str) -> Dict[str, Any]:
+    def _log_rate_limiter_stats(self):
+        if not self.semantic_compressor:
+            return
+        stats = self.semantic_compressor.get_rate_limiter_stats()
+        if stats["total_requests"] > 0:
+            self._log(f"Rate limiter stats: {stats['total_requests']} requests, "
+                     f"{stats['error_rate_percent']}% errors, "
+                     f"{stats['blocked_requests']} blocked, "
+                     f"current delay: {stats['current_delay_seconds']:.1f}s")
+
+    def _compress_semantic(self, content: str, file_path: str, file_type: str, original_size_bytes: int,
+                           content_hash: Optional[str] = None, use_semantic: bool = True) -> Dict[str, Any]:
         method_desc = "semantic-llm"
+        if not use_semantic:
+            self._log(f"Semantic compression disabled for '{file_path}'. Falling back to aggressive.")
+            return self._semantic_fallback(content, file_path, file_type, "disabled")
         if not self.semantic_compressor:
             self._log("Semantic compressor not initialized. Falling back to aggressive.", is_error=True)
-            fallback_res = self._compress_aggressive(content, file_path, file_type)
-            fallback_res["method"] = f"{method_desc}-unavailable, fallback to {fallback_res['method']}"
-            return fallback_res
+            return self._semantic_fallback(content, file_path, file_type, "unavailable")
         try:
             # SemanticCompressor.compress_content returns the structured JSON data
-            semantic_data_json = self.semantic_compressor.compress_content(content, file_path, file_type)
-
-            # Format this JSON data into the string that will be stored in the archive
-            # This string includes headers for context.
-            final_compressed_str = f"# SEMANTIC COMPRESSION v1.1 (pak_compressor.py)\n"
-            final_compressed_str += f"# Original: {os.path.basename(file_path)} ({len(content.encode('utf-8'))} bytes, {file_type})\n"
-            final_compressed_str += f"# Model: {self.semantic_compressor.model_name}\n"
-            final_compressed_str += json.dumps(semantic_data_json, indent=2)
-
-            return {"compressed_content": final_compressed_str, "method": method_desc}
+            semantic_data_json = self.semantic_compressor.compress_content(content, file_path, file_type,
+                                                                           content_hash, original_size_bytes)
+            return {"compressed_content": self._format_semantic_output(semantic_data_json, file_path, file_type, original_size_bytes),
+                    "method": method_desc}
         except Exception as e:
             self._log(f"Semantic compression for '{file_path}' failed: {e}. Falling back.", is_error=True)
-            fallback_res = self._compress_aggressive(content, file_path, file_type) # Fallback to aggressive
-            fallback_res["method"] = f"{method_desc}-failed, fallback to {fallback_res['method']}"
-            return fallback_res
-
-    def _compress_smart(self, content: str, file_path: str, file_type: str, original_size_bytes: int) -> Dict[str, Any]:
+            return self._semantic_fallback(content, file_path, file_type, "failed")
+
+    def _format_semantic_output(self, semantic_data_json: Dict[str, Any], file_path: str, file_type: str, original_size_bytes: int) -> str:
+        # Format the JSON data into the string that will be stored in the archive
+        # This string includes headers for context.
+        final_compressed_str = f"# SEMANTIC COMPRESSION v1.1 (pak_compressor.py)\n"
+        final_compressed_str += f"# Original: {os.path.basename(file_path)} ({original_size_bytes} bytes, {file_type})\n"
+        final_compressed_str += f"# Model: {self.semantic_compressor.model_name}\n"
+        # Compact JSON: the payload is machine-read, and indentation inflated it by a third or more
+        final_compressed_str += _json_dumps_compact(semantic_data_json)
+        return final_compressed_str
+
+    def _semantic_fallback(self, content: str, file_path: str, file_type: str, reason: str) -> Dict[str, Any]:
+        fallback_res = self._compress_aggressive(content, file_path, file_type) # Fallback to aggressive
+        fallback_res["method"] = f"semantic-llm-{reason}, fallback to {fallback_res['method']}"
+        return fallback_res
+
+    def _compress_smart(self, content: str, file_path: str, file_type: str, original_size_bytes: int,
+                        content_hash: Optional[str] = None, use_semantic: bool = True) -> Dict[str, Any]:
         self._log(f"Smart compression for {file_path} (type: {file_type}, size: {original_size_bytes}B)")
-        # Heuristic: prioritize semantic for code files over a certain size, or very small text files
-        is_code = file_type in ['python', 'javascript', 'typescript', 'java', 'c', 'cpp', 'go', 'rust']
-
-        if is_code and original_size_bytes > 256: # Threshold for attempting semantic on code
+        # Without an LLM to ask, go straight to the size-based local choice below
+        if use_semantic and self.semantic_compressor and self._smart_tries_semantic(file_type, original_size_bytes):
             self._log(f"Attempting semantic for code file: {file_path}")
-            semantic_result = self._compress_semantic(content, file_path, file_type)
-            # Check if semantic compression was effective (e.g., ratio > 1.5 or method doesn't indicate failure)
-            # Note: compression_ratio is calculated *after* this call by the main compress_content
-            # So we look at the method string or estimate here.
-            final_semantic_size = len(semantic_result.get("compressed_content", "").encode('utf-8'))
-            semantic_ratio = original_size_bytes / final_semantic_size if final_semantic_size > 0 else 1.0
-
-            if "failed" not in semantic_result["method"].lower() and semantic_ratio > 1.2:
-                semantic_result["method"] = f"smart->{semantic_result['method']}"
-                return semantic_result
-            else:
-                self._log(f"Semantic part of smart compression for {file_path} was ineffective (ratio {semantic_ratio:.1f}) or failed. Falling back.")
-                # Fallback logic based on original size if semantic wasn't good
-                if original_size_bytes > 10000: return self._add_method_prefix(self._compress_aggressive(content, file_path, file_type), "smart->")
-                elif original_size_bytes > 1000: return self._add_method_prefix(self._compress_medium(content, file_path, file_type), "smart->")
-                else: return self._add_method_prefix(self._compress_light(content, file_path, file_type), "smart->")
+            semantic_result = self._compress_semantic(content, file_path, file_type, original_size_bytes, content_hash)
+            return self._smart_after_semantic(semantic_result, content, file_path, file_type, original_size_bytes)
 
         # Fallback for non-code or small code files
         if original_size_bytes > 5000: return self._add_method_prefix(self._compress_aggressive(content, file_path, file_type), "smart->")
         if original_size_bytes > 500: return self._add_method_prefix(self._compress_medium(content, file_path, file_type), "smart->")
         return self._add_method_prefix(self._compress_light(content, file_path, file_type), "smart->")
 
+    @staticmethod
+    def _smart_tries_semantic(file_type: str, original_size_bytes: int) -> bool:
+        # Heuristic: prioritize semantic for code files over a certain size
+        is_code = file_type in _SEMANTIC_CODE_TYPES
+        return is_code and original_size_bytes > 256 # Threshold for attempting semantic on code
+
+    def _smart_after_semantic(self, semantic_result: Dict[str, Any], content: str, file_path: str, file_type: str,
+                              original_size_bytes: int) -> Dict[str, Any]:
+        """Keep smart's semantic attempt if it was effective, otherwise fall back by size."""
+        # Check if semantic compression was effective (e.g., ratio > 1.5 or method doesn't indicate failure)
+        # Note: compression_ratio is calculated *after* this call by the main compress_content
+        # So we look at the method string or estimate here.
+        final_semantic_size = len(semantic_result.get("compressed_content", "").encode('utf-8'))
+        semantic_ratio = original_size_bytes / final_semantic_size if final_semantic_size > 0 else 1.0
+
+        if "failed" not in semantic_result["method"].lower() and semantic_ratio > 1.2:
+            semantic_result["method"] = f"smart->{semantic_result['method']}"
+            return semantic_result
+        self._log(f"Semantic part of smart compression for {file_path} was ineffective (ratio {semantic_ratio:.1f}) or failed. Falling back.")
+        # Fallback logic based on original size if semantic wasn't good
+        if original_size_bytes > 10000: return self._add_method_prefix(self._compress_aggressive(content, file_path, file_type), "smart->")
+        elif original_size_bytes > 1000: return self._add_method_prefix(self._compress_medium(content, file_path, file_type), "smart->")
+        else: return self._add_method_prefix(self._compress_light(content, file_path, file_type), "smart->")
+
     def _add_method_prefix(self, result_dict: Dict[str, Any], prefix: str) -> Dict[str, Any]:
         result_dict["method"] = prefix + result_dict.get("method", "unknown")
         return result_dict
@@ -874,39 +1640,42 @@ class Compressor:
     def _remove_comments_and_empty_lines(self, text_content: str, file_type: str) -> str:
         # This is a very basic heuristic and might incorrectly remove things.
         # A robust solution would use a proper parser for each language (e.g., tree-sitter).
-        lines = text_content.splitlines()
-        processed_lines = []
-
-        # Language specific comment markers (simplified)
-        single_line_markers = {"python": "#", "javascript": "//", "java": "//", "c": "//", "cpp": "//", "go": "//", "rust": "//", "shell": "#"}
-        # Multi-line not handled by this simple version to avoid complexity.
-
-        marker = single_line_markers.get(file_type)
-
-        for line in lines:
-            stripped_line = line.strip()
-            if not stripped_line: # Skip empty lines
-                continue
-            if marker:
-                # Be careful not to remove markers inside strings, e.g. print("# Not a comment")
-                # This simple check looks if the line *starts* with the marker after stripping.
-                if stripped_line.startswith(marker):
-                    continue
-                # For inline comments, it's harder. This might remove valid code if marker appears mid-string.
-                # A slightly safer approach for inline (but still not perfect):
-                comment_start_idx = line.find(marker)
-                if comment_start_idx != -1:
-                    # Crude check: if no quote before the marker on the line or an even number of quotes
+        # Multi-line comments are not handled by this simple version to avoid complexity.
+        marker = _SINGLE_LINE_COMMENT_MARKERS.get(file_type)
+
+        if marker and marker in text_content:
+            # Jump from marker to marker with str.find so only lines containing one are
+            # touched in Python; everything between them is copied through as one slice.
+            # Rejoining and splitting once below is faster than splitlines() on every piece.
+            parts = []
+            find, rfind, end = text_content.find, text_content.rfind, len(text_content)
+            copied_up_to = 0
+            marker_idx = find(marker)
+            while marker_idx != -1:
+                line_start = rfind('\n', 0, marker_idx) + 1
+                line_end = find('\n', marker_idx)
+                if line_end == -1:
+                    line_end = end
+                parts.append(text_content[copied_up_to:line_start])
+                line = text_content[line_start:line_end]
+                # A line that *starts* with the marker is a whole-line comment and is dropped.
+                if not line.lstrip().startswith(marker):
+                    # For inline comments, it's harder. Crude check: an even number of quotes
+                    # before the marker means it is probably not inside a string.
                     # This is highly unreliable for complex strings.
-                    slicer = line[:comment_start_idx]
-                    if slicer.count('"') % 2 == 0 and slicer.count("'") % 2 == 0:
-                        line_content_only = line[:comment_start_idx].rstrip()
-                        if line_content_only: # Keep line if content before comment
-                           processed_lines.append(line_content_only)
-                        continue # Skip line if only comment or whitespace before it
-            processed_lines.append(line) # Keep line if no comment processing applied or passed
+                    # The low bit of the OR is set iff either count is odd, so both parities
+                    # are tested at once without a second comparison branch.
+                    before_marker = line[:marker_idx - line_start]
+                    if not (before_marker.count('"') | before_marker.count("'")) & 1:
+                        parts.append(before_marker.rstrip())
+                    else:
+                        parts.append(line)
+                copied_up_to = line_end
+                marker_idx = find(marker, line_end)
+            parts.append(text_content[copied_up_to:])
+            text_content = "".join(parts)
 
-        return "\n".join(processed_lines)
+        return "\n".join(filter(str.strip, text_content.splitlines())) # Skip empty lines
 
 
     def _compress_medium(self, content: str, file_path: str, file_type: str) -> Dict[str, Any]:
@@ -915,23 +1684,23 @@ class Compressor:
         return {"compressed_content": cleaned_content, "method": "medium (comments/blanks removed)"}
 
     def _compress_light(self, content: str, file_path: str, file_type: str) -> Dict[str, Any]:
-        lines = content.splitlines()
-        processed_lines = []
-        last_was_blank = False
-        for line in lines:
-            stripped = line.rstrip() # Remove trailing whitespace only
-            if not stripped.strip(): # Line is effectively blank
-                if not last_was_blank:
-                    processed_lines.append("") # Add one blank line
-                last_was_blank = True
-            else:
-                processed_lines.append(stripped)
-                last_was_blank = False
-        final_content = "\n".join(processed_lines).strip('\n') # Remove leading/trailing blank lines from the whole content
+        # Remove trailing whitespace only (rstrip mapped over the lines in C), which leaves blank
+        # lines empty, then collapse each run of blank lines into one
+        final_content = "\n".join(map(str.rstrip, content.splitlines()))
+        final_content = _EMPTY_LINE_RUN_RE.sub("\n\n", final_content)
+        final_content = final_content.strip('\n') # Remove leading/trailing blank lines from the whole content
         return {"compressed_content": final_content, "method": "light (whitespace norm.)"}
 
     def _compress_none(self, content: str) -> Dict[str, Any]:
         return {"compressed_content": content, "method": "none (raw)"}
+
+    def _none_result(self, content: str, file_path: str, original_size_bytes: Optional[int] = None) -> Dict[str, Any]:
+        """Finished result for the "none" level, built directly without the cache or _finalize_result."""
+        if original_size_bytes is None:
+            original_size_bytes = len(content.encode('utf-8'))
+        tokens = LanguageAwareTokenizer.count_tokens(content, _detect_file_type(file_path))
+        return {**_NONE_RESULT_TEMPLATE, "compressed_content": content, "original_size": original_size_bytes,
+                "compressed_size": original_size_bytes, "compressed_tokens": tokens, "estimated_tokens": tokens}
     
     def get_rate_limiter_stats(self) -> Optional[Dict[str, Any]]:
         """Get rate limiter statistics if semantic compressor is available."""
@@ -940,16 +1709,47 @@ class Compressor:
         return None
 
 
+# Per-process Compressor used by ParallelCompressor's process pool, built once by _init_worker
+_worker_compressor: Optional["Compressor"] = None
+
+
+def _init_worker(quiet: bool, compressor_options: Dict[str, Any]):
+    """ProcessPoolExecutor initializer: build the worker's Compressor once instead of per task."""
+    global _worker_compressor
+    _worker_compressor = Compressor(cache_manager=None, quiet=quiet, **compressor_options)
+
+
+def _compress_in_worker(content: str, file_path: str, compression_level: str) -> Dict[str, Any]:
+    return _worker_compressor.compress_content(content, file_path, compression_level)
+
+
+def _compress_each(compress_fn: Callable[..., Dict[str, Any]], tasks: List[Tuple[str, str, str]]) -> List[Any]:
+    """Run compress_fn over a chunk of tasks; a task that fails yields its exception instead of a result."""
+    results: List[Any] = []
+    for task in tasks:
+        try:
+            results.append(compress_fn(*task))
+        except Exception as e:
+            results.append(e)
+    return results
+
+
 class ParallelCompressor:
     """
     Parallel compression manager that processes multiple files concurrently
     while respecting rate limits and maintaining conservative throughput.
     """
-    
-    def __init__(self, base_compressor: Compressor, max_workers: int = 3, quiet: bool = False):
+    # Below this much content in total a non-semantic batch stays sequential: starting worker
+    # processes (re-importing the modules in each) costs more than compressing in this one
+    PROCESS_POOL_MIN_BYTES = 1 << 20
+
+    def __init__(self, base_compressor: Compressor, max_workers: int = 3, quiet: bool = False,
+                 use_processes: Optional[bool] = None):
         self.base_compressor = base_compressor
         self.max_workers = max_workers
         self.quiet = quiet
+        # Non-semantic work is CPU-bound; run it in processes unless the compressor releases the GIL
+        self.use_processes = (not base_compressor.releases_gil) if use_processes is None else use_processes
         
         # Shared rate limiter instance from semantic compressor
         self.rate_limiter = None
@@ -983,9 +1783,15 @@ class ParallelCompressor:
         
         return semantic_likely and self.rate_limiter is not None
     
+    def _should_use_processes(self, compression_tasks: List[Tuple[str, str, str]]) -> bool:
+        """Whether a batch with no semantic work is large enough to pay for a process pool."""
+        return (self.use_processes and len(compression_tasks) > 1
+                and not any(self._compression_uses_semantic(task[2]) for task in compression_tasks)
+                and sum(len(task[0]) for task in compression_tasks) >= self.PROCESS_POOL_MIN_BYTES)
+
     def _compression_uses_semantic(self, compression_level: str) -> bool:
         """Check if compression level uses semantic compression."""
-        return compression_level in ["4", "semantic", "s", "smart"]
+        return compression_level in _LLM_LEVELS and not self.base_compressor.fast
     
     def compress_files_parallel(self, compression_tasks: List[Tuple[str, str, str]]) -> List[Dict[str, Any]]:
         """
@@ -1002,6 +1808,9 @@ class ParallelCompressor:
             
         # Decide whether to use parallel processing
         if not self._should_use_parallel(compression_tasks):
+            if self._should_use_processes(compression_tasks):
+                self._log(f"Processing {len(compression_tasks)} files in worker processes (max_workers={self.max_workers})")
+                return self._compress_parallel(compression_tasks)
             self._log(f"Processing {len(compression_tasks)} files sequentially")
             return self._compress_sequential(compression_tasks)
         
@@ -1035,33 +1844,91 @@ class ParallelCompressor:
             else:
                 non_semantic_tasks.append(task_with_index)
         
+        # Worker processes have no cache manager: serve cache hits here and dispatch only the misses,
+        # keeping each miss's content hash for the store below
+        content_hashes: Dict[int, Optional[str]] = {}
+        if self.use_processes and non_semantic_tasks and self.base_compressor.cache_manager:
+            misses = []
+            for task in non_semantic_tasks:
+                i, content, file_path, compression_level = task
+                cached_result, content_hashes[i] = self.base_compressor.lookup_cached(content, file_path, compression_level)
+                if cached_result:
+                    results[i] = cached_result
+                    self.parallel_stats["files_processed_in_parallel"] += 1
+                else:
+                    misses.append(task)
+            non_semantic_tasks = misses
+
         # Process non-semantic tasks in parallel first (no rate limiting needed)
         if non_semantic_tasks:
             self._log(f"Processing {len(non_semantic_tasks)} non-semantic tasks in parallel")
-            with ThreadPoolExecutor(max_workers=min(self.max_workers, len(non_semantic_tasks))) as executor:
-                future_to_index = {}
-                for i, content, file_path, compression_level in non_semantic_tasks:
-                    future = executor.submit(self.base_compressor.compress_content, content, file_path, compression_level)
-                    future_to_index[future] = i
-                
-                for future in as_completed(future_to_index):
-                    index = future_to_index[future]
+            pool_workers = min(self.max_workers, len(non_semantic_tasks))
+            if self.use_processes:
+                base = self.base_compressor
+                executor_cm = ProcessPoolExecutor(max_workers=pool_workers, initializer=_init_worker,
+                                                  initargs=(base.quiet, {"min_compress_bytes": base.min_compress_bytes,
+                                                                         "fast": base.fast,
+                                                                         "fast_downgrade_bytes": base.fast_downgrade_bytes}))
+                compress_fn = _compress_in_worker
+                # Ship tasks to the workers in chunks (about four per worker, as Executor.map would),
+                # paying one pickling round trip per chunk instead of per file
+                chunk_size = max(1, len(non_semantic_tasks) // (pool_workers * 4))
+            else:
+                executor_cm = ThreadPoolExecutor(max_workers=pool_workers)
+                compress_fn = self.base_compressor.compress_content
+                chunk_size = 1
+            with executor_cm as executor:
+                future_to_indices = {}
+                for start in range(0, len(non_semantic_tasks), chunk_size):
+                    chunk = non_semantic_tasks[start:start + chunk_size]
+                    future = executor.submit(_compress_each, compress_fn, [task[1:] for task in chunk])
+                    future_to_indices[future] = [task[0] for task in chunk]
+
+                for future in as_completed(future_to_indices):
+                    indices = future_to_indices[future]
                     try:
-                        result = future.result()
-                        results[index] = result
-                        self.parallel_stats["files_processed_in_parallel"] += 1
-                    except Exception as e:
-                        self._log(f"Error processing file at index {index}: {e}", is_error=True)
-                        # Create error result
-                        results[index] = {
-                            "compressed_content": compression_tasks[index][0],  # Original content
-                            "method": f"error: {str(e)}",
-                            "original_size": len(compression_tasks[index][0].encode('utf-8')),
-                            "compressed_size": len(compression_tasks[index][0].encode('utf-8')),
-                            "estimated_tokens": len(compression_tasks[index][0]) // 3,
-                            "compression_ratio": 1.0
-                        }
+                        chunk_results = future.result()
+                    except Exception as e: # The whole chunk was lost, e.g. a worker process died
+                        chunk_results = [e] * len(indices)
+                    for index, result in zip(indices, chunk_results):
+                        try:
+                            if isinstance(result, Exception):
+                                raise result
+                            results[index] = result
+                            self.parallel_stats["files_processed_in_parallel"] += 1
+                            # Worker processes have no cache manager; record their results here,
+                            # leaving out the ones compress_content would not have cached either
+                            content, _, compression_level = compression_tasks[index]
+                            compression_level = self.base_compressor._fast_level(compression_level, result["original_size"])
+                            if (self.use_processes and self.base_compressor.cache_manager and compression_level not in _NONE_LEVELS
+                                    and _is_cacheable_result(result)):
+                                self.base_compressor.cache_manager.cache_compression(
+                                    content, compression_level, result, content_hash=content_hashes.get(index))
+                        except Exception as e:
+                            self._log(f"Error processing file at index {index}: {e}", is_error=True)
+                            # Create error result
+                            original_size = len(compression_tasks[index][0].encode('utf-8'))
+                            results[index] = {
+                                "compressed_content": compression_tasks[index][0],  # Original content
+                                "method": f"error: {str(e)}",
+                                "original_size": original_size,
+                                "compressed_size": original_size,
+                                "estimated_tokens": len(compression_tasks[index][0]) // 3,
+                                "compression_ratio": 1.0
+                            }
         
+        # Level-4 semantic files go to the LLM as one concurrent batch; smart ones stay controlled
+        batch_tasks = [task for task in semantic_tasks if task[3] in _SEMANTIC_LEVELS]
+        if batch_tasks:
+            self._log(f"Processing {len(batch_tasks)} semantic tasks as one LLM batch")
+            batch_results = self.base_compressor.compress_batch(
+                [(content, file_path, level) for _, content, file_path, level in batch_tasks],
+                max_workers=self.max_workers)
+            for (index, _, _, _), result in zip(batch_tasks, batch_results):
+                results[index] = result
+            self.parallel_stats["files_processed_in_parallel"] += len(batch_tasks)
+            semantic_tasks = [task for task in semantic_tasks if task[3] not in _SEMANTIC_LEVELS]
+
         # Process semantic tasks with controlled parallelism and rate limiting
         if semantic_tasks:
             self._log(f"Processing {len(semantic_tasks)} semantic tasks with rate limiting")
@@ -1104,11 +1971,12 @@ class ParallelCompressor:
                     self._log(f"Error processing semantic file at index {index}: {e}", is_error=True)
                     # Create error result
                     original_task = all_tasks[index]
+                    original_size = len(original_task[0].encode('utf-8'))
                     results[index] = {
                         "compressed_content": original_task[0],  # Original content
                         "method": f"semantic-error: {str(e)}",
-                        "original_size": len(original_task[0].encode('utf-8')),
-                        "compressed_size": len(original_task[0].encode('utf-8')),
+                        "original_size": original_size,
+                        "compressed_size": original_size,
                         "estimated_tokens": len(original_task[0]) // 3,
                         "compression_ratio": 1.0
                     }
@@ -1137,6 +2005,15 @@ class ParallelCompressor:
         return stats
 
 
+# Per-level report printed by the direct-execution demo below, filled straight from a result dict
+_LEVEL_REPORT_TEMPLATE = (
+    "Method: {method}\n"
+    "Original Size: {original_size}, Compressed Size: {compressed_size}\n"
+    "Tokens: {compressed_tokens}, Ratio: {compression_ratio:.2f}x\n"
+    "Compressed Content:\nvvv\n{compressed_content}\n^^^\n"
+)
+
+
 if __name__ == '__main__':
     # Example Usage (for testing this module directly)
     print("pak_compressor.py - Direct Execution Test")
@@ -1147,6 +2024,9 @@ if __name__ == '__main__':
     # Here, we use a generic name for a test cache.
     test_cache_archive_id = "test_compressor_cache"
     cache_mgr_test = CacheManager(test_cache_archive_id, quiet=False) # Not quiet for testing
+    # Saved on any exit, including an exception part-way through the tests; entries added
+    # meanwhile are also flushed periodically by the sharded cache itself
+    atexit.register(cache_mgr_test.save_cache)
 
     compressor_test = Compressor(cache_manager=cache_mgr_test, quiet=False)
 
@@ -1172,46 +2052,29 @@ Trailing spaces here.
 Final line.
 
 """
-    # Test different compression levels
-    levels_to_test = ["none", "light", "medium", "aggressive", "semantic", "smart"]
+    def print_level_report(level: str, result: Dict[str, Any]):
+        # Fill the whole report from the result dict and write it once rather than one print() per line
+        sys.stdout.write(f"\n--- Level: {level} ---\n" + _LEVEL_REPORT_TEMPLATE.format_map(result))
+
+    def run_levels(content: str, file_name: str, levels: List[str]):
+        # Submit every level at once: the content is encoded and hashed once for all of them,
+        # and the semantic and smart LLM requests run as one concurrent batch
+        results = compressor_test.compress_batch([(content, file_name, level) for level in levels],
+                                                 use_semantic=semantic_ready)
+        for level, result in zip(levels, results):
+            print_level_report(level, result)
+
+    # Test different compression levels, filtered upfront: semantic only runs with the LLM available
+    semantic_ready = SEMANTIC_AVAILABLE and _HAS_API_KEY
+    levels_to_test = [level for level in ("none", "light", "medium", "aggressive", "semantic", "smart")
+                      if semantic_ready or level != "semantic"]
 
     print("\n--- Testing Python Code Compression ---")
-    for level in levels_to_test:
-        print(f"\n--- Level: {level} ---")
-        if level == "semantic" and (not SEMANTIC_AVAILABLE or not os.getenv("OPENROUTER_API_KEY")):
-            print(f"Skipping semantic test: Not available or API key missing.")
-            continue
-        if level == "smart" and (not SEMANTIC_AVAILABLE or not os.getenv("OPENROUTER_API_KEY")):
-            print(f"Skipping smart test (semantic part): Not available or API key missing.")
-            # Test smart without semantic by temporarily disabling semantic_compressor
-            # This is a bit hacky for a direct test; in real use, smart adapts.
-            original_semantic_compressor = compressor_test.semantic_compressor
-            compressor_test.semantic_compressor = None
-            result = compressor_test.compress_content(sample_py_code, "sample.py", level)
-            compressor_test.semantic_compressor = original_semantic_compressor # Restore
-        else:
-            result = compressor_test.compress_content(sample_py_code, "sample.py", level)
+    if not semantic_ready:
+        print(f"Skipping semantic test: Not available or API key missing.")
+        print(f"Testing smart without its semantic part: Not available or API key missing.")
 
-        print(f"Method: {result['method']}")
-        print(f"Original Size: {result['original_size']}, Compressed Size: {result['compressed_size']}")
-        print(f"Tokens: {result['compressed_tokens']}, Ratio: {result['compression_ratio']:.2f}x")
-        print("Compressed Content:")
-        print("vvv")
-        print(result['compressed_content'])
-        print("^^^")
+    run_levels(sample_py_code, "sample.py", levels_to_test)
 
     print("\n--- Testing Text File Compression ---")
-    for level in ["none", "light", "medium"]: # Aggressive/Semantic less relevant for plain text usually
-        print(f"\n--- Level: {level} ---")
-        result = compressor_test.compress_content(sample_text_content, "sample.txt", level)
-        print(f"Method: {result['method']}")
-        print(f"Original Size: {result['original_size']}, Compressed Size: {result['compressed_size']}")
-        print(f"Tokens: {result['compressed_tokens']}, Ratio: {result['compression_ratio']:.2f}x")
-        print("Compressed Content:")
-        print("vvv")
-        print(result['compressed_content'])
-        print("^^^")
-
-    # Explicitly save cache after tests
-    if cache_mgr_test:
-        cache_mgr_test.save_cache()
+    run_levels(sample_text_content, "sample.txt", ["none", "light", "medium"]) # Aggressive/Semantic less relevant for plain text usually
@@ -13,6 +13,21 @@ except ImportError:
     else:
         raise
 
+# Diff file directives that carry a single value, by the instruction key they set. Each line is
+# split once at its first ':' and looked up here instead of trying every prefix in turn.
+_VALUE_DIRECTIVES = {"SECTION:": "section", "FIND_METHOD:": "find_method", "UNTIL_EXCLUDE:": "until_exclude"}
+
+def _read_utf8_text(file_path: str) -> str:
+    """
+    Same result as open(file_path, 'r', encoding='utf-8').read(), including UnicodeDecodeError on
+    invalid bytes, but as one binary read and one decode instead of a text-mode decoder.
+    """
+    with open(file_path, 'rb') as f:
+        content = f.read().decode('utf-8')
+    if '\r' in content: # Universal newlines, as text mode would translate them
+        content = content.replace('\r\n', '\n').replace('\r', '\n')
+    return content
+
 class MethodDiffManager:
     """Manages method-level diff extraction and application."""
 
@@ -40,13 +55,15 @@ class MethodDiffManager:
             raise FileNotFoundError(f"Base file for diff not found: {base_file_path}")
 
         try:
-            with open(base_file_path, 'r', encoding='utf-8') as f_base:
-                base_content = f_base.read()
+            base_content = _read_utf8_text(base_file_path)
         except Exception as e:
             MethodDiffManager._log(f"Error reading base file {base_file_path}: {e}", quiet, is_error=True)
             raise
 
         all_diffs: List[Dict[str, Any]] = []
+        # The base is the same for every modified file, so its methods are extracted once here
+        # rather than once per modified/removed method diff
+        base_methods_by_name = MethodDiffManager._methods_by_name(base_content)
 
         for modified_file_path in modified_file_paths:
             if not os.path.exists(modified_file_path):
@@ -54,8 +71,7 @@ class MethodDiffManager:
                 continue
 
             try:
-                with open(modified_file_path, 'r', encoding='utf-8') as f_mod:
-                    modified_content = f_mod.read()
+                modified_content = _read_utf8_text(modified_file_path)
             except Exception as e:
                 MethodDiffManager._log(f"Error reading modified file {modified_file_path}: {e}", quiet, is_error=True)
                 continue
@@ -78,7 +94,8 @@ class MethodDiffManager:
                     diff_detail,
                     os.path.basename(modified_file_path), # Use basename of the modified file
                     base_content, # Pass base_content for context when finding 'until_exclude'
-                    quiet # Pass quiet flag
+                    quiet, # Pass quiet flag
+                    base_methods_by_name
                 )
                 if diff_entry:
                     all_diffs.append(diff_entry)
@@ -87,11 +104,21 @@ class MethodDiffManager:
         return all_diffs
 
     @staticmethod
-    def _convert_to_diff_format(diff_detail: Dict[str, Any], modified_file_name: str, base_code_content: str, quiet: bool) -> Optional[Dict[str, Any]]:
+    def _methods_by_name(code_content: str) -> Dict[str, Dict[str, Any]]:
+        """Maps each method name to its first occurrence in PythonAnalyzer.extract_methods order."""
+        methods_by_name: Dict[str, Dict[str, Any]] = {}
+        for method in PythonAnalyzer.extract_methods(code_content):
+            methods_by_name.setdefault(method["name"], method)
+        return methods_by_name
+
+    @staticmethod
+    def _convert_to_diff_format(diff_detail: Dict[str, Any], modified_file_name: str, base_code_content: str, quiet: bool,
+                                base_methods_by_name: Optional[Dict[str, Dict[str, Any]]] = None) -> Optional[Dict[str, Any]]:
         """
         Converts a single method diff (from PythonAnalyzer.compare_methods)
         into the structured format for a .diff file.
-        Needs base_code_content to find context for 'until_exclude'.
+        Needs base_code_content to find context for 'until_exclude'; callers converting several
+        diffs against one base pass base_methods_by_name (see _methods_by_name) to parse it only once.
         """
         method_name = diff_detail['method_name']
         # Use the precise signature from the analyzer if available, otherwise a simple "def name"
@@ -104,8 +131,9 @@ class MethodDiffManager:
         until_exclude_signature_str = ""
         if diff_detail['type'] in ['modified', 'removed']:
             # Find the original method in the base content to get its end line
-            original_methods_in_base = PythonAnalyzer.extract_methods(base_code_content)
-            original_method_node = next((m for m in original_methods_in_base if m["name"] == method_name), None)
+            if base_methods_by_name is None:
+                base_methods_by_name = MethodDiffManager._methods_by_name(base_code_content)
+            original_method_node = base_methods_by_name.get(method_name)
 
             if original_method_node and original_method_node.get("end_line"):
                 until_exclude_signature_str = MethodDiffManager._find_next_definition_signature_in_text(
@@ -167,8 +195,7 @@ class MethodDiffManager:
             return diff_instructions
 
         try:
-            with open(diff_file_path, 'r', encoding='utf-8') as f:
-                content = f.read()
+            content = _read_utf8_text(diff_file_path)
         except Exception as e:
             MethodDiffManager._log(f"Error reading diff file '{diff_file_path}': {e}", quiet, is_error=True)
             return diff_instructions
@@ -178,18 +205,15 @@ class MethodDiffManager:
         i = 0
         while i < len(lines):
             line = lines[i] # Original line with leading/trailing spaces
-            line_stripped = line.strip() # For checking prefixes
+            directive, colon, value = line.strip().partition(":") # "FILE: x" -> ("FILE", ":", " x")
+            directive += colon # A bare "FILE" without the colon is not a directive
 
-            if line_stripped.startswith("FILE:"):
+            if directive == "FILE:":
                 if current_instruction: diff_instructions.append(current_instruction)
-                current_instruction = {"file": line_stripped.split(":", 1)[1].strip()}
-            elif line_stripped.startswith("SECTION:"):
-                current_instruction["section"] = line_stripped.split(":", 1)[1].strip()
-            elif line_stripped.startswith("FIND_METHOD:"):
-                current_instruction["find_method"] = line_stripped.split(":", 1)[1].strip()
-            elif line_stripped.startswith("UNTIL_EXCLUDE:"):
-                current_instruction["until_exclude"] = line_stripped.split(":", 1)[1].strip()
-            elif line_stripped.startswith("REPLACE_WITH:"):
+                current_instruction = {"file": value.strip()}
+            elif directive in _VALUE_DIRECTIVES:
+                current_instruction[_VALUE_DIRECTIVES[directive]] = value.strip()
+            elif directive == "REPLACE_WITH:":
                 replacement_block_lines = []
                 i += 1 # Move to the first line of the replacement block
                 # Collect all subsequent lines until the next 'FILE:' directive or EOF
@@ -227,6 +251,12 @@ class MethodDiffManager:
             return False # No diffs to apply or error parsing
 
         applied_successfully_count = 0
+        # Each target is read once and written once: instructions for the same file are applied
+        # to its lines in memory, and every modified file is written after the last instruction.
+        # Keyed by real path so different spellings of one file share its lines.
+        target_lines: Dict[str, List[str]] = {}
+        target_paths: Dict[str, str] = {}
+        target_applied_counts: Dict[str, int] = {}
 
         for instruction in diff_instructions:
             relative_file_in_diff = instruction.get("file", "")
@@ -263,28 +293,48 @@ class MethodDiffManager:
                     MethodDiffManager._log(f"Target file '{actual_target_file_path}' for diff does not exist and operation is not a simple addition. Skipping.", quiet, is_error=True)
                     continue
 
-            # Apply the single diff instruction to the (now existing) target file
-            if MethodDiffManager._apply_single_instruction_to_file_content(instruction, actual_target_file_path, quiet):
-                applied_successfully_count += 1
+            # Apply the single diff instruction to the (now existing) target file's lines
+            file_key = os.path.realpath(actual_target_file_path)
+            lines = target_lines.get(file_key)
+            if lines is None:
+                lines = MethodDiffManager._read_target_lines(actual_target_file_path, quiet)
+                if lines is None:
+                    continue
+                target_lines[file_key] = lines
+                target_paths[file_key] = actual_target_file_path
+            modified_lines = MethodDiffManager._apply_instruction_to_lines(instruction, lines, actual_target_file_path, quiet)
+            if modified_lines is not None:
+                target_lines[file_key] = modified_lines
+                target_applied_counts[file_key] = target_applied_counts.get(file_key, 0) + 1
+
+        for file_key, applied_count in target_applied_counts.items():
+            if MethodDiffManager._write_target_lines(target_paths[file_key], target_lines[file_key], quiet):
+                applied_successfully_count += applied_count
 
         MethodDiffManager._log(f"Applied {applied_successfully_count} of {len(diff_instructions)} method diff instructions.", quiet)
         return applied_successfully_count > 0 # Returns True if at least one diff was applied.
 
     @staticmethod
-    def _apply_single_instruction_to_file_content(instruction: Dict[str, Any], target_file_path: str, quiet: bool) -> bool:
+    def _read_target_lines(target_file_path: str, quiet: bool) -> Optional[List[str]]:
         try:
-            with open(target_file_path, 'r', encoding='utf-8') as f:
-                original_lines = f.read().splitlines()
+            return _read_utf8_text(target_file_path).splitlines()
         except Exception as e:
             MethodDiffManager._log(f"Error reading target file '{target_file_path}' for applying diff: {e}", quiet, is_error=True)
-            return False
+            return None
 
+    @staticmethod
+    def _apply_instruction_to_lines(instruction: Dict[str, Any], original_lines: List[str], target_file_path: str,
+                                    quiet: bool) -> Optional[List[str]]:
+        """
+        Applies one diff instruction to a file's lines. Returns the modified lines, or None if the
+        instruction cannot be applied. original_lines may be changed in place on success only.
+        """
         section_type = instruction.get("section", "").strip()
         find_sig = instruction.get("find_method", "").strip()
         until_sig = instruction.get("until_exclude", "").strip()
         replace_block = instruction.get("replace_with", "") # This is a multi-line string
 
-        modified_lines = list(original_lines) # Work on a copy
+        modified_lines = original_lines # Failure paths return before changing it, so no copy is needed
 
         # Handle GLOBAL_PREAMBLE sections
         if section_type == "GLOBAL_PREAMBLE":
@@ -323,7 +373,7 @@ class MethodDiffManager:
 
             if start_idx == -1:
                 MethodDiffManager._log(f"  Signature '{find_sig}' not found in '{target_file_path}'. Cannot apply diff.", quiet, is_error=True)
-                return False
+                return None
 
             # Enhanced: Scan backwards to include decorators
             decorator_start_idx = start_idx
@@ -372,6 +422,10 @@ class MethodDiffManager:
             action = "REMOVE" if not replace_block.strip() else "MODIFY"
             MethodDiffManager._log(f"  Applied {action} for '{find_sig}' in '{target_file_path}'", quiet)
 
+        return modified_lines
+
+    @staticmethod
+    def _write_target_lines(target_file_path: str, modified_lines: List[str], quiet: bool) -> bool:
         try:
             with open(target_file_path, 'w', encoding='utf-8') as f:
                 f.write("\n".join(modified_lines))
@@ -1,13 +1,27 @@
 import os
+import re
 import glob
 from pathlib import Path
 import sys # For printing warnings
 from typing import List, Dict, Optional, Set
 import fnmatch
 
+# Directories below a walked target that never hold files worth packing (VCS metadata,
+# installed dependencies, bytecode caches); pruned by name before os.walk descends into them.
+# A target that is itself one of these is still walked.
+_PRUNED_DIR_NAMES = frozenset({".git", ".hg", ".svn", "node_modules", "bower_components",
+                               "jspm_packages", "__pycache__"})
+
+def _suffix_lower(file_name: str) -> str:
+    """Lowercased Path(file_name).suffix for a bare file name, without building a Path object."""
+    dot_idx = file_name.rfind('.')
+    return file_name[dot_idx:].lower() if 0 < dot_idx < len(file_name) - 1 else ''
+
 def collect_files(targets: list[str], extensions: list[str], quiet: bool = False) -> list[str]:
     """
     Collects files based on targets (files, dirs, globs) and extensions.
+    Directories named in _PRUNED_DIR_NAMES (.git, node_modules, __pycache__, ...) are skipped
+    below a directory target.
     Args:
         targets: A list of strings, where each string can be a file path,
                  a directory path, or a glob pattern.
@@ -18,19 +32,27 @@ def collect_files(targets: list[str], extensions: list[str], quiet: bool = False
         A sorted list of unique, normalized file paths.
     """
     collected_files_set = set()
+    # Extensions match case-insensitively: normalized once here, then one set lookup per file
+    extension_set = frozenset(ext.lower() for ext in extensions)
 
     for target_pattern in targets:
         # Normalize the target pattern early
         norm_target_pattern = os.path.normpath(target_pattern)
 
         if os.path.isdir(norm_target_pattern):
-            for root, _, files_in_dir in os.walk(norm_target_pattern):
+            for root, dirs_in_dir, files_in_dir in os.walk(norm_target_pattern):
+                # Prune skipped directories so os.walk never descends into them
+                dirs_in_dir[:] = [d for d in dirs_in_dir if d not in _PRUNED_DIR_NAMES]
+                # Normalized once per directory: a bare file name appended to it is already a
+                # normalized path, so the set is keyed by the same strings without normpath per file
+                norm_root = os.path.normpath(root)
+                root_prefix = "" if norm_root == os.curdir else os.path.join(norm_root, "")
                 for file_name in files_in_dir:
-                    full_file_path = os.path.normpath(os.path.join(root, file_name))
-                    if not extensions or Path(file_name).suffix.lower() in extensions:
-                        collected_files_set.add(full_file_path)
+                    if extension_set and _suffix_lower(file_name) not in extension_set:
+                        continue
+                    collected_files_set.add(root_prefix + file_name)
         elif os.path.isfile(norm_target_pattern):
-            if not extensions or Path(norm_target_pattern).suffix.lower() in extensions:
+            if not extension_set or _suffix_lower(os.path.basename(norm_target_pattern)) in extension_set:
                 collected_files_set.add(norm_target_pattern)
         else:
             # Treat as glob pattern
@@ -44,13 +66,13 @@ def collect_files(targets: list[str], extensions: list[str], quiet: bool = False
                 for path_str in matched_paths:
                     norm_path = os.path.normpath(path_str)
                     if os.path.isfile(norm_path): # Ensure it's a file
-                        if not extensions or Path(norm_path).suffix.lower() in extensions:
+                        if not extension_set or _suffix_lower(os.path.basename(norm_path)) in extension_set:
                             collected_files_set.add(norm_path)
             except Exception as e:
                 if not quiet:
                     print(f"pak_utils: Warning: Error processing glob pattern '{target_pattern}': {e}", file=sys.stderr)
 
-    return sorted(list(collected_files_set))
+    return sorted(collected_files_set)
 
 if __name__ == '__main__':
     # Example usage:
@@ -93,10 +115,14 @@ def filter_files_by_pattern(files: List[str], pattern: str) -> List[str]:
     if not pattern:
         return files
     
+    # Same test as fnmatch.fnmatch, with the pattern translated and compiled once for the whole
+    # list instead of being normalized and looked up in fnmatch's cache twice per file
+    match = re.compile(fnmatch.translate(os.path.normcase(pattern))).match
+    normcase = os.path.normcase
     filtered = []
     for file_path in files:
         # Check both full path and just filename
-        if fnmatch.fnmatch(file_path, pattern) or fnmatch.fnmatch(os.path.basename(file_path), pattern):
+        if match(normcase(file_path)) or match(normcase(os.path.basename(file_path))):
             filtered.append(file_path)
     
     return filtered
@@ -161,3 +187,37 @@ def get_file_stats(file_paths: List[str]) -> Dict[str, int]:
         stats['smallest_file_size'] = 0
     
     return stats
+
+# Leading bytes of common binary formats that can be packed by extension (e.g. with no -t filter)
+_BINARY_MAGIC = (b'\x89PNG', b'GIF8', b'\xff\xd8\xff', b'%PDF', b'PK\x03\x04', b'\x7fELF', b'\x1f\x8b',
+                 b'\xca\xfe\xba\xbe', b'\xcf\xfa\xed\xfe')
+# Text files essentially never contain NUL; only this much of the head is scanned for one
+_BINARY_SNIFF_BYTES = 8192
+
+def looks_binary(raw: bytes) -> bool:
+    """True if raw starts with a known binary signature or has a NUL byte near the start."""
+    return raw.startswith(_BINARY_MAGIC) or raw.find(b'\x00', 0, _BINARY_SNIFF_BYTES) != -1
+
+def read_source_file(file_path: str) -> str:
+    """
+    Read a file as UTF-8 text in a single read followed by a single decode.
+
+    Matches open(file_path, 'r', encoding='utf-8', errors='ignore').read(): invalid
+    bytes are dropped and '\\r\\n' / '\\r' line endings become '\\n'.
+
+    Args:
+        file_path: Path of the file to read
+
+    Returns:
+        The decoded file content
+
+    Raises:
+        ValueError: If the content looks binary (see looks_binary); it is not decoded
+    """
+    raw = Path(file_path).read_bytes()
+    if looks_binary(raw):
+        raise ValueError("content looks binary, skipped")
+    content = raw.decode('utf-8', errors='ignore')
+    if '\r' in content:
+        content = content.replace('\r\n', '\n').replace('\r', '\n')
+    return content
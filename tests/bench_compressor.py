@@ -0,0 +1,51 @@
+"""
+Timing benchmarks for Compressor levels (needs pytest-benchmark).
+
+Not collected by the normal test run; invoke explicitly, e.g.:
+    pytest tests/bench_compressor.py --benchmark-json=bench.json
+    pytest tests/bench_compressor.py --benchmark-autosave --benchmark-compare
+"""
+from pathlib import Path
+
+import pytest
+
+pytest.importorskip("pytest_benchmark")
+
+import pak_compressor
+from pak_compressor import Compressor
+
+LOCAL_LEVELS = ["none", "light", "medium", "aggressive"]
+
+# A real, multi-KB module alongside the small conftest sample
+LARGE_PYTHON_SOURCE = Path(pak_compressor.__file__).read_text(encoding='utf-8')
+
+requires_llm = pytest.mark.skipif(not (pak_compressor.SEMANTIC_AVAILABLE and pak_compressor._HAS_API_KEY),
+                                  reason="semantic compression not available or OPENROUTER_API_KEY missing")
+
+
+@pytest.fixture
+def uncached_compressor():
+    # No cache manager, so every round measures the compression itself rather than a cache hit
+    return Compressor(cache_manager=None, quiet=True)
+
+
+@pytest.mark.parametrize("level", LOCAL_LEVELS + ["smart"])
+def test_compress_sample(benchmark, uncached_compressor, sample_python_code_str, level):
+    result = benchmark(uncached_compressor.compress_content, sample_python_code_str, "sample.py", level,
+                       use_semantic=False)
+    assert result["compressed_content"]
+
+
+@pytest.mark.parametrize("level", LOCAL_LEVELS)
+def test_compress_large_module(benchmark, uncached_compressor, level):
+    result = benchmark(uncached_compressor.compress_content, LARGE_PYTHON_SOURCE, "pak_compressor.py", level)
+    assert result["compressed_content"]
+
+
+@pytest.mark.parametrize("level", ["semantic", "smart"])
+@requires_llm
+def test_compress_sample_llm(benchmark, uncached_compressor, sample_python_code_str, level):
+    # One round only: each call is a billed network request
+    result = benchmark.pedantic(uncached_compressor.compress_content, args=(sample_python_code_str, "sample.py", level),
+                                rounds=1, iterations=1)
+    assert result["compressed_content"]
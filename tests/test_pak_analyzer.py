@@ -78,6 +78,13 @@ def test_compare_methods_added():
     assert "new_method" in added_names
     assert "async_top_level_func" in added_names
 
+def test_compare_methods_order_is_stable():
+    diffs = PythonAnalyzer.compare_methods(SAMPLE_CODE_V1, SAMPLE_CODE_V2_MODIFIED)
+    old_names = [m["name"] for m in PythonAnalyzer.extract_methods(SAMPLE_CODE_V1)]
+    changed_old = [d["method_name"] for d in diffs if d["type"] != "added"]
+    assert changed_old == [name for name in old_names if name in changed_old]
+    assert all(d["type"] == "added" for d in diffs[len(changed_old):])
+
 def test_compare_methods_removed():
     diffs = PythonAnalyzer.compare_methods(SAMPLE_CODE_V1, SAMPLE_CODE_V2_MODIFIED)
     removed_diffs = [d for d in diffs if d["type"] == "removed"]
@@ -1,5 +1,6 @@
 import pytest
 import os
+import io
 import json
 from pathlib import Path
 from unittest.mock import MagicMock, patch
@@ -60,6 +61,27 @@ def test_pak_archive_add_file(pak_archive_instance, mock_compressor_output, temp
         "original content", str(dummy_file_path).replace(os.sep, '/'), "mocked"
     )
 
+def test_pak_archive_add_file_without_mtime(mock_compressor_output, temp_dir_fixture):
+    dummy_file_path = temp_dir_fixture / "dummy.txt"
+    dummy_file_path.write_text("original content")
+    with patch('pak_archive_manager.Compressor') as MockCompressorClass:
+        MockCompressorClass.return_value.compress_content.return_value = mock_compressor_output
+        pa = PakArchive(compression_level="mocked", quiet=True, record_mtime=False)
+        pa.add_file(str(dummy_file_path), "original content")
+
+    assert pa.files_data[0]["last_modified_utc"] is None
+
+def test_pak_archive_reuses_one_compressor(temp_dir_fixture):
+    pa = PakArchive(compression_level="light", quiet=True, record_mtime=False)
+    with patch('pak_archive_manager.Compressor', wraps=Compressor) as CompressorSpy:
+        pa.add_file("a.txt", "first  \n")
+        pa.add_file("b.txt", "second  \n")
+        assert CompressorSpy.call_count == 1
+        pa.set_cache_manager(CacheManager(str(temp_dir_fixture / "reuse.json"), quiet=True))
+        pa.add_file("c.txt", "third  \n")
+        assert CompressorSpy.call_count == 2 # Rebuilt for the new cache manager
+    assert [entry["content"] for entry in pa.files_data] == ["first", "second", "third"]
+
 def test_pak_archive_create_archive_to_file(pak_archive_instance, temp_dir_fixture):
     pak_archive_instance.add_file(str(temp_dir_fixture / "file1.txt"), "content1") # Use dummy path for mtime
     (temp_dir_fixture / "file1.txt").write_text("content1")
@@ -86,6 +108,15 @@ def test_pak_archive_create_archive_to_stdout(pak_archive_instance):
     assert "metadata" in data
     assert data["files"][0]["path"] == "file_in_mem.txt"
 
+def test_pak_archive_create_archive_to_stream(pak_archive_instance):
+    pak_archive_instance.add_file("file_in_mem.txt", "content_mem")
+
+    stream = io.StringIO()
+    assert pak_archive_instance.create_archive(stream=stream) is None
+    data = json.loads(stream.getvalue())
+    assert data["files"][0]["path"] == "file_in_mem.txt"
+    assert data["files"][0]["content"] == pak_archive_instance.files_data[0]["content"]
+
 def test_load_valid_archive(temp_dir_fixture, sample_valid_archive_content_str):
     archive_file = temp_dir_fixture / "valid.pak.json"
     archive_file.write_text(sample_valid_archive_content_str)
@@ -136,3 +167,133 @@ def test_verify_archive_invalid_structure(temp_dir_fixture):
     archive_file = temp_dir_fixture / "verify_invalid.pak.json"
     archive_file.write_text(invalid_content)
     assert PakArchive.verify_archive(str(archive_file), quiet=True) is False
+
+def test_binary_payload_round_trip(temp_dir_fixture):
+    binary_output = {
+        "compressed_content": b"\x00\x01binary\xff",
+        "original_size": 9,
+        "compressed_size": 9,
+        "estimated_tokens": 3,
+        "method": "mock_binary",
+        "compression_ratio": 1.0
+    }
+    with patch('pak_archive_manager.Compressor') as MockCompressorClass:
+        MockCompressorClass.return_value.compress_content.return_value = binary_output
+        pa = PakArchive(compression_level="mocked", quiet=True)
+        pa.add_file("blob.bin", "ignored")
+
+    archive_file = temp_dir_fixture / "binary.pak.json"
+    pa.create_archive(str(archive_file))
+    data = json.loads(archive_file.read_text())
+    assert data["files"][0]["content_encoding"] == "base64"
+
+    extract_dir = temp_dir_fixture / "extracted"
+    PakArchive.extract_archive(str(archive_file), str(extract_dir), quiet=True)
+    assert (extract_dir / "blob.bin").read_bytes() == b"\x00\x01binary\xff"
+
+def test_stream_archive_without_ijson_reads_compact_layout(pak_archive_instance, temp_dir_fixture):
+    pak_archive_instance.add_file("a.py", "ignored")
+    pak_archive_instance.add_file("b.py", "ignored")
+    archive_file = temp_dir_fixture / "compact.pak.json"
+    pak_archive_instance.create_archive(str(archive_file))
+
+    with patch('pak_archive_manager.IJSON_AVAILABLE', False):
+        streamed = PakArchive._stream_compact_archive(str(archive_file))
+        assert streamed is not None
+        metadata, entries = streamed
+        assert [e["path"] for e in entries] == ["a.py", "b.py"]
+        assert metadata == json.loads(archive_file.read_text())["metadata"]
+
+        # Any other layout falls back to the full load
+        pretty_file = temp_dir_fixture / "pretty.pak.json"
+        pretty_file.write_text(json.dumps(json.loads(archive_file.read_text()), indent=2))
+        assert PakArchive._stream_compact_archive(str(pretty_file)) is None
+        _, entries = PakArchive._stream_archive(str(pretty_file))
+        assert [e["path"] for e in entries] == ["a.py", "b.py"]
+
+def test_verify_archive_missing_entry_key(temp_dir_fixture, sample_valid_archive_content_str):
+    data = json.loads(sample_valid_archive_content_str)
+    del data["files"][0]["content"]
+    archive_file = temp_dir_fixture / "verify_missing_key.pak.json"
+    archive_file.write_text(json.dumps(data))
+    assert PakArchive.verify_archive(str(archive_file), quiet=True) is False
+
+@pytest.mark.parametrize("ijson_available", [True, False])
+def test_stream_archive_requires_files_array(temp_dir_fixture, ijson_available):
+    metadata = {"pak_format_version": "1.0"}
+    missing_file = temp_dir_fixture / "no_files.pak.json"
+    missing_file.write_text(json.dumps({"metadata": metadata}))
+    not_list_file = temp_dir_fixture / "files_not_list.pak.json"
+    not_list_file.write_text(json.dumps({"metadata": metadata, "files": {"path": "a.py"}}))
+
+    with patch('pak_archive_manager.IJSON_AVAILABLE', ijson_available):
+        # The full load (no ijson) wraps its ValueError in a plain Exception
+        with pytest.raises(Exception, match="Missing 'metadata' or 'files'"):
+            PakArchive._stream_archive(str(missing_file), quiet=True)
+        with pytest.raises(ValueError, match="not a list"):
+            PakArchive._stream_archive(str(not_list_file), quiet=True)
+
+@pytest.mark.parametrize("ijson_available", [True, False])
+def test_extract_truncated_archive_keeps_earlier_files(pak_archive_instance, temp_dir_fixture, ijson_available):
+    pak_archive_instance.add_file("a.py", "ignored")
+    pak_archive_instance.add_file("b.py", "ignored")
+    archive_file = temp_dir_fixture / "truncated.pak.json"
+    pak_archive_instance.create_archive(str(archive_file))
+    text = archive_file.read_text()
+    archive_file.write_text(text[:text.index('"b.py"') + 3]) # Cut inside the second entry
+
+    extract_dir = temp_dir_fixture / "extracted"
+    with patch('pak_archive_manager.IJSON_AVAILABLE', ijson_available):
+        PakArchive.extract_archive(str(archive_file), str(extract_dir), quiet=True)
+    assert (extract_dir / "a.py").read_text() == "compressed_data"
+    assert not (extract_dir / "b.py").exists()
+
+def test_comment_only_file_round_trips_with_ijson(temp_dir_fixture, monkeypatch, capsys):
+    monkeypatch.setenv("PAK_CACHE_DIR", str(temp_dir_fixture / "cache"))
+    pa = PakArchive(compression_level="medium", quiet=True)
+    pa.add_file("pkg/__init__.py", "# only a comment\n") # Compresses to nothing: infinite ratio
+    pa.add_file("pkg/mod.py", "x = 1\n")
+    archive_file = temp_dir_fixture / "comment_only.pak.json"
+    pa.create_archive(str(archive_file))
+    assert "Infinity" not in archive_file.read_text()
+    assert json.loads(archive_file.read_text())["files"][0]["compression_ratio"] is None
+
+    with patch('pak_archive_manager.IJSON_AVAILABLE', True):
+        PakArchive.list_archive(str(archive_file), detailed=True, quiet=True)
+        extract_dir = temp_dir_fixture / "extracted"
+        PakArchive.extract_archive(str(archive_file), str(extract_dir), quiet=True)
+        assert PakArchive.verify_archive(str(archive_file), quiet=True) is True
+    assert "Listed 2/2 files." in capsys.readouterr().out
+    assert (extract_dir / "pkg" / "mod.py").read_text() == "x = 1"
+
+def test_stream_archive_reads_legacy_infinity_ratio(temp_dir_fixture, sample_valid_archive_content_str):
+    data = json.loads(sample_valid_archive_content_str)
+    data["files"][0]["compression_ratio"] = float('inf')
+    archive_file = temp_dir_fixture / "legacy.pak.json"
+    archive_file.write_text(json.dumps(data, indent=2)) # As older versions wrote it: "Infinity"
+
+    with patch('pak_archive_manager.IJSON_AVAILABLE', True):
+        _, entries = PakArchive._stream_archive(str(archive_file))
+        assert [e["compression_ratio"] for e in entries] == [float('inf')]
+
+def test_list_truncated_archive_reports_error(pak_archive_instance, temp_dir_fixture, capsys):
+    pak_archive_instance.add_file("a.py", "ignored")
+    pak_archive_instance.add_file("b.py", "ignored")
+    archive_file = temp_dir_fixture / "truncated_list.pak.json"
+    pak_archive_instance.create_archive(str(archive_file))
+    text = archive_file.read_text()
+    archive_file.write_text(text[:text.index('"b.py"') + 3])
+
+    PakArchive.list_archive(str(archive_file), quiet=True) # Must not raise
+    captured = capsys.readouterr()
+    assert "a.py\n" in captured.out
+    assert "corrupt after" in captured.err
+
+@pytest.mark.parametrize("ijson_available", [True, False])
+def test_verify_archive_with_legacy_infinity_ratio(temp_dir_fixture, sample_valid_archive_content_str, ijson_available):
+    data = json.loads(sample_valid_archive_content_str)
+    data["files"][0]["compression_ratio"] = float('inf')
+    archive_file = temp_dir_fixture / "verify_legacy.pak.json"
+    archive_file.write_text(json.dumps(data, indent=2))
+    with patch('pak_archive_manager.IJSON_AVAILABLE', ijson_available):
+        assert PakArchive.verify_archive(str(archive_file), quiet=True) is True
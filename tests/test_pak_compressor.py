@@ -1,7 +1,9 @@
+import os
 import pytest
 import json
+import hashlib
 from unittest.mock import patch, MagicMock
-from pak_compressor import Compressor, LanguageAwareTokenizer, CacheManager, SemanticCompressor as InternalSemanticCompressor
+from pak_compressor import Compressor, LanguageAwareTokenizer, CacheManager, ShardedCache, SemanticCompressor as InternalSemanticCompressor
 
 # Backward compatibility alias for tests
 TokenCounter = LanguageAwareTokenizer
@@ -44,12 +46,74 @@ def test_cache_manager_get_miss_and_hit(temp_dir_fixture):
     assert cached_result is not None
     assert cached_result["compressed_content"] == "test compressed"
 
+def test_cache_manager_shards_and_migrates_single_file_cache(temp_dir_fixture, monkeypatch):
+    monkeypatch.setenv("PAK_CACHE_DIR", str(temp_dir_fixture))
+    legacy_digest = hashlib.sha256(b'old').hexdigest()
+    legacy_file = temp_dir_fixture / "compression_cache.json"
+    legacy_file.write_text(json.dumps({f"{legacy_digest}_light": {"compressed_content": "old", "method": "light"},
+                                       "_metadata": {"hits": 1}})) # Unprefixed keys of older versions
+
+    cache_mgr = CacheManager("x", quiet=True)
+    assert legacy_file.exists() # Left in place
+    assert cache_mgr.cache.get(f"sha256:{legacy_digest}_light")["compressed_content"] == "old"
+    with patch('pak_compressor._json_loads', side_effect=AssertionError("re-imported")):
+        CacheManager("x", quiet=True) # Migrated once only
+
+    cache_mgr.cache = ShardedCache(cache_mgr.cache_dir, max_loaded_shards=1) # Force evictions
+    contents = [f"content {i}" for i in range(20)]
+    for content in contents:
+        cache_mgr.cache_compression(content, "light", {"compressed_content": content, "method": "light"})
+    cache_mgr.save_cache()
+
+    reloaded = CacheManager("x", quiet=True)
+    for content in contents:
+        assert reloaded.get_cached_compression(content, "light")["compressed_content"] == content
+    assert all(len(p.name) == 2 + len(ShardedCache.SHARD_SUFFIX) for p in reloaded.cache_dir.glob("??.json*"))
+
+def test_sharded_cache_flushes_after_interval(temp_dir_fixture):
+    buffered = ShardedCache(temp_dir_fixture / "buffered", flush_interval=None)
+    buffered["sha256:ab_light"] = {"method": "light"}
+    assert not list((temp_dir_fixture / "buffered").glob("ab.json*")) # Held until flush()
+
+    (temp_dir_fixture / "periodic").mkdir()
+    periodic = ShardedCache(temp_dir_fixture / "periodic", flush_interval=0)
+    periodic["sha256:ab_light"] = {"method": "light"}
+    assert ShardedCache(temp_dir_fixture / "periodic").get("sha256:ab_light") == {"method": "light"}
+
+def test_cache_manager_bulk_hashes_match_single(temp_dir_fixture, monkeypatch):
+    cache_mgr = CacheManager(str(temp_dir_fixture / "bulkcache.json"), quiet=True)
+    monkeypatch.setattr(CacheManager, "BULK_HASH_MIN_BYTES", 0) # Force the threaded path
+    contents = [f"content {i}".encode('utf-8') for i in range(8)] + ["text content"]
+    assert cache_mgr.get_hashes_bulk(contents) == [cache_mgr.get_content_hash(c) for c in contents]
+    assert cache_mgr.get_content_hash("text content") == cache_mgr.get_content_hash(b"text content")
+    with pytest.deprecated_call():
+        assert cache_mgr.get_sha256("text content") == cache_mgr.get_content_hash("text content")
+
 def test_compress_none(compressor_instance, sample_text_content_str):
     result = compressor_instance.compress_content(sample_text_content_str, "file.txt", "none")
     assert result["compressed_content"] == sample_text_content_str
     assert result["method"] == "none (raw)"
     assert result["compression_ratio"] == 1.0
 
+def test_compress_none_bypasses_cache(temp_dir_fixture, sample_text_content_str):
+    cache_mgr = CacheManager(str(temp_dir_fixture / "nonecache.json"), quiet=True)
+    compressor = Compressor(cache_manager=cache_mgr, quiet=True)
+    first = compressor.compress_content(sample_text_content_str, "file.txt", "none")
+    second = compressor.compress_content(sample_text_content_str, "file.txt", "none")
+    assert first == second
+    assert first["method"] == "none (raw)"
+    assert first["compressed_size"] == first["original_size"] == len(sample_text_content_str.encode('utf-8'))
+    assert compressor.lookup_cached(sample_text_content_str, "file.txt", "none") == (None, None)
+
+def test_compress_content_accepts_utf8_bytes(temp_dir_fixture, sample_text_content_str):
+    cache_mgr = CacheManager(str(temp_dir_fixture / "bytescache.json"), quiet=True)
+    compressor = Compressor(cache_manager=cache_mgr, quiet=True)
+    from_bytes = compressor.compress_content(sample_text_content_str.encode('utf-8'), "file.txt", "light")
+    from_str = compressor.compress_content(sample_text_content_str, "file.txt", "light")
+    assert from_bytes["compressed_content"] == from_str["compressed_content"]
+    assert from_bytes["original_size"] == from_str["original_size"]
+    assert from_str["method"] == "light (whitespace norm.) (cached)" # Same cache key as the bytes
+
 def test_compress_light(compressor_instance, sample_text_content_str):
     result = compressor_instance.compress_content(sample_text_content_str, "file.txt", "light")
     assert "Trailing spaces here." in result["compressed_content"] # Text content preserved
@@ -82,6 +146,32 @@ def test_compress_aggressive_non_python_fallback(compressor_instance, sample_tex
     # Falls back to medium for non-python
     assert result["method"] == "medium (comments/blanks removed)"
 
+def test_fast_mode_downgrades_large_aggressive_and_skips_llm(sample_python_code_str):
+    compressor = Compressor(quiet=True, fast=True, fast_downgrade_bytes=100)
+    with patch.object(InternalSemanticCompressor, '_call_llm_api') as mock_call_llm_api:
+        semantic = compressor.compress_content(sample_python_code_str, "file.py", "semantic")
+    mock_call_llm_api.assert_not_called()
+    assert semantic["method"].startswith("semantic-llm-disabled")
+
+    large = compressor.compress_content(sample_python_code_str, "file.py", "aggressive")
+    assert large["method"] == "medium (comments/blanks removed)"
+    small = compressor.compress_content("import os\n", "small.py", "aggressive")
+    assert small["method"].startswith("aggressive")
+
+def test_min_compress_bytes_skips_small_and_ineffective(sample_python_code_str):
+    compressor = Compressor(quiet=True, min_compress_bytes=64)
+    small = compressor.compress_content("x = 1   \n", "tiny.py", "light")
+    assert small["method"] == "skip (small file)"
+    assert small["compressed_content"] == "x = 1   \n"
+
+    already_clean = "\n".join(f"value_{i} = {i}" for i in range(20))
+    kept = compressor.compress_content(already_clean, "clean.py", "medium")
+    assert kept["method"] == "medium (comments/blanks removed), kept original"
+    assert kept["compressed_content"] == already_clean
+
+    result = compressor.compress_content(sample_python_code_str, "file.py", "medium")
+    assert result["method"] == "medium (comments/blanks removed)"
+
 
 @patch.object(InternalSemanticCompressor, '_call_llm_api', autospec=True)
 def test_compress_semantic_success(mock_call_llm_api, compressor_instance, sample_python_code_str):
@@ -109,7 +199,7 @@ def test_compress_semantic_success(mock_call_llm_api, compressor_instance, sampl
 
     assert result["method"] == "semantic-llm"
     assert "# SEMANTIC COMPRESSION v1.1" in result["compressed_content"]
-    assert json.dumps(mock_semantic_json_output, indent=2) in result["compressed_content"]
+    assert json.dumps(mock_semantic_json_output, separators=(',', ':')) in result["compressed_content"]
     mock_call_llm_api.assert_called_once()
 
 
@@ -162,6 +252,16 @@ def test_compress_smart_fallback_to_aggressive(compressor_instance, sample_pytho
     compressor_instance.semantic_compressor = original_semantic_compressor # Restore
 
 
+@patch.object(InternalSemanticCompressor, '_call_llm_api')
+def test_compress_smart_use_semantic_false_skips_llm(mock_call_llm_api, compressor_instance, sample_python_code_str):
+    compressor_instance.semantic_compressor = InternalSemanticCompressor(quiet=True)
+
+    result = compressor_instance.compress_content(sample_python_code_str * 20, "file.py", "smart", use_semantic=False)
+
+    assert result["method"].startswith("smart->aggressive")
+    mock_call_llm_api.assert_not_called()
+
+
 def test_compress_content_with_caching(compressor_instance, sample_text_content_str):
     # First call - should not be cached
     result1 = compressor_instance.compress_content(sample_text_content_str, "cached_file.txt", "light")
@@ -170,6 +270,188 @@ def test_compress_content_with_caching(compressor_instance, sample_text_content_
     # Mock the get_cached_compression to check if it's called and returns our expected result
     with patch.object(compressor_instance.cache_manager, 'get_cached_compression', return_value=result1) as mock_get_cache:
         result2 = compressor_instance.compress_content(sample_text_content_str, "cached_file.txt", "light")
-        mock_get_cache.assert_called_once_with(sample_text_content_str, "light", None)
+        expected_hash = compressor_instance.cache_manager.get_content_hash(sample_text_content_str)
+        mock_get_cache.assert_called_once_with(sample_text_content_str.encode('utf-8'), "light", None, content_hash=expected_hash)
         assert result2["method"] == result1["method"] + " (cached)" # CacheManager adds "(cached)"
         assert result2["compressed_content"] == result1["compressed_content"]
+
+
+@patch('pak_compressor.SEMANTIC_AVAILABLE', True)
+@patch.object(InternalSemanticCompressor, '_call_llm_api', autospec=True)
+def test_compress_batch_preserves_order_and_falls_back(mock_call_llm_api, compressor_instance, sample_python_code_str):
+    compressor_instance.semantic_compressor = InternalSemanticCompressor(quiet=True)
+    mock_semantic_json_output = {
+        "file_path": "a.py", "file_type": "python", "overall_purpose": "Batch test",
+        "key_components": {}, "core_logic_flow": "Flow"
+    }
+
+    def fake_llm(self, prompt):
+        if "FAIL_THIS_FILE" in prompt:
+            raise Exception("LLM API Error")
+        return json.dumps(mock_semantic_json_output)
+    mock_call_llm_api.side_effect = fake_llm
+
+    tasks = [
+        (sample_python_code_str, "a.py", "semantic"),
+        ("Some text.   \n", "b.txt", "light"),
+        (sample_python_code_str + "\n# FAIL_THIS_FILE\n", "c.py", "semantic"),
+        (sample_python_code_str * 5, "d.py", "smart"), # Large code: semantic attempt joins the batch
+        ("x = 1\n", "e.py", "smart"), # Too small for semantic
+    ]
+    with patch.dict(os.environ, {"OPENROUTER_API_KEY": "fake_key_for_test"}):
+        compressor_instance.semantic_compressor.api_key = "fake_key_for_test"
+        results = compressor_instance.compress_batch(tasks, max_workers=2)
+
+    assert results[0]["method"] == "semantic-llm"
+    assert results[1]["method"] == "light (whitespace norm.)"
+    assert results[2]["method"].startswith("semantic-llm-failed, fallback to")
+    assert results[3]["method"] == "smart->semantic-llm"
+    assert results[4]["method"].startswith("smart->light")
+    assert mock_call_llm_api.call_count == 3
+
+
+def test_compress_batch_hashes_each_content_once(compressor_instance, sample_text_content_str):
+    tasks = [
+        (sample_text_content_str, "a.txt", "light"),
+        (sample_text_content_str, "a.txt", "medium"),
+        (sample_text_content_str, "a.txt", "light"), # Repeat of the first task
+    ]
+    cache_manager = compressor_instance.cache_manager
+    with patch.object(cache_manager, 'get_content_hash', wraps=cache_manager.get_content_hash) as spy_hash:
+        results = compressor_instance.compress_batch(tasks)
+
+    assert spy_hash.call_count == 1
+    assert results[0]["method"].startswith("light")
+    assert results[1]["method"].startswith("medium")
+    assert results[2] == results[0] and results[2] is not results[0]
+
+
+def test_semantic_read_streamed_content():
+    sse_lines = [
+        b": OPENROUTER PROCESSING",
+        b"",
+        b'data: {"choices": [{"delta": {"role": "assistant"}}]}',
+        b'data: {"choices": [{"delta": {"content": "{\\"overall_purpose\\": "}}]}',
+        b'data: {"choices": [{"delta": {"content": "\\"ok\\"}"}}]}',
+        b"data: [DONE]",
+    ]
+    fake_response = MagicMock()
+    fake_response.iter_lines.return_value = iter(sse_lines)
+    semantic = InternalSemanticCompressor(quiet=True)
+    assert semantic._read_streamed_content(fake_response) == '{"overall_purpose": "ok"}'
+
+    fake_response.iter_lines.return_value = iter([b'data: {"choices": [{"delta": {}}]}', b"data: [DONE]"])
+    assert semantic._read_streamed_content(fake_response) is None
+
+
+def test_compress_many_matches_sequential(compressor_instance, sample_python_code_str, sample_text_content_str):
+    tasks = [
+        (sample_python_code_str, "a.py", "medium"),
+        (sample_text_content_str, "b.txt", "light"),
+        (sample_python_code_str, "c.py", "none"),
+    ]
+    expected = [Compressor(quiet=True).compress_content(*task) for task in tasks]
+    results = compressor_instance.compress_many(tasks, max_workers=2)
+    assert [r["compressed_content"] for r in results] == [e["compressed_content"] for e in expected]
+    assert [r["method"] for r in results] == [e["method"] for e in expected]
+
+def test_parallel_processes_do_not_cache_skipped_results(temp_dir_fixture, monkeypatch):
+    from pak_compressor import ParallelCompressor
+    monkeypatch.setenv("PAK_CACHE_DIR", str(temp_dir_fixture))
+    monkeypatch.setattr(ParallelCompressor, "PROCESS_POOL_MIN_BYTES", 0) # Force the process path
+    already_clean = "\n".join(f"value_{i} = {i}" for i in range(20))
+    tasks = [("x = 1   \n", "tiny.py", "medium"), (already_clean, "clean.py", "medium")]
+    cache_path = str(temp_dir_fixture / "parallel_cache.json")
+    tuned = Compressor(cache_manager=CacheManager(cache_path, quiet=True), quiet=True, min_compress_bytes=64)
+    results = ParallelCompressor(tuned, max_workers=2, quiet=True, use_processes=True).compress_files_parallel(tasks)
+    assert [r["method"] for r in results] == ["skip (small file)", "medium (comments/blanks removed), kept original"]
+    tuned.cache_manager.save_cache()
+
+    # A later run without the knob must compress, not replay the skip from the shared cache
+    plain = Compressor(cache_manager=CacheManager(cache_path, quiet=True), quiet=True)
+    assert plain.compress_content("x = 1   \n", "tiny.py", "medium")["method"] == "medium (comments/blanks removed)"
+    assert plain.compress_content(already_clean, "clean.py", "medium")["method"] == "medium (comments/blanks removed)"
+
+def test_semantic_compressor_reads_api_key_at_use():
+    semantic = InternalSemanticCompressor(quiet=True)
+    with patch.dict(os.environ, {"OPENROUTER_API_KEY": "key_set_after_construction"}):
+        assert semantic.api_key == "key_set_after_construction"
+    semantic.api_key = "explicit_key"
+    with patch.dict(os.environ, {"OPENROUTER_API_KEY": "other"}):
+        assert semantic.api_key == "explicit_key"
+
+def test_rate_limiter_sleeps_outside_its_lock():
+    from concurrent.futures import ThreadPoolExecutor
+    from pak_compressor import AdaptiveRateLimiter
+    limiter = AdaptiveRateLimiter(quiet=True)
+    limiter.current_delay = 2.0 # Forces an adaptive-delay sleep
+
+    lock_free_while_sleeping = []
+    def fake_sleep(seconds):
+        # Another thread must be able to take the lock while this one waits
+        with ThreadPoolExecutor(max_workers=1) as other:
+            acquired = other.submit(lambda: limiter._lock.acquire(timeout=1) and limiter._lock.release() is None).result()
+        lock_free_while_sleeping.append(acquired)
+
+    with patch('pak_compressor.time.sleep', side_effect=fake_sleep):
+        assert limiter.wait_if_needed() == 2.0
+    assert lock_free_while_sleeping == [True]
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        list(pool.map(lambda _: (limiter.record_request(), limiter.record_success(0.1)), range(400)))
+    assert limiter.get_stats()["total_requests"] == 400
+
+def test_semantic_prompt_cache_is_keyed_by_hash_and_bounded():
+    import pak_compressor
+    pak_compressor._prompt_cache.clear()
+    first = pak_compressor._render_compression_prompt_cached("h0", "a.py", "python", "print(0)")
+    # A hash already seen returns the rendered prompt without looking at the content again
+    assert pak_compressor._render_compression_prompt_cached("h0", "a.py", "python", "ignored") is first
+    for i in range(1, pak_compressor._PROMPT_CACHE_MAXSIZE + 5):
+        pak_compressor._render_compression_prompt_cached(f"h{i}", "a.py", "python", f"print({i})")
+    assert len(pak_compressor._prompt_cache) == pak_compressor._PROMPT_CACHE_MAXSIZE
+    assert ("h0", "a.py", "python", None) not in pak_compressor._prompt_cache
+    pak_compressor._prompt_cache.clear()
+
+def test_cache_manager_finds_legacy_sha256_entries_under_other_hash(temp_dir_fixture, monkeypatch):
+    import pak_compressor
+    monkeypatch.setenv("PAK_CACHE_DIR", str(temp_dir_fixture))
+    monkeypatch.setattr(pak_compressor, "_CONTENT_HASH_PREFIX", "xxh3:") # Any algorithm but sha256
+    (temp_dir_fixture / "compression_cache.json").write_text(json.dumps(
+        {f"{hashlib.sha256(b'old').hexdigest()}_semantic": {"compressed_content": "paid for", "method": "semantic"}}))
+
+    cache_mgr = CacheManager("x", quiet=True)
+    assert cache_mgr.get_cached_compression("old", "semantic")["compressed_content"] == "paid for"
+    # Copied under the current key, so later lookups hit directly
+    assert cache_mgr.cache.get(f"{cache_mgr.get_content_hash('old')}_semantic")["compressed_content"] == "paid for"
+    assert cache_mgr.get_cached_compression("new", "semantic") is None
+
+def test_rate_limiter_acquire_never_overruns_limit_across_threads():
+    from concurrent.futures import ThreadPoolExecutor
+    from pak_compressor import AdaptiveRateLimiter
+    limiter = AdaptiveRateLimiter(max_requests_per_minute=3, quiet=True)
+
+    class Blocked(Exception):
+        pass
+    def acquire_or_block(_):
+        try:
+            limiter.acquire()
+            return True
+        except Blocked:
+            return False
+
+    # A thread that would have to wait for a slot gives up instead of sleeping
+    with patch('pak_compressor.time.sleep', side_effect=Blocked):
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            sent = list(pool.map(acquire_or_block, range(8)))
+    assert sent.count(True) == 3
+    assert len(limiter.request_times) == 3
+    assert limiter.get_stats()["blocked_requests"] == 5
+
+def test_parallel_small_batches_stay_sequential(compressor_instance):
+    from pak_compressor import ParallelCompressor
+    parallel = ParallelCompressor(compressor_instance, max_workers=2, quiet=True, use_processes=True)
+    tasks = [("x = 1\n", "a.py", "medium"), ("y = 2\n", "b.py", "medium")]
+    with patch.object(ParallelCompressor, "_compress_parallel", side_effect=AssertionError("pool started")):
+        parallel.compress_files_parallel(tasks)
+    assert parallel.parallel_stats["files_processed_sequentially"] == 2
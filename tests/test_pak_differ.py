@@ -128,3 +128,25 @@ REPLACE_WITH:
     assert success is False # The specific diff for non_existent_function should fail
     # The file content should remain unchanged
     assert target_file.read_text() == diff_sample_file1_content_str
+
+def test_apply_diff_keeps_earlier_edit_when_later_instruction_fails(temp_dir_fixture, diff_sample_file1_content_str,
+                                                                    sample_valid_method_diff_content_str):
+    target_file = temp_dir_fixture / "target.py"
+    target_file.write_text(diff_sample_file1_content_str)
+
+    # Both instructions hit the same file; the second cannot be applied
+    diff_file = temp_dir_fixture / "partial.diff"
+    diff_file.write_text(sample_valid_method_diff_content_str + """
+FILE: sample_target_file.py
+FIND_METHOD: def non_existent_function()
+UNTIL_EXCLUDE:
+REPLACE_WITH:
+    pass # Should not be applied
+""")
+
+    success = MethodDiffManager.apply_diff(str(diff_file), str(target_file), quiet=True)
+    assert success is True
+    modified_content = target_file.read_text()
+    assert "Hello Diff Applied!" in modified_content # First edit written despite the second failing
+    assert "Should not be applied" not in modified_content
+    assert "def add(a, b):" in modified_content
@@ -1,7 +1,7 @@
 import pytest
 import os
 from pathlib import Path
-from pak_utils import collect_files # Assumes pak_utils.py is in PYTHONPATH or project root
+from pak_utils import collect_files, filter_files_by_pattern, read_source_file # Assumes pak_utils.py is in PYTHONPATH or project root
 
 def test_collect_single_file(temp_dir_fixture):
     file_path = temp_dir_fixture / "file1.txt"
@@ -54,6 +54,23 @@ def test_collect_directory_with_ext_filter(temp_dir_fixture):
     }
     assert paths == expected_paths
 
+def test_collect_directory_ext_filter_ignores_case(temp_dir_fixture):
+    (temp_dir_fixture / "upper.PY").write_text("py")
+    (temp_dir_fixture / "lower.py").write_text("py")
+    (temp_dir_fixture / "notes.txt").write_text("txt")
+    result = collect_files([str(temp_dir_fixture)], [".Py"], quiet=True)
+    assert sorted(os.path.basename(p) for p in result) == ["lower.py", "upper.PY"]
+
+def test_collect_directory_skips_vcs_and_dependency_dirs(temp_dir_fixture):
+    (temp_dir_fixture / "main.py").write_text("py")
+    for dir_name in (".git", "node_modules", "__pycache__"):
+        (temp_dir_fixture / dir_name).mkdir()
+        (temp_dir_fixture / dir_name / "inner.py").write_text("py")
+    result = collect_files([str(temp_dir_fixture)], [], quiet=True)
+    assert [os.path.basename(p) for p in result] == ["main.py"]
+    # Named explicitly as the target, such a directory is still collected
+    assert len(collect_files([str(temp_dir_fixture / "node_modules")], [], quiet=True)) == 1
+
 def test_collect_glob_pattern_files_only(temp_dir_fixture):
     (temp_dir_fixture / "file1.txt").write_text("txt1")
     (temp_dir_fixture / "file2.txt").write_text("txt2")
@@ -81,3 +98,26 @@ def test_collect_non_existent_target():
 def test_collect_empty_targets_list():
     result = collect_files([], [".txt"], quiet=True)
     assert len(result) == 0
+
+def test_read_source_file_matches_text_mode_read(temp_dir_fixture):
+    file_path = temp_dir_fixture / "mixed.py"
+    file_path.write_bytes(b"a = 1\r\nb = '\xff'\rc = 3\n\xc3\xa9\n")
+    with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
+        expected = f.read()
+    assert read_source_file(str(file_path)) == expected
+
+def test_read_source_file_rejects_binary(temp_dir_fixture):
+    png_path = temp_dir_fixture / "logo.png"
+    png_path.write_bytes(b"\x89PNG\r\n\x1a\n" + bytes(range(32)))
+    blob_path = temp_dir_fixture / "data.py"
+    blob_path.write_bytes(b"x = 1\n\x00\x01\x02")
+    for file_path in (png_path, blob_path):
+        with pytest.raises(ValueError):
+            read_source_file(str(file_path))
+
+def test_filter_files_by_pattern_matches_path_or_basename():
+    files = ["src/app.py", "src/test_app.py", "docs/readme.md", "tests/data/[x].txt"]
+    assert filter_files_by_pattern(files, "test_*") == ["src/test_app.py"]
+    assert filter_files_by_pattern(files, "src/*.py") == ["src/app.py", "src/test_app.py"]
+    assert filter_files_by_pattern(files, "[[]x].txt") == ["tests/data/[x].txt"]
+    assert filter_files_by_pattern(files, "") == files